@@ -0,0 +1,459 @@
+"""
+Pluggable model backends for the client registry.
+
+A backend supplies the sync and async client objects that ``clients.py`` hands
+to every agent. ``OpenAIBackend`` is the default pooled API client;
+``LocalBackend`` answers in-process, so agents, benchmarks and load tests run
+without the network:
+
+- embeddings are deterministic signed feature hashes of the words and word
+  bigrams of the input, so related texts land close together;
+- completions come from canned responses, a template or a callable, and
+  judge prompts are accepted with a configurable probability;
+- latency is sampled from a ``LatencyModel`` and a share of requests fails
+  with the same ``openai`` errors the API raises (429 / 500); an optional
+  requests-per-minute ceiling answers excess requests with 429s.
+
+Select a backend with ``use_backend(LocalBackend(...))`` or set
+``WORKFLOW_BACKEND=local`` (see ``backend_from_env`` for the options).
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator, Callable, Iterator, Mapping
+from dataclasses import dataclass, field
+from itertools import pairwise
+from typing import Any, Protocol
+
+import httpx
+import numpy as np
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from openai.types.create_embedding_response import CreateEmbeddingResponse
+
+from . import clients
+
+Messages = list[dict[str, Any]]
+
+
+class Backend(Protocol):
+    def client(self) -> Any: ...
+
+    def async_client(self) -> Any: ...
+
+
+def use_backend(backend: "Backend | None") -> None:
+    """Routes every agent's requests to ``backend``; None restores the API clients."""
+    if backend is None:
+        clients.set_client(None, None)
+    else:
+        clients.set_client(backend.client(), backend.async_client())
+
+
+def backend_from_env() -> "Backend | None":
+    """
+    Builds the backend selected by ``WORKFLOW_BACKEND`` (``local`` or unset).
+
+    ``LocalBackend`` options come from ``WORKFLOW_BACKEND_LATENCY``
+    (``distribution:mean[:spread]``, default no delay),
+    ``WORKFLOW_BACKEND_ERROR_RATE``, ``WORKFLOW_BACKEND_ACCEPT_RATE`` and
+    ``WORKFLOW_BACKEND_RPM`` (a simulated provider request ceiling).
+    """
+    name = os.getenv("WORKFLOW_BACKEND", "").lower()
+    if name in ("", "openai"):
+        return None
+    if name == "local":
+        return LocalBackend(
+            latency=LatencyModel.parse(
+                os.getenv("WORKFLOW_BACKEND_LATENCY", "fixed:0")
+            ),
+            error_rate=float(os.getenv("WORKFLOW_BACKEND_ERROR_RATE", "0")),
+            accept_rate=float(os.getenv("WORKFLOW_BACKEND_ACCEPT_RATE", "1")),
+            requests_per_minute=float(os.getenv("WORKFLOW_BACKEND_RPM", "0")) or None,
+        )
+    raise ValueError(f"Unknown WORKFLOW_BACKEND: {name}")
+
+
+@dataclass
+class OpenAIBackend:
+    """The pooled OpenAI API clients built by the registry (the default)."""
+
+    api_key: str
+
+    def client(self) -> Any:
+        return clients.get_client(self.api_key)
+
+    def async_client(self) -> Any:
+        # Async clients are bound to an event loop; let the registry pick one
+        # per loop instead of pinning a single instance.
+        return None
+
+
+@dataclass
+class LatencyModel:
+    """
+    Per-request latency in seconds.
+
+    Parameters:
+    distribution (str): ``fixed``, ``uniform``, ``exponential`` or ``lognormal``.
+    mean (float): Mean latency; 0 disables the delay.
+    spread (float): Relative spread (uniform half-width, lognormal sigma).
+    seed (int): Seed for reproducible samples.
+    """
+
+    distribution: str = "fixed"
+    mean: float = 0.0
+    spread: float = 0.5
+    seed: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        """Parses ``distribution:mean[:spread]``, e.g. ``lognormal:0.05:0.8``."""
+        parts = spec.split(":")
+        model = cls(parts[0])
+        if len(parts) > 1:
+            model.mean = float(parts[1])
+        if len(parts) > 2:
+            model.spread = float(parts[2])
+        return model
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "fixed":
+                return self.mean
+            if self.distribution == "uniform":
+                low, high = 1 - self.spread, 1 + self.spread
+                return self.mean * self._random.uniform(low, high)
+            if self.distribution == "exponential":
+                return self._random.expovariate(1 / self.mean)
+            if self.distribution == "lognormal":
+                sigma = self.spread
+                return self._random.lognormvariate(
+                    float(np.log(self.mean)) - sigma**2 / 2, sigma
+                )
+        raise ValueError(f"Unknown latency distribution: {self.distribution}")
+
+
+def hashing_embedding(text: str, dim: int = 256) -> list[float]:
+    """
+    Deterministic unit-length embedding: signed feature hashing of the
+    lower-cased words and word bigrams of ``text`` into ``dim`` buckets.
+    """
+    words = re.findall(r"\w+", text.lower())
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in [*words, *(" ".join(pair) for pair in pairwise(words))]:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        vector[digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0] = 1.0
+        return vector.tolist()
+    return (vector / norm).tolist()
+
+
+@dataclass
+class LocalBackend:
+    """
+    In-process stand-in for the chat and embeddings endpoints.
+
+    Parameters:
+    latency (LatencyModel): Delay added to every request.
+    error_rate (float): Share of requests failing with 429 or 500 errors.
+    requests_per_minute (float | None): Provider ceiling; requests beyond it
+        fail with 429 and a ``retry-after`` header.
+    dim (int): Embedding dimension.
+    responses (Mapping[str, str]): Canned answers keyed by a regular
+        expression searched in the last message; the first match wins.
+    template (str): Answer for other prompts; ``{prompt}`` is the last message.
+    responder (Callable | None): Produces the answer from the messages instead.
+    accept_rate (float): Probability that an EvaluationAgent judge prompt
+        ("Does the following answer ...") is answered "Yes".
+    seed (int): Seed for judge verdicts and injected errors.
+    """
+
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    requests_per_minute: float | None = None
+    dim: int = 256
+    responses: Mapping[str, str] = field(default_factory=dict)
+    template: str = "Simulated answer to: {prompt}"
+    responder: Callable[[Messages], str] | None = None
+    accept_rate: float = 1.0
+    seed: int = 0
+    calls: dict[str, int] = field(default_factory=dict, init=False)
+    errors: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._random = random.Random(self.seed)
+        self._allowance = self._burst()
+        self._allowance_at = time.monotonic()
+        self._patterns = [
+            (re.compile(pattern), answer) for pattern, answer in self.responses.items()
+        ]
+
+    def reset(self) -> None:
+        """Clears the call and error counters."""
+        with self._lock:
+            self.calls.clear()
+            self.errors = 0
+
+    def client(self) -> "LocalClient":
+        return LocalClient(self)
+
+    def async_client(self) -> "AsyncLocalClient":
+        return AsyncLocalClient(self)
+
+    def answer(self, messages: Messages, json_mode: bool = False) -> str:
+        """
+        Answers a conversation. Judge prompts asked for JSON (``json_mode``)
+        get a structured verdict with reasons and fix instructions.
+        """
+        if self.responder is not None:
+            return self.responder(messages)
+        prompt = str(messages[-1]["content"]) if messages else ""
+        for pattern, answer in self._patterns:
+            if pattern.search(prompt):
+                return answer
+        if prompt.startswith("Does the following answer"):
+            with self._lock:
+                accepted = self._random.random() < self.accept_rate
+            if json_mode:
+                return json.dumps(
+                    {
+                        "verdict": "yes" if accepted else "no",
+                        "reasons": "The answer meets the criteria."
+                        if accepted
+                        else "The answer does not follow the required structure.",
+                        "fix_instructions": ""
+                        if accepted
+                        else "Rewrite the answer in the required structure.",
+                    }
+                )
+            if accepted:
+                return "Yes, the answer meets the criteria."
+            return "No, the answer does not follow the required structure."
+        return self.template.format(prompt=prompt[:200])
+
+    def chat(self, request: dict[str, Any]) -> ChatCompletion:
+        content = self.answer(request["messages"], _json_mode(request))
+        return ChatCompletion.model_validate(
+            {
+                "id": "local",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": self._usage(request["messages"], content),
+            }
+        )
+
+    def chat_chunks(self, request: dict[str, Any]) -> list[ChatCompletionChunk]:
+        content = self.answer(request["messages"], _json_mode(request))
+        pieces = re.findall(r"\s*\S+", content) or [content]
+        chunks = [
+            ChatCompletionChunk.model_validate(
+                {
+                    "id": "local",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "delta": {"content": piece},
+                            "finish_reason": None
+                            if i < len(pieces) - 1
+                            else "stop",
+                        }
+                    ],
+                }
+            )
+            for i, piece in enumerate(pieces)
+        ]
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunks.append(
+                ChatCompletionChunk.model_validate(
+                    {
+                        "id": "local",
+                        "object": "chat.completion.chunk",
+                        "created": 0,
+                        "model": request["model"],
+                        "choices": [],
+                        "usage": self._usage(request["messages"], content),
+                    }
+                )
+            )
+        return chunks
+
+    def embeddings(self, request: dict[str, Any]) -> CreateEmbeddingResponse:
+        inputs = request["input"]
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        tokens = sum(len(str(text)) for text in inputs) // 4 + 1
+        return CreateEmbeddingResponse.model_validate(
+            {
+                "object": "list",
+                "model": request["model"],
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": hashing_embedding(str(text), self.dim),
+                    }
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+        )
+
+    def begin(self, kind: str) -> float:
+        """Counts a request, maybe fails it, and returns its delay."""
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            retry_after = self._over_limit()
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            status = self._random.choice((429, 500)) if fail else 0
+            if retry_after:
+                status = 429
+            if status:
+                self.errors += 1
+        if status:
+            raise _api_error(status, kind, retry_after)
+        return self.latency.sample()
+
+    def _burst(self) -> float:
+        # The ceiling is enforced over one-second windows, like providers do.
+        return max(1.0, (self.requests_per_minute or 0) / 60)
+
+    def _over_limit(self) -> float:
+        """Takes one request from the allowance; returns the retry-after if empty."""
+        if not self.requests_per_minute:
+            return 0.0
+        rate = self.requests_per_minute / 60
+        now = time.monotonic()
+        self._allowance = min(
+            self._burst(), self._allowance + (now - self._allowance_at) * rate
+        )
+        self._allowance_at = now
+        if self._allowance < 1:
+            return (1 - self._allowance) / rate
+        self._allowance -= 1
+        return 0.0
+
+    def _usage(self, messages: Messages, content: str) -> dict[str, int]:
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+
+def _api_error(
+    status: int, kind: str, retry_after: float = 0.0
+) -> openai.APIStatusError:
+    path = "chat/completions" if kind == "chat" else "embeddings"
+    request = httpx.Request("POST", f"http://local.backend/v1/{path}")
+    message = "Rate limit reached" if status == 429 else "Internal server error"
+    headers = {"retry-after-ms": str(int(retry_after * 1000))} if retry_after else {}
+    response = httpx.Response(
+        status, request=request, headers=headers, json={"error": {"message": message}}
+    )
+    error_type = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_type(message, response=response, body={"message": message})
+
+
+class _Endpoint:
+    def __init__(self, create: Callable[..., Any]):
+        self.create = create
+
+
+class _Chat:
+    def __init__(self, create: Callable[..., Any]):
+        self.completions = _Endpoint(create)
+
+
+class LocalClient:
+    """Duck-typed ``OpenAI`` client backed by a LocalBackend."""
+
+    def __init__(self, backend: LocalBackend):
+        self.backend = backend
+        self.chat = _Chat(self._chat)
+        self.embeddings = _Endpoint(self._embeddings)
+
+    def with_options(self, **_: Any) -> "LocalClient":
+        return self
+
+    def _chat(self, **request: Any) -> Any:
+        delay = self.backend.begin("chat")
+        if request.get("stream"):
+            return self._stream(request, delay)
+        if delay:
+            time.sleep(delay)
+        return self.backend.chat(request)
+
+    def _stream(self, request: dict[str, Any], delay: float) -> Iterator[Any]:
+        # The delay is spent before the first token, like time-to-first-token.
+        if delay:
+            time.sleep(delay)
+        yield from self.backend.chat_chunks(request)
+
+    def _embeddings(self, **request: Any) -> CreateEmbeddingResponse:
+        delay = self.backend.begin("embedding")
+        if delay:
+            time.sleep(delay)
+        return self.backend.embeddings(request)
+
+
+class AsyncLocalClient:
+    """Duck-typed ``AsyncOpenAI`` client backed by a LocalBackend."""
+
+    def __init__(self, backend: LocalBackend):
+        self.backend = backend
+        self.chat = _Chat(self._chat)
+        self.embeddings = _Endpoint(self._embeddings)
+
+    def with_options(self, **_: Any) -> "AsyncLocalClient":
+        return self
+
+    async def _chat(self, **request: Any) -> Any:
+        delay = self.backend.begin("chat")
+        if delay:
+            await asyncio.sleep(delay)
+        if request.get("stream"):
+            return self._stream(request)
+        return self.backend.chat(request)
+
+    async def _stream(self, request: dict[str, Any]) -> AsyncIterator[Any]:
+        for chunk in self.backend.chat_chunks(request):
+            yield chunk
+
+    async def _embeddings(self, **request: Any) -> CreateEmbeddingResponse:
+        delay = self.backend.begin("embedding")
+        if delay:
+            await asyncio.sleep(delay)
+        return self.backend.embeddings(request)
+
+
+def _json_mode(request: Mapping[str, Any]) -> bool:
+    response_format = request.get("response_format") or {}
+    return response_format.get("type") in ("json_object", "json_schema")
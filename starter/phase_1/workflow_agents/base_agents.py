@@ -1,15 +1,44 @@
+import asyncio
 import csv
-import re
+import inspect
+import io
+import os
+import threading
 import uuid
-from collections.abc import Callable
-from dataclasses import dataclass
+from collections.abc import AsyncIterator, Callable, Iterator, Mapping
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any, Protocol
 
 import numpy as np
 import numpy.typing as npt
 import pandas as pd
-from openai import OpenAI
+
+from .chunking import Source, iter_chunks
+from .clients import aclose_clients
+from .completions import (
+    PromptCacheStats,
+    achat_completion,
+    astream_chat_completion,
+    chat_completion,
+    stream_chat_completion,
+)
+from .embedding_cache import EmbeddingCache, default_embedding_cache
+from .embeddings import aembed_text, embed_text, embed_texts, embedding_model
+from .judging import JSON_INSTRUCTIONS, Judgement, parse_judgement
+from .knowledge_index import KnowledgeIndex, UpdateStats, default_index_dir
+from .retrieval import mmr_rerank, pack_context
+from .usage import tracked, update_usage_context
+from .validators import Validator, run_validators
+from .vector_index import (
+    SearchResult,
+    VectorIndex,
+    build_index,
+    index_matches,
+    load_index,
+)
+from .vector_store import VectorStore, VectorStoreWriter
+
 
 class WorkerAgent(Protocol):
     description: str
@@ -23,7 +52,6 @@ def noop(x: Any):
     return None
 
 
-base_url = "https://openai.vocareum.com/v1"
 model = "gpt-3.5-turbo"
 
 
@@ -31,13 +59,11 @@ model = "gpt-3.5-turbo"
 class DirectPromptAgent:
     openai_api_key: str
 
+    @tracked
     def respond(self, prompt: str) -> str | None:
         # Generate a response using the OpenAI API
-        client = OpenAI(
-            api_key=self.openai_api_key,
-            base_url=base_url,
-        )
-        response = client.chat.completions.create(
+        response = chat_completion(
+            self.openai_api_key,
             model=model, messages=[{"role": "user", "content": prompt}], temperature=0
         )
         content = response.choices[0].message.content
@@ -51,14 +77,11 @@ class AugmentedPromptAgent:
     openai_api_key: str
     persona: str
 
+    @tracked
     def respond(self, input_text: str):
         """Generate a response using OpenAI API."""
-        client = OpenAI(
-            api_key=self.openai_api_key,
-            base_url=base_url,
-        )
-
-        response = client.chat.completions.create(
+        response = chat_completion(
+            self.openai_api_key,
             model=model,
             messages=[
                 # TODO: 3 - Add a system prompt instructing the agent to assume the defined persona and explicitly forget previous context.
@@ -86,13 +109,21 @@ class KnowledgeAugmentedPromptAgent(WorkerAgent):
 
     def __post_init__(self):
         self.func = self.respond
+        self.prompt_cache = PromptCacheStats()
+        self._prefix: list[dict[str, str]] = []
+        self._prefix_key: tuple[str, str] | None = None
 
-    def respond(self, input_text: str):
-        """Generate a response using the OpenAI API."""
-        client = OpenAI(base_url=base_url, api_key=self.openai_api_key)
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+    def _prefix_messages(self) -> list[dict[str, str]]:
+        """
+        The static part of every request, built once per persona/knowledge.
+
+        The knowledge leads the prompt so that every call (including the
+        evaluation loop's retries) shares the longest possible identical
+        prefix, which the provider's prompt cache can then reuse.
+        """
+        key = (self.persona, self.knowledge)
+        if key != self._prefix_key:
+            self._prefix = [
                 # TODO: 2 - Construct a system message including:
                 #           - The persona with the following instruction:
                 #             "You are _persona_ knowledge-based assistant. Forget all previous context."
@@ -102,15 +133,77 @@ class KnowledgeAugmentedPromptAgent(WorkerAgent):
                 #             "Answer the prompt based on this knowledge, not your own."
                 {
                     "role": "system",
-                    "content": f"You are {self.persona} knowledge-based assistant. Forget all previous context. "
-                    f"Use only the following knowledge to answer, do not use your own knowledge: {self.knowledge} "
-                    f"Answer the prompt based on this knowledge, not your own.",
+                    "content": "Use only the following knowledge to answer, do not use "
+                    f"your own knowledge: {self.knowledge}",
                 },
-                # TODO: 3 - Add the user's input prompt here as a user message.
-                {"role": "user", "content": input_text},
-            ],
-            temperature=0,
+                {
+                    "role": "system",
+                    "content": f"You are {self.persona} knowledge-based assistant. "
+                    "Forget all previous conversation context. "
+                    "Answer the prompt based on the knowledge above, not your own.",
+                },
+            ]
+            self._prefix_key = key
+        return self._prefix
+
+    def _messages(self, input_text: str) -> list[dict[str, str]]:
+        return [
+            *self._prefix_messages(),
+            # TODO: 3 - Add the user's input prompt here as a user message.
+            {"role": "user", "content": input_text},
+        ]
+
+    def request(self, input_text: str, temperature: float = 0) -> dict[str, Any]:
+        """The chat request respond sends for ``input_text``."""
+        return {
+            "model": model,
+            "messages": self._messages(input_text),
+            "temperature": temperature,
+        }
+
+    @tracked
+    def respond(self, input_text: str, stream: bool = False, temperature: float = 0):
+        """
+        Generate a response using the OpenAI API.
+
+        Parameters:
+        input_text (str): The prompt to answer.
+        stream (bool): Return an iterator of token deltas instead of waiting
+            for the full completion.
+        temperature (float): Sampling temperature; EvaluationAgent raises it
+            to draw varied candidates.
+
+        Returns:
+        str | Iterator[str]: The response text, or its deltas when streaming.
+        """
+        if stream:
+            return stream_chat_completion(
+                self.openai_api_key,
+                on_usage=self.prompt_cache.record,
+                **self.request(input_text, temperature),
+            )
+        response = chat_completion(
+            self.openai_api_key, **self.request(input_text, temperature)
         )
+        self.prompt_cache.record(response)
+        print(f'Knowledge agents: \n\t{response.choices[0].message.content}')
+        return response.choices[0].message.content
+
+    @tracked
+    async def arespond(
+        self, input_text: str, stream: bool = False, temperature: float = 0
+    ):
+        """Async counterpart of respond; streams as an async iterator."""
+        if stream:
+            return astream_chat_completion(
+                self.openai_api_key,
+                on_usage=self.prompt_cache.record,
+                **self.request(input_text, temperature),
+            )
+        response = await achat_completion(
+            self.openai_api_key, **self.request(input_text, temperature)
+        )
+        self.prompt_cache.record(response)
         print(f'Knowledge agents: \n\t{response.choices[0].message.content}')
         return response.choices[0].message.content
 
@@ -125,17 +218,47 @@ class RAGKnowledgePromptAgent:
 
     openai_api_key: str
     persona: str
+    embedding_cache: EmbeddingCache | None = field(
+        default_factory=default_embedding_cache, repr=False
+    )
+    # A named index persists in index_dir/index_name across instances and is
+    # kept current with update_knowledge instead of being rebuilt each run.
+    index_name: str | None = None
+    index_dir: str = default_index_dir
     chunk_size = 2000
     chunk_overlap = 100
+    # Ingestion packs chunks into embedding requests within these limits and
+    # keeps up to embedding_concurrency requests in flight.
+    embedding_batch_size: int = 256
+    embedding_batch_tokens: int = 100_000
+    embedding_concurrency: int = 4
+    # "flat" searches every chunk exactly; "ivf" clusters the chunks and only
+    # scans the ivf_probe clusters closest to the query (None lists = sqrt(n)).
+    index_type: str = "flat"
+    ivf_lists: int | None = None
+    ivf_probe: int = 8
+    # Retrieval: the top_k best chunks are packed into the prompt, optionally
+    # re-ranked with MMR (mmr_lambda in [0, 1]) from mmr_candidates nearest
+    # neighbours, and capped at context_token_budget estimated tokens.
+    top_k: int = 1
+    mmr_lambda: float | None = None
+    mmr_candidates: int = 20
+    context_token_budget: int | None = None
 
     def __post_init__(self):
         self.unique_filename = (
             f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.csv"
         )
+        self.store_path = f"embeddings-{os.path.splitext(self.unique_filename)[0]}"
+        self._store: VectorStore | None = None
+        self._index: VectorIndex | None = None
+        self._knowledge: KnowledgeIndex | None = None
 
+    @tracked
     def get_embedding(self, text: str):
         """
-        Fetches the embedding vector for given text using OpenAI's embedding API.
+        Fetches the embedding vector for given text using OpenAI's embedding API,
+        consulting the persistent embedding cache first.
 
         Parameters:
         text (str): Text to embed.
@@ -143,13 +266,32 @@ class RAGKnowledgePromptAgent:
         Returns:
         list: The embedding vector.
         """
-        client = OpenAI(
-            base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key
-        )
-        response = client.embeddings.create(
-            model="text-embedding-3-large", input=text, encoding_format="float"
+        return embed_text(self.openai_api_key, text, self.embedding_cache)
+
+    @tracked
+    async def aget_embedding(self, text: str):
+        """Async counterpart of get_embedding."""
+        return await aembed_text(self.openai_api_key, text, self.embedding_cache)
+
+    @tracked
+    def get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds many texts with batched, concurrent requests.
+
+        Parameters:
+        texts (list[str]): Texts to embed.
+
+        Returns:
+        list: One embedding vector per text, in input order.
+        """
+        return embed_texts(
+            self.openai_api_key,
+            texts,
+            self.embedding_cache,
+            max_batch_items=self.embedding_batch_size,
+            max_batch_tokens=self.embedding_batch_tokens,
+            concurrency=self.embedding_concurrency,
         )
-        return response.data[0].embedding
 
     def calculate_similarity(
         self, vector_one: npt.ArrayLike, vector_two: npt.ArrayLike
@@ -177,73 +319,147 @@ class RAGKnowledgePromptAgent:
         Returns:
         list: List of dictionaries containing chunk metadata.
         """
-        separator = "\n"
-        text = re.sub(r"\s+", " ", text).strip()
-
-        if len(text) <= self.chunk_size:
-          return [{"chunk_id": 0, "text": text, "chunk_size": len(text)}]
-
-        start, chunk_id = 0, 0
         chunks: list[dict[str, int | str]] = []
 
-        while start < len(text):
-            end = min(start + self.chunk_size, len(text))
-
-            # Check if remaining text is too small to be meaningful
-            remaining_text = len(text) - start
-            # Less than half chunk_size
-            if remaining_text < self.chunk_size // 2:  
-                chunks.append({
-                    "chunk_id": chunk_id,
-                    "text": text[start:],
-                    "chunk_size": remaining_text,
-                    "start_char": start,
-                    "end_char": len(text),
-                })
-                break
-        
-
-            if separator in text[start:end] and end < len(text):  # Don't break at the very end
-                end = start + text[start:end].rindex(separator) + len(separator)
-
-            chunks.append({
-                "chunk_id": chunk_id,
-                "text": text[start:end],
-                "chunk_size": end - start,
-                "start_char": start,
-                "end_char": end,
-            })
-
-            # Ensure we always move forward
-            next_start = end - self.chunk_overlap
-            if next_start <= start:  # Prevent infinite loop
-                next_start = start + 1
-            
-            start = next_start
-            chunk_id += 1
-
-        # Write to CSV immediately to avoid memory buildup
+        # Write to CSV while chunking to avoid memory buildup
         with open(f"chunks-{self.unique_filename}", "w", newline="", encoding="utf-8") as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=["text", "chunk_size"])
             writer.writeheader()
-            for chunk in chunks:
+            for chunk in iter_chunks(
+                io.StringIO(text), self.chunk_size, self.chunk_overlap
+            ):
                 writer.writerow({k: chunk[k] for k in ["text", "chunk_size"]})
+                chunks.append(chunk)
 
         return chunks
 
+    def ingest(self, source: Source) -> int:
+        """
+        Streams a document into the vector store without materializing it.
+        Chunks are read lazily, embedded a window of batches at a time and
+        appended to the store, so peak memory does not grow with the corpus.
+
+        Parameters:
+        source (str | PathLike | file-like): Path to a UTF-8 file, or an open
+            text or binary file object.
+
+        Returns:
+        int: Number of chunks ingested.
+        """
+        window = self.embedding_batch_size * max(1, self.embedding_concurrency)
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+        with VectorStoreWriter(self.store_path, embedding_model) as writer:
+            pending: list[str] = []
+            for chunk in iter_chunks(source, self.chunk_size, self.chunk_overlap):
+                pending.append(chunk["text"])
+                if len(pending) >= window:
+                    writer.append(pending, self.get_embeddings(pending))
+                    pending = []
+            if pending:
+                writer.append(pending, self.get_embeddings(pending))
+            self._store = writer.close()
+
+        self._index = self._build_index(self._store)
+        return len(self._store)
+
+    @tracked
     def calculate_embeddings(self):
         """
-        Calculates embeddings for each chunk and stores them in a CSV file.
+        Calculates embeddings for each chunk and writes them to a binary vector
+        store (see vector_store.py) at ``self.store_path``.
 
         Returns:
         DataFrame: DataFrame containing text chunks and their embeddings.
         """
         filename: str = f"chunks-{self.unique_filename}"
         df = pd.read_csv(filepath_or_buffer=filename, encoding="utf-8")  # pyright: ignore[reportUnknownMemberType]
-        df["embeddings"] = df["text"].apply(self.get_embedding)  # pyright: ignore[reportUnknownMemberType]
-        df.to_csv(f"embeddings-{self.unique_filename}", encoding="utf-8", index=False)
+        texts = df["text"].astype(str).tolist()
+        embeddings = self.get_embeddings(texts)
+        df["embeddings"] = pd.Series(embeddings, index=df.index, dtype=object)
+
+        if self._store is not None:
+            self._store.close()
+        self._store = VectorStore.write(
+            self.store_path, texts, embeddings, model=embedding_model
+        )
+        self._index = self._build_index(self._store)
         return df
 
+    @tracked
+    def update_knowledge(self, source: Source) -> UpdateStats:
+        """
+        Incrementally re-indexes the named knowledge index from the current
+        version of the knowledge. Only new or changed chunks are embedded;
+        chunks that disappeared are tombstoned.
+
+        Parameters:
+        source (str | PathLike | file-like): The complete, current knowledge.
+
+        Returns:
+        UpdateStats: Counts of added, removed and unchanged chunks.
+        """
+        return self.knowledge_index().update(
+            source,
+            self.get_embeddings,
+            self.chunk_size,
+            self.chunk_overlap,
+            batch_size=self.embedding_batch_size * max(1, self.embedding_concurrency),
+        )
+
+    def knowledge_index(self) -> KnowledgeIndex:
+        """Opens the persistent index named by ``index_name``."""
+        if self.index_name is None:
+            raise ValueError("RAGKnowledgePromptAgent.index_name is not set")
+        if self._knowledge is None:
+            self._knowledge = KnowledgeIndex(
+                self.index_name,
+                self.index_dir,
+                embedding_model,
+                self.index_type,
+                self._index_params(),
+            )
+        return self._knowledge
+
+    def load_store(self) -> VectorStore:
+        """Opens the vector store once and reuses it for every later query."""
+        if self.index_name is not None:
+            return self.knowledge_index().store
+        if self._store is None:
+            self._store = VectorStore.open(self.store_path)
+        return self._store
+
+    def load_index(self) -> VectorIndex:
+        """
+        Loads the persisted search index, building it if none was saved or
+        the saved one was built with another index_type, ivf_lists or ivf_probe.
+        """
+        if self._index is None:
+            store = self.load_store()
+            if os.path.exists(f"{self.store_path}.index.npz"):
+                index = load_index(self.store_path, store.vectors)
+                if index_matches(index, self.index_type, **self._index_params()):
+                    self._index = index
+            if self._index is None:
+                self._index = self._build_index(store)
+        return self._index
+
+    def _index_params(self) -> dict[str, Any]:
+        if self.index_type != "ivf":
+            return {}
+        params: dict[str, Any] = {"n_probe": self.ivf_probe}
+        if self.ivf_lists is not None:
+            params["n_lists"] = self.ivf_lists
+        return params
+
+    def _build_index(self, store: VectorStore) -> VectorIndex:
+        index = build_index(store.vectors, self.index_type, **self._index_params())
+        index.save(self.store_path)
+        return index
+
+    @tracked
     def find_prompt_in_knowledge(self, prompt: str):
         """
         Finds and responds to a prompt based on similarity with embedded knowledge.
@@ -255,35 +471,88 @@ class RAGKnowledgePromptAgent:
         str: Response derived from the most similar chunk in knowledge.
         """
         prompt_embedding = self.get_embedding(prompt)
-        df = pd.read_csv(f"embeddings-{self.unique_filename}", encoding="utf-8")  # pyright: ignore[reportUnknownMemberType]
-        df["embeddings"] = df["embeddings"].apply(lambda x: np.array(eval(x)))  # type: ignore
+        best_chunk = self._context(prompt_embedding)
 
-        df["similarity"] = df["embeddings"].apply(  # type: ignore
-            lambda emb: self.calculate_similarity(prompt_embedding, emb)  # type: ignore
+        response = chat_completion(
+            self.openai_api_key,
+            model="gpt-3.5-turbo",
+            messages=self._messages(best_chunk, prompt),
+            temperature=0,
         )
 
-        best_chunk = df.loc[df["similarity"].idxmax(), "text"]
+        return response.choices[0].message.content
 
-        client = OpenAI(
-            base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key
-        )
-        response = client.chat.completions.create(
+    @tracked
+    async def afind_prompt_in_knowledge(self, prompt: str):
+        """Async counterpart of find_prompt_in_knowledge."""
+        prompt_embedding = await self.aget_embedding(prompt)
+        # The first query maps the store and index from disk; keep that off the loop.
+        best_chunk = await asyncio.to_thread(self._context, prompt_embedding)
+
+        response = await achat_completion(
+            self.openai_api_key,
             model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are {self.persona}, a knowledge-based assistant. Forget previous context.",
-                },
-                {
-                    "role": "user",
-                    "content": f"Answer based only on this information: {best_chunk}. Prompt: {prompt}",
-                },
-            ],
+            messages=self._messages(best_chunk, prompt),
             temperature=0,
         )
 
         return response.choices[0].message.content
 
+    @tracked
+    def retrieve_chunks(
+        self,
+        prompt_embedding: list[float],
+        top_k: int | None = None,
+        mmr_lambda: float | None = None,
+    ) -> list[str]:
+        """
+        Returns the chunks most relevant to a prompt, best first.
+
+        Parameters:
+        prompt_embedding (list): Embedding of the prompt.
+        top_k (int | None): Number of chunks; defaults to ``self.top_k``.
+        mmr_lambda (float | None): MMR trade-off; defaults to ``self.mmr_lambda``.
+            None ranks by similarity alone.
+
+        Returns:
+        list: Chunk texts in rank order.
+        """
+        top_k = top_k or self.top_k
+        mmr_lambda = mmr_lambda if mmr_lambda is not None else self.mmr_lambda
+        store = self.load_store()
+
+        if mmr_lambda is None:
+            ids, _ = self._search(prompt_embedding, top_k)
+            return [store.text(int(i)) for i in ids]
+
+        ids, _ = self._search(prompt_embedding, max(top_k, self.mmr_candidates))
+        order = mmr_rerank(
+            prompt_embedding, np.asarray(store.vectors[ids]), top_k, mmr_lambda
+        )
+        return [store.text(int(ids[i])) for i in order]
+
+    def _search(self, prompt_embedding: list[float], k: int) -> SearchResult:
+        if self.index_name is not None:
+            return self.knowledge_index().search(prompt_embedding, k)
+        return self.load_index().search(prompt_embedding, k)
+
+    def _context(self, prompt_embedding: list[float]) -> str:
+        return pack_context(
+            self.retrieve_chunks(prompt_embedding), self.context_token_budget
+        )
+
+    def _messages(self, best_chunk: str, prompt: str) -> list[dict[str, str]]:
+        return [
+            {
+                "role": "system",
+                "content": f"You are {self.persona}, a knowledge-based assistant. Forget previous context.",
+            },
+            {
+                "role": "user",
+                "content": f"Answer based only on this information: {best_chunk}. Prompt: {prompt}",
+            },
+        ]
+
 
 @dataclass
 class EvaluationAgent:
@@ -292,10 +561,41 @@ class EvaluationAgent:
     evaluation_criteria: str
     worker_agent: WorkerAgent
     max_interactions: int = 10
+    validators: list[Validator] = field(default_factory=list)
+    structured_judge: bool = False
+    candidates: int = 1
+    candidate_temperature: float = 0.7
+
+    @tracked
+    def evaluate(
+        self, initial_prompt: str, candidate: str | None = None
+    ) -> dict[str, Any] | None:
+        """
+        Refines the worker's answer to ``initial_prompt`` until the judge
+        accepts it or ``max_interactions`` rounds have passed.
 
-    def evaluate(self, initial_prompt: str) -> dict[str, Any] | None:
+        Parameters:
+        initial_prompt (str): The prompt the worker agent answers.
+        candidate (str | None): An answer the worker already gave to
+            ``initial_prompt``. It is judged first, and the worker is only
+            asked again if it is rejected.
+
+        Returns:
+        dict | None: final_response, final_evaluation, iterations and
+            success; None if the judge returns no content.
+        """
         # This method manages interactions between agents to achieve a solution.
-        client = OpenAI(base_url=base_url, api_key=self.openai_api_key)
+        if self.candidates > 1:
+            # Concurrent candidates need an event loop of their own, which
+            # cannot be started from a thread that is already running one.
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(self._aevaluate_closing(initial_prompt, candidate))
+            raise RuntimeError(
+                "evaluate() cannot draw concurrent candidates from a thread with "
+                "a running event loop; await aevaluate() instead."
+            )
         prompt_to_evaluate = initial_prompt
         response_from_worker = ""
         evaluation = "No evaluation performed"
@@ -303,64 +603,337 @@ class EvaluationAgent:
 
         # TODO: 2 - Set loop to iterate up to the maximum number of interactions:
         for i in range(self.max_interactions):
+            update_usage_context(iteration=i + 1)
             print(f"\n--- Interaction {i + 1} ---")
 
             print(" Step 1: Worker agent generates a response to the prompt")
             print(f"Prompt:\n{prompt_to_evaluate}")
             # TODO: 3 - Obtain a response from the worker agent
-            response_from_worker = self.worker_agent.respond(prompt_to_evaluate)
+            if i == 0 and candidate is not None:
+                print("Judging the response the worker already gave")
+                response_from_worker = candidate
+            else:
+                response_from_worker = self.worker_agent.respond(prompt_to_evaluate)
             print(f"Worker Agent Response:\n\t{response_from_worker}")
 
             print(" Step 2: Evaluator agent judges the response")
-            eval_prompt = (
-                f"Does the following answer: {response_from_worker}\n"
-                # TODO: 4 - Insert evaluation criteria here
-                f"Meet this criteria: {self.evaluation_criteria}\n"
-                f"Respond Yes or No, and the reason why it does or doesn't meet the criteria."
-            )
-            response = client.chat.completions.create(
-                model=model,
-                # TODO: 5 - Define the message structure sent to the LLM for evaluation (use temperature=0)
-                messages=[
-                    {"role": "system", "content": self.persona},
-                    {"role": "user", "content": eval_prompt},
-                ],
-                temperature=0,
-            )
-            if response.choices[0].message.content is None:
+            judgement = self._judge(response_from_worker)
+            if judgement is None:
                 return None
-            evaluation = response.choices[0].message.content.strip()
+            evaluation = judgement.evaluation
             print(f"Evaluator Agent Evaluation:\n\t{evaluation}")
 
             print(" Step 3: Check if evaluation is positive")
-            if evaluation.lower().startswith("yes"):
+            if judgement.accepted:
                 print("✅ Final solution accepted.")
                 break
             else:
                 print(" Step 4: Generate instructions to correct the response")
-                instructions = f"Provide instructions to fix an answer based on these reasons why it is incorrect: {evaluation}"
-                response = client.chat.completions.create(
-                    model=model,
+                instructions = self._instructions(judgement)
+                if judgement.source == "judge":
                     # TODO: 6 - Define the message structure sent to the LLM to generate correction instructions (use temperature=0)
-                    messages=[
-                        {"role": "system", "content": self.persona},
-                        {"role": "user", "content": eval_prompt},
-                    ],
-                    temperature=0,
-                )
-                if response.choices[0].message.content is None:
-                    return None
-                evaluation = response.choices[0].message.content.strip()
+                    response = chat_completion(
+                        self.openai_api_key,
+                        **self.instructions_request(response_from_worker),
+                    )
+                    if response.choices[0].message.content is None:
+                        return None
+                    evaluation = response.choices[0].message.content.strip()
                 print(f"Instructions to fix:\n\t{instructions}")
 
                 print(" Step 5: Send feedback to worker agent for refinement")
-                prompt_to_evaluate = (
-                    f"The original prompt was: \n\t{initial_prompt}\n"
-                    f"The response to that prompt was: \n\t{response_from_worker}\n"
-                    f"It has been evaluated as incorrect.\n"
-                    f"Make only these corrections, do not alter content validity: {instructions}"
+                prompt_to_evaluate = self._refinement_prompt(
+                    initial_prompt, response_from_worker, instructions
                 )
             # TODO: 7 - Return a dictionary containing the final response, evaluation, and number of iterations
+        return self._result(response_from_worker, evaluation, i)
+
+    @tracked
+    async def aevaluate(
+        self, initial_prompt: str, candidate: str | None = None
+    ) -> dict[str, Any] | None:
+        """Async counterpart of evaluate with the same loop and return value."""
+        prompt_to_evaluate = initial_prompt
+        response_from_worker = ""
+        evaluation = "No evaluation performed"
+        i = -1  # Will be 0 after first iteration
+
+        for i in range(self.max_interactions):
+            update_usage_context(iteration=i + 1)
+            print(f"\n--- Interaction {i + 1} ---")
+
+            print(" Step 1: Worker agent generates a response to the prompt")
+            print(f"Prompt:\n{prompt_to_evaluate}")
+            reuse_candidate = i == 0 and candidate is not None
+            if self.candidates > 1 and not reuse_candidate:
+                response_from_worker, judgement = await self._abest_candidate(
+                    prompt_to_evaluate
+                )
+            else:
+                if reuse_candidate:
+                    print("Judging the response the worker already gave")
+                    response_from_worker = candidate
+                else:
+                    response_from_worker = await _arespond(
+                        self.worker_agent, prompt_to_evaluate
+                    )
+                print(f"Worker Agent Response:\n\t{response_from_worker}")
+
+                print(" Step 2: Evaluator agent judges the response")
+                judgement = await self._ajudge(response_from_worker)
+            if judgement is None:
+                return None
+            evaluation = judgement.evaluation
+            print(f"Evaluator Agent Evaluation:\n\t{evaluation}")
+
+            print(" Step 3: Check if evaluation is positive")
+            if judgement.accepted:
+                print("✅ Final solution accepted.")
+                break
+            else:
+                print(" Step 4: Generate instructions to correct the response")
+                instructions = self._instructions(judgement)
+                if judgement.source == "judge":
+                    response = await achat_completion(
+                        self.openai_api_key,
+                        **self.instructions_request(response_from_worker),
+                    )
+                    if response.choices[0].message.content is None:
+                        return None
+                    evaluation = response.choices[0].message.content.strip()
+                print(f"Instructions to fix:\n\t{instructions}")
+
+                print(" Step 5: Send feedback to worker agent for refinement")
+                prompt_to_evaluate = self._refinement_prompt(
+                    initial_prompt, response_from_worker, instructions
+                )
+        return self._result(response_from_worker, evaluation, i)
+
+    async def _aevaluate_closing(
+        self, initial_prompt: str, candidate: str | None
+    ) -> dict[str, Any] | None:
+        """Runs aevaluate on a private event loop and closes its clients."""
+        try:
+            return await self.aevaluate(initial_prompt, candidate)
+        finally:
+            await aclose_clients()
+
+    async def _abest_candidate(
+        self, prompt: str
+    ) -> tuple[str | None, Judgement | None]:
+        """
+        Generates ``candidates`` worker responses concurrently and judges each
+        as soon as it arrives. The first accepted candidate wins and the
+        requests still in flight are cancelled. If none is accepted, the
+        candidate picked by fallback_candidate is returned for refinement.
+        """
+
+        async def attempt(index: int) -> tuple[int, str | None, Judgement | None]:
+            temperature = self.candidate_temperature if index else 0
+            response = await _arespond(self.worker_agent, prompt, temperature)
+            return index, response, await self._ajudge(response)
+
+        tasks = [asyncio.create_task(attempt(i)) for i in range(self.candidates)]
+        outcomes: dict[int, tuple[str | None, Judgement | None]] = {}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, response, judgement = await finished
+                outcomes[index] = (response, judgement)
+                if judgement is not None and judgement.accepted:
+                    print(f"Candidate {index + 1} of {self.candidates} accepted:")
+                    print(f"Worker Agent Response:\n\t{response}")
+                    return response, judgement
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        index = self.fallback_candidate(
+            {i: judgement for i, (_, judgement) in outcomes.items()}
+        )
+        print(
+            f"None of {self.candidates} candidates accepted, "
+            f"refining candidate {index + 1}:"
+        )
+        print(f"Worker Agent Response:\n\t{outcomes[index][0]}")
+        return outcomes[index]
+
+    def fallback_candidate(self, judgements: Mapping[int, Judgement | None]) -> int:
+        """
+        Picks the candidate to refine when none was accepted: the
+        temperature-0 candidate (index 0) if it was judged, otherwise the
+        first judged candidate, preferring one the judge rejected over one
+        that already failed local validation. A candidate whose judgement
+        is None (the judge sent no content) is only picked if none was judged.
+        """
+        judged = [i for i in sorted(judgements) if judgements[i] is not None]
+        if not judged:
+            return min(judgements)
+        if 0 in judged:
+            return 0
+        return min(judged, key=lambda i: (judgements[i].source == "local", i))
+
+    def _judge(self, response_from_worker: str | None) -> Judgement | None:
+        """
+        Decides on a worker response: local validators first, then one
+        structured call when ``structured_judge`` is set, then the plain judge.
+        Returns None if the judge sends no content.
+        """
+        judgement = self.local_judgement(response_from_worker)
+        if judgement is not None:
+            return judgement
+        if self.structured_judge:
+            response = chat_completion(
+                self.openai_api_key, **self.judge_request(response_from_worker)
+            )
+            judgement = self.parse_reply(response.choices[0].message.content)
+            if judgement is not None:
+                return judgement
+            print("Structured judgement could not be parsed, asking the judge again.")
+        # TODO: 5 - Define the message structure sent to the LLM for evaluation (use temperature=0)
+        response = chat_completion(
+            self.openai_api_key,
+            **self.judge_request(response_from_worker, structured=False),
+        )
+        return self.parse_reply(response.choices[0].message.content, structured=False)
+
+    async def _ajudge(self, response_from_worker: str | None) -> Judgement | None:
+        """Async counterpart of _judge."""
+        judgement = self.local_judgement(response_from_worker)
+        if judgement is not None:
+            return judgement
+        if self.structured_judge:
+            response = await achat_completion(
+                self.openai_api_key, **self.judge_request(response_from_worker)
+            )
+            judgement = self.parse_reply(response.choices[0].message.content)
+            if judgement is not None:
+                return judgement
+            print("Structured judgement could not be parsed, asking the judge again.")
+        response = await achat_completion(
+            self.openai_api_key,
+            **self.judge_request(response_from_worker, structured=False),
+        )
+        return self.parse_reply(response.choices[0].message.content, structured=False)
+
+    def local_judgement(self, response_from_worker: str | None) -> Judgement | None:
+        """
+        Runs the validators on a worker response. Returns a rejection listing
+        the failures, an acceptance for a strict pass, or None when the judge
+        has to decide.
+        """
+        if not self.validators:
+            return None
+        result = run_validators(self.validators, response_from_worker or "")
+        if not result.passed:
+            return Judgement(
+                accepted=False,
+                evaluation="No, the answer fails local validation: "
+                + " ".join(result.reasons),
+                source="local",
+            )
+        if result.strict:
+            return Judgement(
+                accepted=True,
+                evaluation="Yes, the answer passes local validation.",
+                source="local",
+            )
+        return None
+
+    def judge_request(
+        self, response_from_worker: str | None, structured: bool | None = None
+    ) -> dict[str, Any]:
+        """
+        The request that judges a worker response: the structured request
+        when ``structured`` (by default ``structured_judge``) is set,
+        otherwise the plain Yes/No one. Batch callers send it and pass the
+        reply to parse_reply with the same ``structured``.
+        """
+        if self.structured_judge if structured is None else structured:
+            return self._structured_request(response_from_worker)
+        return {
+            "model": model,
+            "messages": self._judge_messages(self._eval_prompt(response_from_worker)),
+            "temperature": 0,
+        }
+
+    def parse_reply(
+        self, content: str | None, structured: bool | None = None
+    ) -> Judgement | None:
+        """
+        Reads the reply to judge_request. Returns None for a missing reply
+        and for a structured reply that cannot be parsed; the judge is then
+        asked again with the plain request.
+        """
+        if self.structured_judge if structured is None else structured:
+            return parse_judgement(content)
+        return self._plain_judgement(content)
+
+    def instructions_request(self, response_from_worker: str | None) -> dict[str, Any]:
+        """
+        The request sent after the judge rejects a response; its reply
+        becomes the evaluation that is reported.
+        """
+        return self.judge_request(response_from_worker, structured=False)
+
+    def refinement_prompt(
+        self,
+        initial_prompt: str,
+        response_from_worker: str | None,
+        judgement: Judgement,
+    ) -> str:
+        """The prompt asking the worker to fix a rejected response."""
+        return self._refinement_prompt(
+            initial_prompt, response_from_worker, self._instructions(judgement)
+        )
+
+    def _plain_judgement(self, content: str | None) -> Judgement | None:
+        if content is None:
+            return None
+        evaluation = content.strip()
+        return Judgement(evaluation.lower().startswith("yes"), evaluation)
+
+    def _structured_request(self, response_from_worker: str | None) -> dict[str, Any]:
+        return {
+            "model": model,
+            "messages": self._judge_messages(
+                f"{self._eval_prompt(response_from_worker)}\n{JSON_INSTRUCTIONS}"
+            ),
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+        }
+
+    def _instructions(self, judgement: Judgement) -> str:
+        if judgement.instructions:
+            return judgement.instructions
+        return f"Provide instructions to fix an answer based on these reasons why it is incorrect: {judgement.evaluation}"
+
+    def _eval_prompt(self, response_from_worker: str | None) -> str:
+        return (
+            f"Does the following answer: {response_from_worker}\n"
+            # TODO: 4 - Insert evaluation criteria here
+            f"Meet this criteria: {self.evaluation_criteria}\n"
+            f"Respond Yes or No, and the reason why it does or doesn't meet the criteria."
+        )
+
+    def _judge_messages(self, eval_prompt: str) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": self.persona},
+            {"role": "user", "content": eval_prompt},
+        ]
+
+    def _refinement_prompt(
+        self, initial_prompt: str, response_from_worker: str | None, instructions: str
+    ) -> str:
+        return (
+            f"The original prompt was: \n\t{initial_prompt}\n"
+            f"The response to that prompt was: \n\t{response_from_worker}\n"
+            f"It has been evaluated as incorrect.\n"
+            f"Make only these corrections, do not alter content validity: {instructions}"
+        )
+
+    def _result(
+        self, response_from_worker: str | None, evaluation: str, i: int
+    ) -> dict[str, Any]:
         return {
             "final_response": response_from_worker,
             "final_evaluation": evaluation,
@@ -373,10 +946,20 @@ class EvaluationAgent:
 class RoutingAgent:
     openai_api_key: str
     agents: list[WorkerAgent]
+    embedding_cache: EmbeddingCache | None = field(
+        default_factory=default_embedding_cache, repr=False
+    )
+
+    def __post_init__(self):
+        self._description_embeddings: dict[str, npt.NDArray[np.float32]] = {}
+        self._matrix: npt.NDArray[np.float32] = np.zeros((0, 0), dtype=np.float32)
+        self._matrix_descriptions: tuple[str, ...] | None = None
+        self._matrix_lock = threading.Lock()
 
     def get_embedding(self, text: str) -> list[float] | None:
         """
-        Fetches the embedding vector for given text using OpenAI's embedding API.
+        Fetches the embedding vector for given text using OpenAI's embedding API,
+        consulting the persistent embedding cache first.
 
         Parameters:
         text (str): Text to embed.
@@ -384,43 +967,122 @@ class RoutingAgent:
         Returns:
         list: The embedding vector.
         """
-        client = OpenAI(
-            base_url="https://openai.vocareum.com/v1", api_key=self.openai_api_key
-        )
-        response = client.embeddings.create(
-            model="text-embedding-3-large", input=text, encoding_format="float"
-        )
-        return response.data[0].embedding
+        return embed_text(self.openai_api_key, text, self.embedding_cache)
+
+    async def aget_embedding(self, text: str) -> list[float] | None:
+        """Async counterpart of get_embedding."""
+        return await aembed_text(self.openai_api_key, text, self.embedding_cache)
 
     # TODO: 3 - Define a method to route user prompts to the appropriate agent
-    def route(self, user_input: str) -> str:
-        """Route user prompts to the appropriate agent based on semantic similarity."""
+    @tracked
+    def route(self, user_input: str, stream: bool = False) -> str | Iterator[str]:
+        """
+        Route user prompts to the appropriate agent based on semantic similarity.
+
+        With ``stream=True`` the selected agent's function is asked to stream
+        too, and its iterator of token deltas is returned as is.
+        """
+        best_agent = self.select_agent(user_input)
+        if best_agent is None:
+            return "Sorry, no suitable agent could be selected."
+        if stream and _accepts(best_agent.func, "stream"):
+            return best_agent.func(user_input, stream=True)
+        return best_agent.func(user_input)
+
+    def select_agent(self, user_input: str) -> WorkerAgent | None:
+        """
+        Picks the agent whose description is most similar to ``user_input``
+        without calling it. Embeddings already in the cache are not requested
+        again.
+        """
+        # TODO: 5 - Compute the embedding of the agent description
+        description_matrix = self._description_matrix()
         # TODO: 4 - Compute the embedding of the user input prompt
-        input_emb = self.get_embedding(user_input) or 0.0
-        best_agent = None
-        best_score = -1
-
-        for agent in self.agents:
-            agent_emb = self.get_embedding(agent.description)
-            # TODO: 5 - Compute the embedding of the agent description
-            if agent_emb is None:
-                continue
-
-            similarity = np.dot(input_emb, agent_emb) / (
-                np.linalg.norm(input_emb) * np.linalg.norm(agent_emb)
-            )
-            print(f"{agent.name} = {similarity}")
+        input_emb = self.get_embedding(user_input)
+        return self._select_agent(input_emb, description_matrix)
 
-            # TODO: 6 - Add logic to select the best agent based on the similarity score between the user prompt and the agent descriptions
+    @tracked
+    async def aroute(
+        self, user_input: str, stream: bool = False
+    ) -> str | AsyncIterator[str]:
+        """
+        Async counterpart of route. The prompt and any descriptions not yet in
+        the matrix are embedded concurrently, then the selected agent's
+        function is awaited. With ``stream=True`` the result is an async
+        iterator of token deltas.
+        """
+        description_matrix, input_emb = await asyncio.gather(
+            self._adescription_matrix(), self.aget_embedding(user_input)
+        )
 
-            if similarity > best_score:  # Fixed: Added missing selection logic
-                best_score = similarity
-                best_agent = agent
+        best_agent = self._select_agent(input_emb, description_matrix)
         if best_agent is None:
             return "Sorry, no suitable agent could be selected."
+        return await _acall(best_agent, user_input, stream)
 
+    def _description_matrix(self) -> npt.NDArray[np.float32]:
+        """
+        Returns the normalized description matrix, one row per agent in
+        ``self.agents``. Descriptions are embedded once; the matrix is rebuilt
+        whenever the agents list (or a description) changes.
+        """
+        descriptions = tuple(agent.description for agent in self.agents)
+        with self._matrix_lock:
+            if descriptions != self._matrix_descriptions:
+                for description in descriptions:
+                    if description not in self._description_embeddings:
+                        self._description_embeddings[description] = (
+                            _normalize(self.get_embedding(description))
+                        )
+                self._build_matrix(descriptions)
+            return self._matrix
+
+    async def _adescription_matrix(self) -> npt.NDArray[np.float32]:
+        descriptions = tuple(agent.description for agent in self.agents)
+        if descriptions != self._matrix_descriptions:
+            missing = list(dict.fromkeys(
+                d for d in descriptions if d not in self._description_embeddings
+            ))
+            embeddings = await asyncio.gather(
+                *(self.aget_embedding(d) for d in missing)
+            )
+            with self._matrix_lock:
+                for description, embedding in zip(missing, embeddings, strict=True):
+                    self._description_embeddings[description] = _normalize(embedding)
+                self._build_matrix(descriptions)
+        return self._matrix
+
+    def _build_matrix(self, descriptions: tuple[str, ...]) -> None:
+        rows = [self._description_embeddings[d] for d in descriptions]
+        dim = max((row.size for row in rows), default=0)
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            # Descriptions that failed to embed keep a zero row and never win.
+            if row.size:
+                matrix[i] = row
+        self._matrix = matrix
+        self._matrix_descriptions = descriptions
+
+    def _select_agent(
+        self,
+        input_emb: list[float] | None,
+        description_matrix: npt.NDArray[np.float32],
+    ) -> WorkerAgent | None:
+        query = _normalize(input_emb)
+        if not query.size or not len(self.agents):
+            return None
+
+        # Rows are unit length, so one matrix-vector product gives every
+        # cosine similarity at once.
+        similarities = description_matrix @ query
+        for agent, similarity in zip(self.agents, similarities, strict=True):
+            print(f"{agent.name} = {similarity}")
+
+        # TODO: 6 - Add logic to select the best agent based on the similarity score between the user prompt and the agent descriptions
+        best = int(np.argmax(similarities))
+        best_agent, best_score = self.agents[best], float(similarities[best])
         print(f"[Router] Best agent: {best_agent.name} (score={best_score:.3f})")
-        return best_agent.func(user_input)
+        return best_agent
 
 
 @dataclass
@@ -428,28 +1090,102 @@ class ActionPlanningAgent:
     openai_api_key: str
     knowledge: str
 
+    @tracked
     def extract_steps_from_prompt(self, prompt: str):
         # TODO: 2 - Instantiate the OpenAI client using the provided API key
-        client = OpenAI(base_url=base_url, api_key=self.openai_api_key)
         # TODO: 3 - Call the OpenAI API to get a response from the "gpt-3.5-turbo" model.
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an action planning agent. Using your knowledge, you extract from the user prompt the steps requested to complete the action the user is asking for. You return the steps as a list. Only return the steps in your knowledge. Forget any previous context. This is your knowledge: {self.knowledge}",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-        )
-        # Provide the following system prompt along with the user's prompt:
-        # "You are an action planning agent. Using your knowledge, you extract from the user prompt the steps requested to complete the action the user is asking for. You return the steps as a list. Only return the steps in your knowledge. Forget any previous context. This is your knowledge: {pass the knowledge here}"
+        response = chat_completion(self.openai_api_key, **self.request(prompt))
 
         # TODO: 4 - Extract the response text from the OpenAI API response
         response_text = response.choices[0].message.content or ""
+        return self.parse_steps(response_text)
 
+    @tracked
+    async def aextract_steps_from_prompt(self, prompt: str):
+        """Async counterpart of extract_steps_from_prompt."""
+        response = await achat_completion(self.openai_api_key, **self.request(prompt))
+        response_text = response.choices[0].message.content or ""
+        return self.parse_steps(response_text)
+
+    def request(self, prompt: str) -> dict[str, Any]:
+        """The chat request extract_steps_from_prompt sends for ``prompt``."""
+        return {"model": model, "messages": self._messages(prompt), "temperature": 0}
+
+    def _messages(self, prompt: str) -> list[dict[str, str]]:
+        # Provide the following system prompt along with the user's prompt:
+        # "You are an action planning agent. Using your knowledge, you extract from the user prompt the steps requested to complete the action the user is asking for. You return the steps as a list. Only return the steps in your knowledge. Forget any previous context. This is your knowledge: {pass the knowledge here}"
+        return [
+            {
+                "role": "system",
+                "content": f"You are an action planning agent. Using your knowledge, you extract from the user prompt the steps requested to complete the action the user is asking for. You return the steps as a list. Only return the steps in your knowledge. Forget any previous context. This is your knowledge: {self.knowledge}",
+            },
+            {"role": "user", "content": prompt},
+        ]
+
+    def parse_steps(self, response_text: str) -> list[str]:
         # TODO: 5 - Clean and format the extracted steps by removing empty lines and unwanted text
         steps = [step.strip() for step in response_text.split("\n") if step.strip()]
 
         return steps
+
+
+async def _arespond(
+    agent: WorkerAgent, input_text: str, temperature: float = 0
+) -> str | None:
+    """
+    Awaits the agent's native arespond, or runs respond in a worker thread.
+    A non-zero ``temperature`` is only passed to agents that accept one.
+    """
+    arespond = getattr(agent, "arespond", None)
+    respond = arespond if arespond is not None else agent.respond
+    kwargs: dict[str, float] = {}
+    if temperature and _accepts(respond, "temperature"):
+        kwargs["temperature"] = temperature
+    if arespond is not None:
+        return await arespond(input_text, **kwargs)
+    return await asyncio.to_thread(agent.respond, input_text, **kwargs)
+
+
+async def _acall(agent: WorkerAgent, input_text: str, stream: bool = False) -> Any:
+    """
+    Awaits a routed agent's function. Coroutine functions are awaited directly,
+    an agent's own respond is swapped for arespond, and any other blocking
+    function runs in a worker thread so the loop stays free. When streaming,
+    a blocking function's iterator is advanced in worker threads as well.
+    """
+    func = agent.func
+    kwargs = {"stream": True} if stream and _accepts(func, "stream") else {}
+    if inspect.iscoroutinefunction(func):
+        return await func(input_text, **kwargs)
+    if func == getattr(agent, "respond", None) and hasattr(agent, "arespond"):
+        return await agent.arespond(input_text, **kwargs)  # type: ignore[attr-defined]
+    result = await asyncio.to_thread(func, input_text, **kwargs)
+    if isinstance(result, Iterator):
+        return _aiterate(result)
+    return result
+
+
+def _accepts(func: Callable[..., Any], parameter: str) -> bool:
+    try:
+        return parameter in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+async def _aiterate(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """Drains a blocking iterator from worker threads."""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def _normalize(vector: npt.ArrayLike | None) -> npt.NDArray[np.float32]:
+    """Returns ``vector`` as a unit-length float32 array (empty if missing)."""
+    if vector is None:
+        return np.zeros(0, dtype=np.float32)
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
@@ -0,0 +1,163 @@
+"""
+Opt-in cache for deterministic (temperature=0) chat completions.
+
+Requests are keyed by a SHA-256 of their canonical JSON form (model, messages
+and every other parameter), so only byte-identical requests share an entry.
+Lookups go through an in-memory LRU tier first and an optional SQLite tier
+second; disk entries expire after ``ttl`` seconds and the oldest are pruned
+beyond ``max_disk_entries``.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def request_key(request: Mapping[str, Any]) -> str:
+    """Canonical hash of a request's parameters."""
+    canonical = json.dumps(
+        request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(request: Mapping[str, Any]) -> bool:
+    """Only deterministic, single-choice, non-streaming requests are cached."""
+    return (
+        request.get("temperature", 1) == 0
+        and not request.get("stream")
+        and request.get("n", 1) == 1
+    )
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"hits={self.hits} (memory={self.memory_hits}, disk={self.disk_hits}) "
+            f"misses={self.misses} hit_rate={self.hit_rate:.1%}"
+        )
+
+
+@dataclass
+class CompletionCache:
+    """
+    Two-tier completion cache.
+
+    Parameters:
+    max_entries (int): Capacity of the in-memory LRU tier.
+    path (str | None): SQLite file for the disk tier; None keeps memory only.
+    ttl (float | None): Seconds a disk entry stays valid; None never expires.
+    max_disk_entries (int): Disk entries kept before the oldest are pruned.
+    """
+
+    max_entries: int = 1024
+    path: str | None = None
+    ttl: float | None = 7 * 24 * 3600
+    max_disk_entries: int = 100_000
+    stats: CacheStats = field(default_factory=CacheStats, init=False)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        if self.path is not None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS completions_created ON completions (created)"
+            )
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return value
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if self.ttl is None or time.time() - row[1] <= self.ttl:
+                        value = json.loads(row[0])
+                        self._remember(key, value)
+                        self.stats.disk_hits += 1
+                        return value
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            self._prune()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM completions")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, value: dict[str, Any]) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _prune(self) -> None:
+        assert self._conn is not None
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM completions WHERE created < ?", (time.time() - self.ttl,)
+            )
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY created LIMIT ?)",
+                (count - self.max_disk_entries,),
+            )
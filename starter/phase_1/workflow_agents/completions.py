@@ -0,0 +1,275 @@
+"""
+Single entry point for the chat completion requests made by the agents.
+
+Every agent sends its chat requests through ``chat_completion`` (or
+``achat_completion``), so cross-cutting behaviour such as the optional
+completion cache, coalescing of identical concurrent requests (see
+singleflight.py), rate limiting (see ratelimit.py) and usage accounting
+(see usage.py) is applied in one place. ``stream_chat_completion`` and
+``astream_chat_completion`` are the token-streaming variants; streamed
+requests are never cached.
+"""
+
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from openai.types.chat import ChatCompletion
+
+from .clients import get_async_client, get_client
+from .completion_cache import CompletionCache, is_cacheable, request_key
+from .singleflight import get_single_flight
+from .tracing import Span, current_span, span
+from .usage import acreate, create, current_labels, record_usage
+
+_cache: CompletionCache | None = None
+
+
+@dataclass
+class PromptCacheStats:
+    """
+    Provider-side prompt caching observed in responses.
+
+    ``cached_tokens`` comes from ``usage.prompt_tokens_details.cached_tokens``:
+    the part of the prompt the provider served from its prefix cache. OpenAI
+    caches prompts of 1024 tokens or more, matching on the longest identical
+    leading prefix, so static content has to come first for this to grow.
+    """
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def record(self, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+    def __str__(self) -> str:
+        return (
+            f"calls={self.calls} prompt_tokens={self.prompt_tokens} "
+            f"cached_tokens={self.cached_tokens} ({self.cached_ratio:.1%})"
+        )
+
+
+def set_completion_cache(cache: CompletionCache | None) -> None:
+    """Enables the completion cache for every agent; None disables it."""
+    global _cache
+    _cache = cache
+
+
+def get_completion_cache() -> CompletionCache | None:
+    return _cache
+
+
+def chat_completion(api_key: str, **request: Any) -> ChatCompletion:
+    """
+    Sends a chat completion request through the shared client.
+
+    Parameters:
+    api_key (str): OpenAI API key.
+    request: Keyword arguments for ``chat.completions.create``.
+
+    Returns:
+    ChatCompletion: The provider response, or the cached copy of an identical
+    earlier temperature=0 request when the completion cache is enabled. Only
+    a response this call paid for carries ``usage``; cached copies and
+    responses shared with an identical request in flight have none.
+    """
+    with span("chat", model=request["model"], **current_labels()):
+        started = time.perf_counter()
+        cache, key = _cache, None
+        if cache is not None and is_cacheable(request):
+            key = request_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                response = ChatCompletion.model_validate({**cached, "usage": None})
+                record_usage(
+                    "chat", request["model"], response, started, cache_hit=True
+                )
+                return response
+
+        def send() -> tuple[ChatCompletion, int]:
+            return create(get_client(api_key).chat.completions, **request)
+
+        (response, retries), shared = _coalesce(api_key, request, send)
+        record_usage(
+            "chat", request["model"], response, started, retries, cache_hit=shared
+        )
+        if shared:
+            return _without_usage(response)
+        _store(cache, key, response)
+        return response
+
+
+async def achat_completion(api_key: str, **request: Any) -> ChatCompletion:
+    """Async counterpart of chat_completion."""
+    with span("chat", model=request["model"], **current_labels()):
+        started = time.perf_counter()
+        cache, key = _cache, None
+        if cache is not None and is_cacheable(request):
+            key = request_key(request)
+            cached = cache.get(key)
+            if cached is not None:
+                response = ChatCompletion.model_validate({**cached, "usage": None})
+                record_usage(
+                    "chat", request["model"], response, started, cache_hit=True
+                )
+                return response
+
+        async def send() -> tuple[ChatCompletion, int]:
+            return await acreate(get_async_client(api_key).chat.completions, **request)
+
+        (response, retries), shared = await _acoalesce(api_key, request, send)
+        record_usage(
+            "chat", request["model"], response, started, retries, cache_hit=shared
+        )
+        if shared:
+            return _without_usage(response)
+        _store(cache, key, response)
+        return response
+
+
+def stream_chat_completion(
+    api_key: str, on_usage: Callable[[Any], None] | None = None, **request: Any
+) -> Iterator[str]:
+    """
+    Streams a chat completion, yielding content deltas as they arrive.
+
+    Parameters:
+    api_key (str): OpenAI API key.
+    on_usage (Callable | None): Called with the final chunk, which carries the
+        request's ``usage``.
+    request: Keyword arguments for ``chat.completions.create``; ``stream`` is
+        forced on.
+
+    Yields:
+    str: Non-empty content deltas of the first choice.
+    """
+    # Labels and parent span are taken now: the stream is consumed later,
+    # possibly elsewhere.
+    labels, parent = current_labels(), current_span()
+
+    def deltas() -> Iterator[str]:
+        with span(
+            "chat", parent, True, model=request["model"], stream=True, **labels
+        ) as opened:
+            started = time.perf_counter()
+            response, retries = create(
+                get_client(api_key).chat.completions,
+                **request,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    _stream_usage(
+                        request, chunk, started, retries, labels, opened, on_usage
+                    )
+                delta = _delta(chunk)
+                if delta:
+                    yield delta
+
+    return deltas()
+
+
+def astream_chat_completion(
+    api_key: str, on_usage: Callable[[Any], None] | None = None, **request: Any
+) -> AsyncIterator[str]:
+    """Async counterpart of stream_chat_completion."""
+    labels, parent = current_labels(), current_span()
+
+    async def deltas() -> AsyncIterator[str]:
+        with span(
+            "chat", parent, True, model=request["model"], stream=True, **labels
+        ) as opened:
+            started = time.perf_counter()
+            response, retries = await acreate(
+                get_async_client(api_key).chat.completions,
+                **request,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    _stream_usage(
+                        request, chunk, started, retries, labels, opened, on_usage
+                    )
+                delta = _delta(chunk)
+                if delta:
+                    yield delta
+
+    return deltas()
+
+
+def _stream_usage(
+    request: dict[str, Any],
+    chunk: Any,
+    started: float,
+    retries: int,
+    labels: dict[str, Any],
+    opened: Span | None,
+    on_usage: Callable[[Any], None] | None,
+) -> None:
+    record = record_usage(
+        "chat", request["model"], chunk, started, retries, labels=labels
+    )
+    if opened is not None:
+        opened.attributes.update(record.measurements())
+    if on_usage is not None:
+        on_usage(chunk)
+
+
+def _delta(chunk: Any) -> str | None:
+    # The final chunk of a stream may carry only usage and no choices.
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+def _coalesce(
+    api_key: str, request: dict[str, Any], send: Callable[[], Any]
+) -> tuple[Any, bool]:
+    """Shares the result of an identical deterministic request already in flight."""
+    flights = get_single_flight()
+    if flights is None or not is_cacheable(request):
+        return send(), False
+    return flights.do(("chat", api_key, request_key(request)), send)
+
+
+async def _acoalesce(
+    api_key: str, request: dict[str, Any], send: Callable[[], Awaitable[Any]]
+) -> tuple[Any, bool]:
+    flights = get_single_flight()
+    if flights is None or not is_cacheable(request):
+        return await send(), False
+    return await flights.ado(("chat", api_key, request_key(request)), send)
+
+
+def _without_usage(response: Any) -> Any:
+    """
+    A copy of a shared response without ``usage``: the leader's call paid for
+    it, and callers such as PromptCacheStats would count it again.
+    """
+    if hasattr(response, "model_copy"):
+        return response.model_copy(update={"usage": None})
+    return response
+
+
+def _store(cache: CompletionCache | None, key: str | None, response: Any) -> None:
+    if cache is not None and key is not None and hasattr(response, "model_dump"):
+        cache.put(key, response.model_dump(mode="json"))
@@ -0,0 +1,176 @@
+"""
+Persistent, content-addressed cache for embedding vectors.
+
+Entries are keyed by a SHA-256 of the embedding model and the exact input text
+and stored as float32 blobs in SQLite, so every process and every run on the
+machine reuses vectors it has already paid for. The least recently used
+entries are evicted once the cache grows past its size bound.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+
+import numpy as np
+
+default_cache_path = os.path.join(
+    os.path.expanduser("~"), ".cache", "agentic_workflows", "embeddings.sqlite3"
+)
+
+
+def embedding_key(model: str, text: str) -> str:
+    """Returns the content address of ``text`` embedded with ``model``."""
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+
+@dataclass
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache with least-recently-used eviction.
+
+    Parameters:
+    path (str): SQLite database file; parent directories are created.
+    max_bytes (int): Upper bound on the total size of stored vectors.
+    """
+
+    path: str = default_cache_path
+    max_bytes: int = 512 * 1024 * 1024
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access "
+            "ON embeddings (last_access)"
+        )
+        self._total_bytes = self._stored_bytes()
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        return self.get_many(model, [text])[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[list[float] | None]:
+        """
+        Looks up several texts at once.
+
+        Returns:
+        list: One embedding per text, or None where the text is not cached.
+        """
+        keys = [embedding_key(model, text) for text in texts]
+        found: dict[str, list[float]] = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = list(dict.fromkeys(keys[start : start + 500]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                if rows:
+                    self._conn.execute(
+                        "UPDATE embeddings SET last_access = ? "
+                        f"WHERE key IN ({','.join('?' * len(rows))})",
+                        [time.time(), *(key for key, _ in rows)],
+                    )
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put(self, model: str, text: str, embedding: Sequence[float]) -> None:
+        self.put_many(model, [(text, embedding)])
+
+    def put_many(
+        self, model: str, items: Sequence[tuple[str, Sequence[float]]]
+    ) -> None:
+        """Stores ``(text, embedding)`` pairs and evicts old entries if needed."""
+        now = time.time()
+        rows = []
+        for text, embedding in items:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows.append((embedding_key(model, text), model, blob, len(blob), now))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(key, model, vector, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._total_bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _evict(self) -> None:
+        # Other processes may share the file, so re-read the true size first.
+        self._total_bytes = self._stored_bytes()
+        # Evict down to 90% of the bound so eviction does not run on every put.
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows]
+            )
+            self._total_bytes -= sum(nbytes for _, nbytes in rows)
+
+
+_default_cache: EmbeddingCache | None = None
+_default_lock = threading.Lock()
+
+
+def default_embedding_cache() -> EmbeddingCache | None:
+    """
+    Returns the process-wide cache shared by the RAG and routing agents.
+    The location can be changed with ``EMBEDDING_CACHE_PATH``; setting it to
+    an empty string disables caching.
+    """
+    global _default_cache
+    path = os.getenv("EMBEDDING_CACHE_PATH", default_cache_path)
+    if not path:
+        return None
+    with _default_lock:
+        if _default_cache is None or _default_cache.path != path:
+            _default_cache = EmbeddingCache(path)
+        return _default_cache
@@ -0,0 +1,608 @@
+"""
+Client-side rate limiting shared by every model request.
+
+``usage.create`` and ``usage.acreate`` send each chat, streaming chat and
+embedding request through the installed ``RateLimiter``, which
+
+- paces requests and tokens per minute with token buckets; limits are
+  configured, learned from the provider's ``x-ratelimit-*`` headers or,
+  failing both, measured: a 429 sets the request rate just below the rate
+  that was succeeding, which then creeps up again with every success,
+- corrects estimated token charges from each response's ``usage`` (for a
+  streaming request, from the final chunk's),
+- keeps an AIMD concurrency window that grows by about one request per
+  window of successes and is cut by ``decrease_factor`` on a 429; a
+  streaming request holds its slot until its stream ends,
+- retries 429s, 5xx responses and connection errors with decorrelated
+  jitter, waiting at least as long as ``retry-after`` asks.
+
+The SDK's own retries would hide 429s from the limiter, so
+``set_rate_limiter`` turns them off while a limiter is installed and
+restores them when it is removed.
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator, Mapping
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+import openai
+
+from .clients import configure_clients, get_config
+
+# (response, retries taken by the client, response headers or None)
+Sent = tuple[Any, int, Mapping[str, str] | None]
+
+RETRYABLE = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+)
+
+# Seconds of successes the measured request rate is based on.
+_MEASURE_WINDOW = 5.0
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+@dataclass
+class TokenBucket:
+    """
+    Refills at ``per_minute / 60`` units per second up to ``capacity``.
+    Reservations may overdraw the bucket; the caller then waits until the
+    overdraft has refilled, so concurrent callers queue in arrival order.
+    """
+
+    per_minute: float
+    capacity: float = 0.0
+
+    def __post_init__(self):
+        if not self.capacity:
+            # Providers enforce per-minute limits over one-second windows.
+            self.capacity = max(1.0, self.per_minute / 60)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Takes ``amount`` and returns the seconds to wait before using it."""
+        with self._lock:
+            self._refill()
+            self._level -= amount
+            return 0.0 if self._level >= 0 else -self._level / self._rate()
+
+    def settle(self, correction: float) -> None:
+        """Charges (or refunds, if negative) the difference to an estimate."""
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level - correction)
+
+    def set_rate(self, per_minute: float) -> None:
+        with self._lock:
+            self._refill()
+            self.per_minute = per_minute
+            self.capacity = max(1.0, per_minute / 60)
+            self._level = min(self._level, self.capacity)
+
+    def drain_for(self, seconds: float) -> None:
+        """Empties the bucket so it only refills after ``seconds``."""
+        with self._lock:
+            self._refill()
+            self._level = min(self._level, -seconds * self._rate())
+
+    def _rate(self) -> float:
+        return self.per_minute / 60
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self._rate()
+        )
+        self._updated = now
+
+
+@dataclass
+class ConcurrencyWindow:
+    """
+    Additive-increase / multiplicative-decrease limit on requests in flight.
+
+    Parameters:
+    limit (float): Current window; starts at the initial concurrency.
+    minimum (int): The window never shrinks below this.
+    maximum (int): The window never grows above this.
+    decrease_factor (float): Multiplier applied on a throttled request.
+    decrease_interval (float): Minimum seconds between two decreases, so one
+        burst of 429s counts as a single congestion signal.
+    """
+
+    limit: float = 8.0
+    minimum: int = 1
+    maximum: int = 64
+    decrease_factor: float = 0.5
+    decrease_interval: float = 1.0
+
+    def __post_init__(self):
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def aacquire(self) -> None:
+        # Waiters may live on several event loops and threads, so async
+        # callers poll instead of waiting on a loop-bound primitive.
+        delay = 0.005
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, succeeded: bool = False, throttled: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if succeeded:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            self._condition.notify_all()
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    waited: float = 0.0  # summed over all callers
+
+    def __str__(self) -> str:
+        return (
+            f"requests={self.requests} retries={self.retries} "
+            f"throttled={self.throttled} failures={self.failures} "
+            f"waited={self.waited:.2f}s"
+        )
+
+
+# Called once when a held stream ends: (final usage chunk or None, completed).
+StreamEnded = Callable[[Any, bool], None]
+
+
+class LimitedStream:
+    """
+    Wraps a streamed response whose concurrency slot is held until the
+    stream is exhausted, fails, is closed or is garbage collected.
+    """
+
+    def __init__(self, stream: Any, ended: StreamEnded):
+        self._stream = stream
+        self._chunks = iter(stream)
+        self._ended: StreamEnded | None = ended
+        self._usage: Any = None
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._end(completed=True)
+            raise
+        except BaseException:
+            self.close()
+            raise
+        if getattr(chunk, "usage", None) is not None:
+            self._usage = chunk
+        return chunk
+
+    def __enter__(self) -> "LimitedStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        self._end(completed=False)
+
+    def close(self) -> None:
+        """Stops the stream early and frees its slot."""
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+        self._end(completed=False)
+
+    def _end(self, completed: bool) -> None:
+        ended, self._ended = self._ended, None
+        if ended is not None:
+            ended(self._usage, completed)
+
+
+class AsyncLimitedStream:
+    """Async counterpart of LimitedStream."""
+
+    def __init__(self, stream: Any, ended: StreamEnded):
+        self._stream = stream
+        self._chunks = stream.__aiter__()
+        self._ended: StreamEnded | None = ended
+        self._usage: Any = None
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._end(completed=True)
+            raise
+        except BaseException:
+            await self.close()
+            raise
+        if getattr(chunk, "usage", None) is not None:
+            self._usage = chunk
+        return chunk
+
+    async def __aenter__(self) -> "AsyncLimitedStream":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    def __del__(self) -> None:
+        self._end(completed=False)
+
+    async def close(self) -> None:
+        """Stops the stream early and frees its slot."""
+        close = getattr(self._stream, "close", None) or getattr(
+            self._stream, "aclose", None
+        )
+        try:
+            if close is not None:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+        finally:
+            self._end(completed=False)
+
+    def _end(self, completed: bool) -> None:
+        ended, self._ended = self._ended, None
+        if ended is not None:
+            ended(self._usage, completed)
+
+
+@dataclass
+class RateLimiter:
+    """
+    Parameters:
+    requests_per_minute (float | None): Request ceiling; learned from the
+        ``x-ratelimit-limit-requests`` header when None.
+    tokens_per_minute (float | None): Token ceiling; learned from
+        ``x-ratelimit-limit-tokens`` when None.
+    concurrency (int): Initial AIMD window.
+    max_concurrency (int): Upper bound of the window.
+    max_retries (int): Retries per request before the error is raised.
+    base_delay (float): Smallest backoff in seconds.
+    max_delay (float): Largest backoff in seconds.
+    rate_increase (float): Requests per minute added to a measured request
+        rate after every success.
+    seed (int | None): Seed for the backoff jitter.
+    """
+
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    concurrency: int = 8
+    max_concurrency: int = 64
+    max_retries: int = 6
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    rate_increase: float = 0.5
+    seed: int | None = None
+    stats: RateLimitStats = field(default_factory=RateLimitStats, init=False)
+
+    def __post_init__(self):
+        self.window = ConcurrencyWindow(
+            limit=float(self.concurrency), maximum=self.max_concurrency
+        )
+        self._requests = _bucket(self.requests_per_minute)
+        self._tokens = _bucket(self.tokens_per_minute)
+        self._resume_at = 0.0
+        # The request rate is measured from 429s until a limit is known.
+        self._measure = self.requests_per_minute is None
+        self._successes: deque[float] = deque()
+        self._last_measurement = 0.0
+        self._lock = threading.Lock()
+        self._random = random.Random(self.seed)
+
+    def call(
+        self, send: Callable[[], Sent], request: Mapping[str, Any]
+    ) -> tuple[Any, int]:
+        """
+        Sends a request through the limiter, retrying retryable failures.
+
+        Parameters:
+        send (Callable): Performs the request once; returns the response,
+            the client's own retries and the response headers.
+        request (Mapping): The request parameters, used to estimate tokens.
+
+        Returns:
+        tuple: The response and the total number of retries.
+        """
+        tokens = estimate_request_tokens(request)
+        retries = 0
+        backoff = self.base_delay
+        while True:
+            # Reserve only once a slot is held, so a rate learned while
+            # waiting for the slot already applies.
+            self.window.acquire()
+            try:
+                # Inside the try: an interrupted wait must still free the slot.
+                self._wait(self._reserve(tokens))
+                response, client_retries, headers = send()
+            except RETRYABLE as e:
+                wait = self._failed(e, tokens)
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                backoff = self._backoff(backoff)
+                self._wait(max(backoff, wait))
+                continue
+            except BaseException:
+                self.window.release()
+                raise
+            if request.get("stream"):
+                ended = self._stream_ended(headers, tokens)
+                return LimitedStream(response, ended), retries + client_retries
+            self._succeeded(response, headers, tokens)
+            return response, retries + client_retries
+
+    async def acall(
+        self, send: Callable[[], Awaitable[Sent]], request: Mapping[str, Any]
+    ) -> tuple[Any, int]:
+        """Async counterpart of call."""
+        tokens = estimate_request_tokens(request)
+        retries = 0
+        backoff = self.base_delay
+        while True:
+            await self.window.aacquire()
+            try:
+                # Inside the try: a call cancelled while paced must still
+                # free the slot (best-of-N cancels its losing candidates).
+                await self._await(self._reserve(tokens))
+                response, client_retries, headers = await send()
+            except RETRYABLE as e:
+                wait = self._failed(e, tokens)
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                backoff = self._backoff(backoff)
+                await self._await(max(backoff, wait))
+                continue
+            except BaseException:
+                self.window.release()
+                raise
+            if request.get("stream"):
+                ended = self._stream_ended(headers, tokens)
+                return AsyncLimitedStream(response, ended), retries + client_retries
+            self._succeeded(response, headers, tokens)
+            return response, retries + client_retries
+
+    def _stream_ended(
+        self, headers: Mapping[str, str] | None, tokens: int
+    ) -> StreamEnded:
+        """
+        Settles a streamed request once its stream ends: a completed stream
+        counts as a success charged with its final chunk's ``usage``; an
+        abandoned or broken one only frees the slot and keeps the estimate.
+        """
+
+        def ended(usage_chunk: Any, completed: bool) -> None:
+            if completed:
+                self._succeeded(usage_chunk, headers, tokens)
+            else:
+                self.window.release()
+
+        return ended
+
+    def _reserve(self, tokens: int) -> float:
+        waits = [self._resume_at - time.monotonic()]
+        if self._requests is not None:
+            waits.append(self._requests.reserve(1))
+        if self._tokens is not None:
+            waits.append(self._tokens.reserve(tokens))
+        return max(waits)
+
+    def _wait(self, seconds: float) -> None:
+        if seconds > 0:
+            self._add_wait(seconds)
+            time.sleep(seconds)
+
+    async def _await(self, seconds: float) -> None:
+        if seconds > 0:
+            self._add_wait(seconds)
+            await asyncio.sleep(seconds)
+
+    def _add_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.stats.waited += seconds
+
+    def _backoff(self, previous: float) -> float:
+        """Decorrelated jitter: uniform between the base and 3x the last delay."""
+        with self._lock:
+            return min(
+                self.max_delay, self._random.uniform(self.base_delay, previous * 3)
+            )
+
+    def _succeeded(
+        self, response: Any, headers: Mapping[str, str] | None, tokens: int
+    ) -> None:
+        self.window.release(succeeded=True)
+        with self._lock:
+            self.stats.requests += 1
+            if self._measure:
+                now = time.monotonic()
+                self._successes.append(now)
+                while now - self._successes[0] > _MEASURE_WINDOW:
+                    self._successes.popleft()
+                if self._requests is not None:
+                    self._requests.set_rate(
+                        self._requests.per_minute + self.rate_increase
+                    )
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if self._tokens is not None and actual is not None:
+            self._tokens.settle(actual - tokens)
+        if headers:
+            self._learn(headers)
+
+    def _failed(self, error: Exception, tokens: int) -> float:
+        """Records a retryable failure and returns the wait it asks for."""
+        throttled = isinstance(error, openai.RateLimitError)
+        self.window.release(throttled=throttled)
+        if self._tokens is not None:
+            self._tokens.settle(-tokens)
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        wait = _retry_after(headers)
+        with self._lock:
+            self.stats.retries += 1
+            self.stats.throttled += throttled
+            self.stats.failures += not throttled
+            if throttled and wait:
+                # Everyone waits out the provider's penalty, not just this call.
+                self._resume_at = max(self._resume_at, time.monotonic() + wait)
+            if throttled and self._measure:
+                self._measure_rate()
+        return wait
+
+    def _measure_rate(self) -> None:
+        """Caps the request rate just below the recent rate of successes."""
+        now = time.monotonic()
+        if (
+            not self._successes
+            or now - self._last_measurement < self.window.decrease_interval
+        ):
+            return
+        self._last_measurement = now
+        elapsed = now - self._successes[0]
+        observed = len(self._successes) / max(elapsed, 1.0) * 60
+        current = self._requests.per_minute if self._requests else observed
+        rate = max(1.0, min(current, observed) * 0.95)
+        if self._requests is None:
+            self._requests = TokenBucket(rate)
+        else:
+            self._requests.set_rate(rate)
+        # The provider's allowance is used up right now, so start empty.
+        self._requests.drain_for(0.0)
+
+    def _learn(self, headers: Mapping[str, str]) -> None:
+        """Adopts advertised limits and pauses when a budget is exhausted."""
+        limit_requests = _number(headers.get("x-ratelimit-limit-requests"))
+        limit_tokens = _number(headers.get("x-ratelimit-limit-tokens"))
+        with self._lock:
+            if self.requests_per_minute is None and limit_requests:
+                self._measure = False
+                if (
+                    self._requests is None
+                    or self._requests.per_minute != limit_requests
+                ):
+                    self._requests = TokenBucket(limit_requests)
+            if (
+                self.tokens_per_minute is None
+                and limit_tokens
+                and (self._tokens is None or self._tokens.per_minute != limit_tokens)
+            ):
+                self._tokens = TokenBucket(limit_tokens)
+        for kind, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+            remaining = _number(headers.get(f"x-ratelimit-remaining-{kind}"))
+            reset = _duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if bucket is not None and remaining == 0 and reset:
+                bucket.drain_for(reset)
+
+
+_limiter: RateLimiter | None = None
+# The SDK retries configured before a limiter switched them off.
+_client_retries: int | None = None
+
+
+def set_rate_limiter(limiter: RateLimiter | None) -> None:
+    """
+    Routes every request through ``limiter``; None removes it. The SDK's
+    own retries are switched off while a limiter is installed and set back
+    to their previous value when it is removed.
+    """
+    global _limiter, _client_retries
+    config = get_config()
+    if limiter is not None:
+        if _limiter is None:
+            _client_retries = config.max_retries
+        retries = 0
+    else:
+        retries = config.max_retries if _client_retries is None else _client_retries
+        _client_retries = None
+    _limiter = limiter
+    if config.max_retries != retries:
+        configure_clients(replace(config, max_retries=retries))
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _limiter
+
+
+def estimate_request_tokens(request: Mapping[str, Any]) -> int:
+    """Prompt size (~4 characters per token) plus the completion allowance."""
+    prompt = request.get("messages", request.get("input", ""))
+    text = prompt if isinstance(prompt, str) else json.dumps(prompt, default=str)
+    completion = request.get("max_completion_tokens") or request.get("max_tokens") or 0
+    return len(text) // 4 + 1 + int(completion)
+
+
+def _bucket(per_minute: float | None) -> TokenBucket | None:
+    return TokenBucket(per_minute) if per_minute else None
+
+
+def _retry_after(headers: Mapping[str, str]) -> float:
+    milliseconds = _number(headers.get("retry-after-ms"))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    seconds = _number(headers.get("retry-after"))
+    if seconds is not None:
+        return seconds
+    return max(
+        _duration(headers.get("x-ratelimit-reset-requests")),
+        _duration(headers.get("x-ratelimit-reset-tokens")),
+    )
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _duration(value: str | None) -> float:
+    """Parses reset durations such as ``"1s"``, ``"6m0s"`` or ``"250ms"``."""
+    if not value:
+        return 0.0
+    return sum(
+        float(amount) * _UNITS[unit] for amount, unit in _DURATION.findall(value)
+    )
@@ -0,0 +1,215 @@
+"""
+Nested timing spans for workflow runs.
+
+A span covers one unit of work (a workflow step, an agent method, a model
+call) and records its start and end times, attributes and parent span. The
+current span is held in a context variable, so spans nest along the call
+tree (step -> route -> evaluate -> respond -> chat) across
+``asyncio`` tasks and into threads that copy the context.
+
+Tracing is off until a ``Tracer`` is installed with ``set_tracer``; until
+then ``span`` does nothing. A tracer exports finished spans as JSONL or in
+the Chrome trace-event format, which chrome://tracing and Perfetto open as a
+timeline.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+
+
+@dataclass
+class Span:
+    """
+    Parameters:
+    name (str): What the span covers, e.g. ``"EvaluationAgent.evaluate"``.
+    span_id (int): Unique within the process.
+    parent_id (int | None): The enclosing span, if any.
+    start (float): Wall-clock start in seconds since the epoch.
+    end (float | None): Wall-clock end; None while the span is open.
+    lane (str): Thread or asyncio task the span started on.
+    attributes (dict): Labels and measurements attached to the span.
+    error (str | None): The exception that ended the span, if any.
+    """
+
+    name: str
+    span_id: int
+    parent_id: int | None
+    start: float
+    lane: str
+    end: float | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.time()) - self.start
+
+
+@dataclass
+class Tracer:
+    """Collects finished spans of a run."""
+
+    spans: list[Span] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def start_span(
+        self, name: str, parent: Span | None = None, **attributes: Any
+    ) -> Span:
+        """Opens a span under ``parent`` (default: the current span)."""
+        parent = parent if parent is not None else _current.get()
+        return Span(
+            name=name,
+            span_id=next(_ids),
+            parent_id=parent.span_id if parent is not None else None,
+            start=time.time(),
+            lane=_lane(),
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: BaseException | None = None) -> None:
+        span.end = time.time()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    def export_jsonl(self, path: str) -> None:
+        """Writes one JSON object per finished span, in start order."""
+        with open(path, "w", encoding="utf-8") as file:
+            for span in self._sorted():
+                record = asdict(span)
+                record["duration"] = span.duration
+                file.write(json.dumps(record, default=str) + "\n")
+
+    def export_chrome(self, path: str) -> None:
+        """
+        Writes the spans as Chrome trace events: one complete ("X") event per
+        span, with one timeline row per thread or asyncio task.
+        """
+        spans = self._sorted()
+        lanes = {
+            lane: tid for tid, lane in enumerate(dict.fromkeys(s.lane for s in spans))
+        }
+        pid = os.getpid()
+        events: list[dict[str, Any]] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": lane},
+            }
+            for lane, tid in lanes.items()
+        ]
+        for span in spans:
+            args = {**span.attributes, "span_id": span.span_id}
+            if span.parent_id is not None:
+                args["parent_id"] = span.parent_id
+            if span.error is not None:
+                args["error"] = span.error
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".")[0],
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": lanes[span.lane],
+                    "args": args,
+                }
+            )
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str
+            )
+
+    def export(self, path: str) -> None:
+        """Exports as JSONL for ``.jsonl`` paths, Chrome trace format otherwise."""
+        if path.endswith(".jsonl"):
+            self.export_jsonl(path)
+        else:
+            self.export_chrome(path)
+
+    def _sorted(self) -> list[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: (s.start, s.span_id))
+
+
+_tracer: Tracer | None = None
+
+
+def set_tracer(tracer: Tracer | None) -> None:
+    """Enables tracing into ``tracer``; None disables it."""
+    global _tracer
+    _tracer = tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def span(
+    name: str, parent: Span | None = None, detached: bool = False, **attributes: Any
+) -> Iterator[Span | None]:
+    """
+    Runs the enclosed block as a child span of ``parent`` (default: the
+    current span). A ``detached`` span does not become the current span; use
+    it where the block suspends into other code, as a generator does.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+    opened = tracer.start_span(name, parent, **attributes)
+    token = None if detached else _current.set(opened)
+    try:
+        yield opened
+    except BaseException as e:
+        tracer.end_span(opened, e)
+        raise
+    else:
+        tracer.end_span(opened)
+    finally:
+        if token is not None:
+            _current.reset(token)
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Adds attributes to the current span, if tracing is on."""
+    current = _current.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def _lane() -> str:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return f"{threading.current_thread().name}/{task.get_name()}"
+    return threading.current_thread().name
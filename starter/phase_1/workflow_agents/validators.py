@@ -0,0 +1,192 @@
+"""
+Local checks that EvaluationAgent runs before asking the LLM judge.
+
+A validator is any callable taking the worker's response and returning a
+``ValidationResult``. When a response fails a validator the judge is skipped
+and the failure reasons go straight back to the worker as correction
+instructions. When every validator passes and at least one of them is
+``strict`` the response is accepted without a judge call; otherwise the
+judge decides as before.
+
+Three validators cover the formats used by the workflow:
+
+- ``RegexValidator`` for sentence patterns such as user stories,
+- ``RequiredFieldsValidator`` for ``Field: value`` layouts such as tasks,
+- ``SchemaValidator`` for JSON objects with required, typed keys.
+"""
+
+import json
+import re
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+# Leading list markers and markdown emphasis allowed around a field label,
+# e.g. "- **Task ID:** 1" or "### Task Title: ...".
+_LABEL_PREFIX = r"^[ \t>*_#\-\d.)]*"
+_LABEL_SUFFIX = r"[ \t*_]*:"
+
+
+@dataclass
+class ValidationResult:
+    """
+    Parameters:
+    passed (bool): Whether the response satisfied the check.
+    reasons (list[str]): Why it failed; empty when it passed.
+    strict (bool): A pass is enough to accept the response without the judge.
+    """
+
+    passed: bool
+    reasons: list[str] = field(default_factory=list)
+    strict: bool = False
+
+
+Validator = Callable[[str], ValidationResult]
+
+
+@dataclass
+class RegexValidator:
+    """
+    Requires ``pattern`` to match the response at least ``min_matches`` times.
+
+    Parameters:
+    pattern (str): Regular expression searched for in the response.
+    description (str): What the pattern expects, used in the failure reason.
+    min_matches (int): Matches needed to pass.
+    flags (int): ``re`` flags; case-insensitive and multi-line by default.
+    strict (bool): Accept passing responses without the judge.
+    """
+
+    pattern: str
+    description: str
+    min_matches: int = 1
+    flags: int = re.IGNORECASE | re.MULTILINE
+    strict: bool = False
+
+    def __post_init__(self):
+        self._regex = re.compile(self.pattern, self.flags)
+
+    def __call__(self, response: str) -> ValidationResult:
+        matches = len(self._regex.findall(response))
+        if matches >= self.min_matches:
+            return ValidationResult(True, strict=self.strict)
+        return ValidationResult(
+            False,
+            [
+                f"Expected at least {self.min_matches} {self.description}, "
+                f"found {matches}."
+            ],
+        )
+
+
+@dataclass
+class RequiredFieldsValidator:
+    """
+    Requires every field label (``"Task ID:"``, ``"**Task ID**:"``, ...) to
+    appear at the start of a line. With ``complete_items`` each field must
+    also appear as often as the most frequent one, so every item of a list
+    carries all fields.
+
+    Parameters:
+    fields (list[str]): Field labels without the colon.
+    complete_items (bool): Require the same count for every field.
+    strict (bool): Accept passing responses without the judge.
+    """
+
+    fields: list[str]
+    complete_items: bool = True
+    strict: bool = False
+
+    def __post_init__(self):
+        self._patterns = {
+            name: re.compile(
+                _LABEL_PREFIX + re.escape(name) + _LABEL_SUFFIX,
+                re.IGNORECASE | re.MULTILINE,
+            )
+            for name in self.fields
+        }
+
+    def __call__(self, response: str) -> ValidationResult:
+        counts = {
+            name: len(pattern.findall(response))
+            for name, pattern in self._patterns.items()
+        }
+        reasons = [
+            f'Missing the "{name}:" field.' for name, count in counts.items() if not count
+        ]
+        if not reasons and self.complete_items:
+            items = max(counts.values(), default=0)
+            reasons = [
+                f'Only {count} of {items} items have the "{name}:" field.'
+                for name, count in counts.items()
+                if count < items
+            ]
+        return ValidationResult(not reasons, reasons, self.strict and not reasons)
+
+
+@dataclass
+class SchemaValidator:
+    """
+    Requires the response to be a JSON object, or a list of objects, holding
+    the keys of ``schema`` with values of the given types. A surrounding
+    markdown code fence is ignored.
+
+    Parameters:
+    schema (dict): Key -> expected type (or tuple of types).
+    strict (bool): Accept passing responses without the judge.
+    """
+
+    schema: dict[str, type | tuple[type, ...]]
+    strict: bool = False
+
+    def __call__(self, response: str) -> ValidationResult:
+        try:
+            document = json.loads(strip_code_fence(response))
+        except json.JSONDecodeError as e:
+            return ValidationResult(False, [f"The answer is not valid JSON: {e}."])
+        items = document if isinstance(document, list) else [document]
+        reasons: list[str] = []
+        for position, item in enumerate(items, 1):
+            reasons.extend(self._check(item, position if len(items) > 1 else None))
+        if not items:
+            reasons.append("The answer is an empty JSON list.")
+        return ValidationResult(not reasons, reasons, self.strict and not reasons)
+
+    def _check(self, item: Any, position: int | None) -> list[str]:
+        where = f"Item {position}" if position is not None else "The answer"
+        if not isinstance(item, dict):
+            return [f"{where} is not a JSON object."]
+        reasons = []
+        for key, expected in self.schema.items():
+            if key not in item:
+                reasons.append(f'{where} is missing the "{key}" key.')
+            elif not isinstance(item[key], expected):
+                reasons.append(
+                    f'{where} has "{key}" of type {type(item[key]).__name__}, '
+                    f"expected {_type_names(expected)}."
+                )
+        return reasons
+
+
+def run_validators(validators: Sequence[Validator], response: str) -> ValidationResult:
+    """
+    Runs all validators and merges their results: the response passes if all
+    of them pass, and the pass is strict if any passing validator is strict.
+    """
+    results = [validator(response) for validator in validators]
+    reasons = [reason for result in results for reason in result.reasons]
+    passed = all(result.passed for result in results)
+    return ValidationResult(
+        passed, reasons, passed and any(result.strict for result in results)
+    )
+
+
+def strip_code_fence(text: str) -> str:
+    """Returns the body of a markdown code fence wrapping ``text``, if any."""
+    match = re.fullmatch(r"\s*```[\w-]*\s*\n(.*?)\n?```\s*", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+def _type_names(expected: type | tuple[type, ...]) -> str:
+    types = expected if isinstance(expected, tuple) else (expected,)
+    return " or ".join(t.__name__ for t in types)
@@ -0,0 +1,290 @@
+"""
+Vector indexes used by RAGKnowledgePromptAgent for chunk retrieval.
+
+Both indexes work on unit-normalized float32 rows (as kept by VectorStore),
+so the score of a chunk is its cosine similarity to the query.
+
+- ``FlatIndex``: exact, vectorized brute force over every row.
+- ``IVFIndex``: inverted-file index. Rows are clustered with spherical
+  k-means; a query only scans the ``n_probe`` clusters whose centroids are
+  closest to it. Raising ``n_probe`` trades latency for recall, and
+  ``n_probe == n_lists`` is exact again.
+
+Indexes persist next to the store as ``<path>.index.npz`` and are loaded back
+against the store's memory-mapped vectors; ``index_matches`` tells whether a
+loaded index still fits the configured kind and settings.
+"""
+
+from dataclasses import dataclass, field
+from typing import Protocol
+
+import numpy as np
+import numpy.typing as npt
+
+SearchResult = tuple[npt.NDArray[np.int64], npt.NDArray[np.float32]]
+
+
+class VectorIndex(Protocol):
+    kind: str
+
+    def search(
+        self,
+        query: npt.ArrayLike,
+        k: int = 1,
+        live: npt.NDArray[np.bool_] | None = None,
+    ) -> SearchResult: ...
+
+    def save(self, path: str) -> None: ...
+
+
+def top_k(scores: npt.NDArray[np.float32], k: int) -> npt.NDArray[np.int64]:
+    """Positions of the ``k`` highest scores, best first, in O(n + k log k)."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")].astype(np.int64)
+
+
+def _as_query(query: npt.ArrayLike) -> npt.NDArray[np.float32]:
+    vector = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+@dataclass
+class FlatIndex:
+    """Exact search: one matrix-vector product over all rows."""
+
+    vectors: npt.NDArray[np.float32] = field(repr=False)
+    kind: str = field(default="flat", init=False)
+
+    def search(
+        self,
+        query: npt.ArrayLike,
+        k: int = 1,
+        live: npt.NDArray[np.bool_] | None = None,
+    ) -> SearchResult:
+        """Top ``k`` rows by cosine similarity, skipping rows where ``live`` is False."""
+        if not self.vectors.shape[0]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.vectors @ _as_query(query)
+        if live is not None:
+            scores[~live] = -np.inf
+            k = min(k, int(live.sum()))
+        ids = top_k(scores, k)
+        return ids, scores[ids]
+
+    def save(self, path: str) -> None:
+        np.savez(f"{path}.index.npz", kind=self.kind)
+
+
+@dataclass
+class IVFIndex:
+    """
+    Approximate search over ``n_lists`` k-means clusters.
+
+    Parameters:
+    vectors (np.ndarray): Unit-normalized ``(count, dim)`` matrix being indexed.
+    centroids (np.ndarray): Unit-normalized ``(n_lists, dim)`` cluster centres.
+    list_ids (np.ndarray): Row ids grouped by cluster.
+    list_offsets (np.ndarray): Cluster ``c`` owns ``list_ids[offsets[c]:offsets[c+1]]``.
+    n_probe (int): Clusters scanned per query.
+    """
+
+    vectors: npt.NDArray[np.float32] = field(repr=False)
+    centroids: npt.NDArray[np.float32] = field(repr=False)
+    list_ids: npt.NDArray[np.int64] = field(repr=False)
+    list_offsets: npt.NDArray[np.int64] = field(repr=False)
+    n_probe: int = 8
+    kind: str = field(default="ivf", init=False)
+
+    @property
+    def n_lists(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(
+        cls,
+        vectors: npt.NDArray[np.float32],
+        n_lists: int | None = None,
+        n_probe: int = 8,
+        iterations: int = 10,
+        sample_per_list: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """
+        Clusters ``vectors`` with spherical k-means and builds the inverted lists.
+
+        Parameters:
+        vectors (np.ndarray): Unit-normalized rows to index.
+        n_lists (int | None): Number of clusters; defaults to ~sqrt(count).
+        n_probe (int): Default number of clusters scanned per query.
+        iterations (int): k-means iterations.
+        sample_per_list (int): Training rows per cluster; k-means only sees a
+            sample, which keeps build time flat on large corpora.
+        seed (int): Seed for sampling and initialization.
+        """
+        count, dim = vectors.shape
+        if not count:
+            # Nothing to cluster yet; extend trains once rows arrive.
+            return cls(
+                vectors,
+                np.zeros((0, dim), dtype=np.float32),
+                np.zeros(0, dtype=np.int64),
+                np.zeros(1, dtype=np.int64),
+                n_probe,
+            )
+        if n_lists is None:
+            n_lists = int(np.sqrt(count))
+        n_lists = max(1, min(n_lists, count))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(count, n_lists * sample_per_list)
+        sample = np.asarray(
+            vectors[np.sort(rng.choice(count, sample_size, replace=False))],
+            dtype=np.float32,
+        )
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = _assign(sample, centroids)
+            sums = np.zeros((n_lists, dim), dtype=np.float32)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid.
+            filled = norms[:, 0] > 0
+            centroids[filled] = sums[filled] / norms[filled]
+
+        assignment = _assign(vectors, centroids)
+        list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+        return cls(vectors, centroids, list_ids, list_offsets, n_probe)
+
+    def extend(self, vectors: npt.NDArray[np.float32]) -> "IVFIndex":
+        """
+        Returns an index over ``vectors`` whose rows beyond the ones already
+        indexed are assigned to the existing clusters, without re-training.
+        """
+        if not self.n_lists:
+            return IVFIndex.build(vectors, n_probe=self.n_probe)
+        indexed = int(self.list_offsets[-1])
+        assignment = np.empty(vectors.shape[0], dtype=np.int64)
+        assignment[self.list_ids] = np.repeat(
+            np.arange(self.n_lists), np.diff(self.list_offsets)
+        )
+        assignment[indexed:] = _assign(vectors[indexed:], self.centroids)
+        list_ids = np.argsort(assignment, kind="stable").astype(np.int64)
+        list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(assignment, minlength=self.n_lists), out=list_offsets[1:]
+        )
+        return IVFIndex(vectors, self.centroids, list_ids, list_offsets, self.n_probe)
+
+    def search(
+        self,
+        query: npt.ArrayLike,
+        k: int = 1,
+        live: npt.NDArray[np.bool_] | None = None,
+        n_probe: int | None = None,
+    ) -> SearchResult:
+        """
+        Approximate top ``k`` rows, scanning ``n_probe`` clusters and skipping
+        rows where ``live`` is False.
+        """
+        if not self.vectors.shape[0] or not self.n_lists:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        q = _as_query(query)
+        probe = min(n_probe or self.n_probe, self.n_lists)
+        lists = top_k(self.centroids @ q, probe)
+        candidates = np.concatenate(
+            [
+                self.list_ids[self.list_offsets[c] : self.list_offsets[c + 1]]
+                for c in lists
+            ]
+        )
+        if live is not None:
+            candidates = candidates[live[candidates]]
+        # Sorted ids keep the gather from the memory-mapped matrix sequential.
+        candidates.sort()
+        scores = self.vectors[candidates] @ q
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: str) -> None:
+        np.savez(
+            f"{path}.index.npz",
+            kind=self.kind,
+            centroids=self.centroids,
+            list_ids=self.list_ids,
+            list_offsets=self.list_offsets,
+            n_probe=self.n_probe,
+        )
+
+
+def _assign(
+    vectors: npt.NDArray[np.float32],
+    centroids: npt.NDArray[np.float32],
+    block_rows: int = 65536,
+) -> npt.NDArray[np.int64]:
+    """Nearest centroid of every row, computed in blocks to bound memory."""
+    assignment = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_rows):
+        block = np.asarray(vectors[start : start + block_rows], dtype=np.float32)
+        assignment[start : start + block_rows] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def build_index(
+    vectors: npt.NDArray[np.float32], kind: str = "flat", **params: int
+) -> VectorIndex:
+    """
+    Builds an index of the given kind over ``vectors``.
+
+    Parameters:
+    kind (str): ``"flat"`` for exact search or ``"ivf"`` for approximate search.
+    params: Passed to ``IVFIndex.build`` (n_lists, n_probe, iterations, ...).
+    """
+    if kind == "flat":
+        return FlatIndex(vectors)
+    if kind == "ivf":
+        return IVFIndex.build(vectors, **params)
+    raise ValueError(f"Unknown index type: {kind}")
+
+
+def load_index(path: str, vectors: npt.NDArray[np.float32]) -> VectorIndex:
+    """Loads the index saved at ``path`` and attaches it to ``vectors``."""
+    with np.load(f"{path}.index.npz") as data:
+        kind = str(data["kind"])
+        if kind == "flat":
+            return FlatIndex(vectors)
+        if kind == "ivf":
+            return IVFIndex(
+                vectors,
+                data["centroids"],
+                data["list_ids"],
+                data["list_offsets"],
+                int(data["n_probe"]),
+            )
+    raise ValueError(f"Unknown index type in {path}.index.npz: {kind}")
+
+
+def index_matches(index: VectorIndex, kind: str, **params: int) -> bool:
+    """
+    Whether ``index`` is what ``build_index(vectors, kind, **params)`` would
+    build: the same kind and, for IVF, the same ``n_probe`` and ``n_lists``
+    (when given; the list count is capped by the rows clustered).
+    """
+    if index.kind != kind:
+        return False
+    if isinstance(index, IVFIndex):
+        if "n_probe" in params and index.n_probe != params["n_probe"]:
+            return False
+        n_lists = params.get("n_lists")
+        count = int(index.list_offsets[-1])
+        if n_lists is not None and count and index.n_lists != min(n_lists, count):
+            return False
+    return True
@@ -0,0 +1,202 @@
+"""
+Binary, memory-mapped store for chunk embeddings.
+
+A store written at ``path`` consists of four files:
+
+- ``path.f32``: unit-normalized float32 vectors, one contiguous row per chunk
+- ``path.text``: the chunk texts concatenated as UTF-8
+- ``path.offsets``: int64 end offset of each chunk inside ``path.text``
+- ``path.json``: metadata (row count, dimension, embedding model)
+
+Every file is append-only, so a store can be written incrementally while
+chunks are still being embedded, and is opened with ``np.memmap``/``mmap``
+so queries read vectors zero-copy instead of re-parsing them.
+"""
+
+import contextlib
+import json
+import mmap
+import os
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+store_version = 1
+
+
+def _normalize_rows(vectors: npt.ArrayLike) -> npt.NDArray[np.float32]:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@dataclass
+class VectorStoreWriter:
+    """
+    Appends chunks and their embeddings to a store on disk.
+
+    Parameters:
+    path (str): Store path prefix.
+    model (str): Embedding model recorded in the metadata.
+    mode (str): ``"w"`` replaces any store at ``path``; ``"a"`` extends it.
+    """
+
+    path: str
+    model: str = ""
+    mode: str = "w"
+    dim: int = field(default=0, init=False)
+    count: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        file_mode = "wb"
+        self._text_bytes = 0
+        if self.mode == "a" and os.path.exists(f"{self.path}.json"):
+            with open(f"{self.path}.json", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            self.count, self.dim = meta["count"], meta["dim"]
+            self.model = self.model or meta.get("model", "")
+            self._text_bytes = os.path.getsize(f"{self.path}.text")
+            file_mode = "ab"
+        # Drop the metadata first: until close() the store is invalid.
+        if os.path.exists(f"{self.path}.json"):
+            os.remove(f"{self.path}.json")
+        # The stack owns the data files: if opening one fails, the ones
+        # already open are closed, and close() releases all of them.
+        with contextlib.ExitStack() as files:
+            self._vectors = files.enter_context(open(f"{self.path}.f32", file_mode))
+            self._text = files.enter_context(open(f"{self.path}.text", file_mode))
+            self._offsets = files.enter_context(open(f"{self.path}.offsets", file_mode))
+            self._files = files.pop_all()
+
+    def append(self, texts: Sequence[str], embeddings: npt.ArrayLike) -> None:
+        if not len(texts):
+            return
+        matrix = _normalize_rows(embeddings)
+        if matrix.shape[0] != len(texts):
+            raise ValueError("texts and embeddings must have the same length")
+        if self.dim and matrix.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dimension {matrix.shape[1]} does not match store {self.dim}"
+            )
+        self.dim = matrix.shape[1]
+
+        encoded = [text.encode("utf-8") for text in texts]
+        ends = self._text_bytes + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._vectors.write(np.ascontiguousarray(matrix).tobytes())
+        self._text.write(b"".join(encoded))
+        self._offsets.write(ends.tobytes())
+        self._text_bytes = int(ends[-1])
+        self.count += len(texts)
+
+    def close(self) -> "VectorStore":
+        """Flushes the data files, writes the metadata and opens the result."""
+        self._files.close()
+        # Metadata goes last, so a store is only readable once complete.
+        with open(f"{self.path}.json", "w", encoding="utf-8") as meta:
+            json.dump(
+                {
+                    "version": store_version,
+                    "count": self.count,
+                    "dim": self.dim,
+                    "model": self.model,
+                },
+                meta,
+            )
+        return VectorStore.open(self.path)
+
+    def __enter__(self) -> "VectorStoreWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if self._vectors.closed:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave no metadata behind, so a partial store cannot be opened.
+            self._files.close()
+
+
+@dataclass
+class VectorStore:
+    """
+    Read-only view over a store written by VectorStoreWriter.
+
+    Parameters:
+    path (str): Store path prefix.
+    vectors (np.ndarray): Memory-mapped ``(count, dim)`` float32 matrix with
+        unit-length rows, so a dot product is a cosine similarity.
+    model (str): Embedding model the vectors were produced with.
+    """
+
+    path: str
+    vectors: npt.NDArray[np.float32]
+    model: str
+    _offsets: npt.NDArray[np.int64] = field(repr=False)
+    _text: mmap.mmap | None = field(repr=False)
+
+    @classmethod
+    def write(
+        cls,
+        path: str,
+        texts: Sequence[str],
+        embeddings: npt.ArrayLike,
+        model: str = "",
+    ) -> "VectorStore":
+        """Writes a complete store in one go and opens it."""
+        writer = VectorStoreWriter(path, model)
+        writer.append(texts, embeddings)
+        return writer.close()
+
+    @classmethod
+    def open(cls, path: str) -> "VectorStore":
+        """Memory-maps the store at ``path`` without reading it into memory."""
+        with open(f"{path}.json", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        count, dim = meta["count"], meta["dim"]
+
+        if count:
+            vectors = np.memmap(
+                f"{path}.f32", dtype=np.float32, mode="r", shape=(count, dim)
+            )
+            offsets = np.memmap(
+                f"{path}.offsets", dtype=np.int64, mode="r", shape=(count,)
+            )
+        else:
+            vectors = np.zeros((0, dim), dtype=np.float32)
+            offsets = np.zeros(0, dtype=np.int64)
+
+        text = None
+        if os.path.getsize(f"{path}.text"):
+            with open(f"{path}.text", "rb") as text_file:
+                text = mmap.mmap(text_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, vectors, meta.get("model", ""), offsets, text)
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def text(self, i: int) -> str:
+        """Decodes the text of chunk ``i`` straight from the mapped file."""
+        if self._text is None:
+            return ""
+        start = int(self._offsets[i - 1]) if i else 0
+        return self._text[start : int(self._offsets[i])].decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.close()
+            self._text = None
@@ -2,20 +2,44 @@
 
 # TODO: 1 - Import the following agents: ActionPlanningAgent, KnowledgeAugmentedPromptAgent, EvaluationAgent, RoutingAgent from the workflow_agents.base_agents module
 import os
-from typing import Any, TypedDict
+import sys
+import threading
+from functools import partial
 
 from dotenv import load_dotenv
-from workflow_agents.base_agents import (
-    ActionPlanningAgent,
-    EvaluationAgent,
-    KnowledgeAugmentedPromptAgent,
-    RoutingAgent,
-)
+from workflow_agents.completion_cache import CompletionCache
+from workflow_agents.completions import get_completion_cache, set_completion_cache
+from workflow_agents.ratelimit import RateLimiter, set_rate_limiter
+from workflow_agents.singleflight import get_single_flight
+from workflow_agents.tracing import Tracer, get_tracer, set_tracer, span
+from workflow_agents.usage import get_usage_ledger, usage_context
+from workflow_agents.workflow_engine import StepResult, WorkflowEngine
+from workflow_team import build_team
 
 # TODO: 2 - Load the OpenAI key into a variable called openai_api_key
 load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY") or ""
 
+# Opt-in: WORKFLOW_TRACE=trace.json (Chrome trace format) or trace.jsonl
+# records nested timing spans for every step, agent method and model call.
+trace_path = os.getenv("WORKFLOW_TRACE")
+if trace_path:
+    set_tracer(Tracer())
+
+# Opt-in: reuse identical temperature=0 completions within and across runs.
+completion_cache_path = os.getenv("COMPLETION_CACHE_PATH")
+if completion_cache_path is not None:
+    set_completion_cache(CompletionCache(path=completion_cache_path or None))
+
+# Every model request passes through one shared rate limiter. Its request and
+# token ceilings come from the provider's rate-limit headers unless
+# WORKFLOW_RPM / WORKFLOW_TPM set them explicitly.
+rate_limiter = RateLimiter(
+    requests_per_minute=float(os.getenv("WORKFLOW_RPM", "0")) or None,
+    tokens_per_minute=float(os.getenv("WORKFLOW_TPM", "0")) or None,
+)
+set_rate_limiter(rate_limiter)
+
 # load the product spec
 # TODO: 3 - Load the product spec document Product-Spec-Email-Router.txt into a variable called product_spec
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -27,189 +51,16 @@ except Exception as e:
     print(f"Warning: Could not load Product-Spec-Email-Router.txt. Error: {e}")
     product_spec = ""
 
-# Action Planning Agent
-knowledge_action_planning = (
-    "Stories are defined from a product spec by identifying a "
-    "persona, an action, and a desired outcome for each story. "
-    "Each story represents a specific functionality of the product "
-    "described in the specification. \n"
-    "Features are defined by grouping related user stories. \n"
-    "Tasks are defined for each story and represent the engineering "
-    "work required to develop the product. \n"
-    "A development Plan for a product contains all these components"
-)
-# TODO: 4 - Instantiate an action_planning_agent using the 'knowledge_action_planning'
-action_planning_agent = ActionPlanningAgent(
-    openai_api_key=openai_api_key, knowledge=knowledge_action_planning
-)
-
-# Product Manager - Knowledge Augmented Prompt Agent
-persona_product_manager = "You are a Product Manager, you are responsible for defining the user stories for a product."
-knowledge_product_manager = (
-    "Stories are defined by writing sentences with a persona, an action, and a desired outcome. "
-    "The sentences always start with: As a "
-    "Write several stories for the product spec below, where the personas are the different users of the product. "
-    # TODO: 5 - Complete this knowledge string by appending the product_spec loaded in TODO 3
-    f"\n\nProduct Specification:\n{product_spec}"
-)
-
-# TODO: 6 - Instantiate a product_manager_knowledge_agent using 'persona_product_manager' and the completed 'knowledge_product_manager'
-product_manager_knowledge_agent = KnowledgeAugmentedPromptAgent(
-    name="Product Manager",
-    description="Defines user stories for a product based on product specifications",
-    openai_api_key=openai_api_key,
-    persona=persona_product_manager,
-    knowledge=knowledge_product_manager,
-)
-
-
-# Product Manager - Evaluation Agent
-# TODO: 7 - Define the persona and evaluation criteria for a Product Manager evaluation agent and instantiate it as product_manager_evaluation_agent.
-# This agent will evaluate the product_manager_knowledge_agent.
-# The evaluation_criteria should specify the expected structure for user stories (e.g., "As a [type of user], I want [an action or feature] so that [benefit/value].").
-product_manager_evaluation_agent = EvaluationAgent(
-    openai_api_key=openai_api_key,
-    persona="You are an evaluation agent that checks the answers of other worker agents",
-    evaluation_criteria="As a [type of user], I want [an action or feature] so that [benefit/value].",
-    worker_agent=product_manager_knowledge_agent,
-    max_interactions=10,
-)
-# Program Manager - Knowledge Augmented Prompt Agent
-persona_program_manager = "You are a Program Manager, you are responsible for defining the features for a product."
-knowledge_program_manager = "Features of a product are defined by organizing similar user stories into cohesive groups."
-# Instantiate a program_manager_knowledge_agent using 'persona_program_manager' and 'knowledge_program_manager'
-# (This is a necessary step before TODO 8. Students should add the instantiation code here.)
-program_manager_knowledge_agent = KnowledgeAugmentedPromptAgent(
-    name="Program Manager",
-    description="Defines features by organizing similar user stories into cohesive groups",
-    openai_api_key=openai_api_key,
-    persona=persona_program_manager,
-    knowledge=knowledge_program_manager,
-)
-
-# Program Manager - Evaluation Agent
-
-# TODO: 8 - Instantiate a program_manager_evaluation_agent using 'persona_program_manager_eval' and the evaluation criteria below.
-#                      "The answer should be product features that follow the following structure: " \
-#                      "Feature Name: A clear, concise title that identifies the capability\n" \
-#                      "Description: A brief explanation of what the feature does and its purpose\n" \
-#                      "Key Functionality: The specific capabilities or actions the feature provides\n" \
-#                      "User Benefit: How this feature creates value for the user"
-# For the 'agent_to_evaluate' parameter, refer to the provided solution code's pattern.
-
-persona_program_manager_eval = (
-    "You are an evaluation agent that checks the answers of other worker agents."
-)
-program_manager_evaluation_agent = EvaluationAgent(
-    openai_api_key=openai_api_key,
-    persona=persona_program_manager_eval,
-    evaluation_criteria="The answer should be product features that follow the following structure: "
-    "Feature Name: A clear, concise title that identifies the capability\n"
-    "Description: A brief explanation of what the feature does and its purpose\n"
-    "Key Functionality: The specific capabilities or actions the feature provides\n"
-    "User Benefit: How this feature creates value for the user",
-    worker_agent=program_manager_knowledge_agent,
-    max_interactions=10,
-)
-
-# Development Engineer - Knowledge Augmented Prompt Agent
-persona_dev_engineer = "You are a Development Engineer, you are responsible for defining the development tasks for a product."
-knowledge_dev_engineer = "Development tasks are defined by identifying what needs to be built to implement each user story."
-# Instantiate a development_engineer_knowledge_agent using 'persona_dev_engineer' and 'knowledge_dev_engineer'
-# (This is a necessary step before TODO 9. Students should add the instantiation code here.)
-development_engineer_knowledge_agent = KnowledgeAugmentedPromptAgent(
-    name="Development Engineer",
-    description="Defines development tasks needed to implement each user story",
-    openai_api_key=openai_api_key,
-    persona=persona_dev_engineer,
-    knowledge=knowledge_dev_engineer,
-)
-
-# Development Engineer - Evaluation Agent
-# TODO: 9 - Instantiate a development_engineer_evaluation_agent using 'persona_dev_engineer_eval' and the evaluation criteria below.
-#                      "The answer should be tasks following this exact structure: " \
-#                      "Task ID: A unique identifier for tracking purposes\n" \
-#                      "Task Title: Brief description of the specific development work\n" \
-#                      "Related User Story: Reference to the parent user story\n" \
-#                      "Description: Detailed explanation of the technical work required\n" \
-#                      "Acceptance Criteria: Specific requirements that must be met for completion\n" \
-#                      "Estimated Effort: Time or complexity estimation\n" \
-#                      "Dependencies: Any tasks that must be completed first"
-# For the 'agent_to_evaluate' parameter, refer to the provided solution code's pattern.
-
-persona_dev_engineer_eval = (
-    "You are an evaluation agent that checks the answers of other worker agents."
-)
-development_engineer_evaluation_agent = EvaluationAgent(
-    openai_api_key=openai_api_key,
-    persona=persona_dev_engineer_eval,
-    worker_agent=development_engineer_knowledge_agent,
-    evaluation_criteria="The answer should be tasks following this exact structure: "
-    "Task ID: A unique identifier for tracking purposes\n"
-    "Task Title: Brief description of the specific development work\n"
-    "Related User Story: Reference to the parent user story\n"
-    "Description: Detailed explanation of the technical work required\n"
-    "Acceptance Criteria: Specific requirements that must be met for completion\n"
-    "Estimated Effort: Time or complexity estimation\n"
-    "Dependencies: Any tasks that must be completed first",
-    max_interactions=10,
-)
-
-# Routing Agent
-# TODO: 10 - Instantiate a routing_agent. You will need to define a list of agent dictionaries (routes) for Product Manager, Program Manager, and Development Engineer.
-# Each dictionary should contain 'name', 'description', and 'func' (linking to a support function).
-# Assign this list to the routing_agent's 'agents' attribute.
-routing_agent = RoutingAgent(
-    openai_api_key=openai_api_key,
-    agents=[
-        development_engineer_knowledge_agent,
-        product_manager_knowledge_agent,
-        program_manager_knowledge_agent,
-    ],
-)
-
-# Job function persona support functions
-# TODO: 11 - Define the support functions for the routes of the routing agent (e.g., product_manager_support_function, program_manager_support_function, development_engineer_support_function).
-# Each support function should:
-#   1. Take the input query (e.g., a step from the action plan).
-#   2. Get a response from the respective Knowledge Augmented Prompt Agent.
-#   3. Have the response evaluated by the corresponding Evaluation Agent.
-#   4. Return the final validated response.
+# TODO: 4 to 11 - The agents, the routing agent and the support functions are
+# built in workflow_team.py, which batch_workflow.py shares, so both modes send
+# the same prompts.
 
-
-def product_manager_support_function(query: str):
-    """Support function for Product Manager agent"""
-    # Get response from knowledge agent
-    response = product_manager_knowledge_agent.respond(query)
-    if response is None:
-        return ""
-
-    # Evaluate the response
-    evaluated_response = product_manager_evaluation_agent.evaluate(response)
-    return evaluated_response['final_response'] 
-
-
-def program_manager_support_function(query: str):
-    """Support function for Program Manager agent"""
-    # Get response from knowledge agent
-    response = program_manager_knowledge_agent.respond(query)
-    if response is None:
-        return ""
-    # Evaluate the response
-    evaluated_response = program_manager_evaluation_agent.evaluate(response)
-    return evaluated_response['final_response'] 
-
-
-def development_engineer_support_function(query: str):
-    """Support function for Development Engineer agent"""
-    # Get response from knowledge agent
-    response = development_engineer_knowledge_agent.respond(query)
-    if response is None:
-        return ""
-
-    # Evaluate the response
-    evaluated_response = development_engineer_evaluation_agent.evaluate(response)
-    return evaluated_response['final_response'] 
+# Set WORKFLOW_CANDIDATES=N to have every evaluation round draw N worker
+# candidates concurrently and keep the first one the judge accepts.
+evaluation_candidates = int(os.getenv("WORKFLOW_CANDIDATES", "1"))
+team = build_team(openai_api_key, product_spec, candidates=evaluation_candidates)
+action_planning_agent = team.action_planning_agent
+routing_agent = team.routing_agent
 
 
 # Run the workflow
@@ -231,9 +82,10 @@ print("\nDefining workflow steps from the workflow prompt")
 #      c. Print information about the step being executed and its result.
 #   4. After the loop, print the final output of the workflow (the last completed step).
 
-workflow_steps_response = action_planning_agent.extract_steps_from_prompt(
-    workflow_prompt
-)
+with usage_context(step=0), span("workflow.plan", prompt=workflow_prompt):
+    workflow_steps_response = action_planning_agent.extract_steps_from_prompt(
+        workflow_prompt
+    )
 print(f"Action planning response: {workflow_steps_response}")
 
 workflow_steps = (
@@ -250,35 +102,41 @@ print(f"\nExtracted workflow steps: {len(workflow_steps)} steps")
 for i, step in enumerate(workflow_steps, 1):
     print(f"  {i}. {step}")
 
-
-class StepResult(TypedDict):
-    step_number: int
-    step_description: str
-    result: Any  # Replace 'Any' with the actual type of step_result if known
-
-
-completed_steps: list[StepResult] = []
+# Each step is routed on its own description only, so no step consumes another
+# step's output and all of them may run concurrently. Add edges here (step
+# number -> step numbers it waits for) if a step ever needs earlier results.
+step_dependencies: dict[int, list[int]] = {}
+
+# Set WORKFLOW_STREAM=1 to print each step's tokens as they are generated.
+stream_steps = os.getenv("WORKFLOW_STREAM", "") not in ("", "0")
+print_lock = threading.Lock()
+last_streamed_step: int | None = None
+
+
+def print_delta(step_number: int, delta: str) -> None:
+    """Prints a token delta, labelling the step whenever the stream switches steps."""
+    global last_streamed_step
+    with print_lock:
+        if step_number != last_streamed_step:
+            sys.stdout.write(f"\n[Step {step_number}] ")
+            last_streamed_step = step_number
+        sys.stdout.write(delta)
+        sys.stdout.flush()
+
+
+workflow_engine = WorkflowEngine(
+    execute=partial(routing_agent.route, stream=True)
+    if stream_steps
+    else routing_agent.route,
+    max_workers=int(os.getenv("WORKFLOW_MAX_WORKERS", "4")),
+    on_delta=print_delta,
+)
 
 print("\n --- Executing Workflow Steps ---")
-for i, step in enumerate(workflow_steps, 1):
-    print(f"\n=== Executing Step {i}: {step} ===")
-
-    try:
-        step_result = routing_agent.route(step)
-
-        completed_steps.append(
-            {"step_number": i, "step_description": step, "result": step_result}
-        )
-
-        print(f"Step {i} completed successfully:")
-        print(f"Result: {step_result}")
-        print("-" * 50)
-
-    except Exception as e:
-        print(f"Error executing step {i}: {e}")
-        completed_steps.append(
-            {"step_number": i, "step_description": step, "result": f"Error: {e}"}
-        )
+with span("workflow.run", steps=len(workflow_steps)):
+    completed_steps: list[StepResult] = workflow_engine.run(
+        workflow_steps, step_dependencies
+    )
 
 
 print("\n" + "=" * 60)
@@ -303,4 +161,28 @@ if completed_steps:
 else:
     print("No steps were completed.")
 
+# Token and latency accounting for every LLM and embedding call of the run
+# (step 0 is planning).
+print("\n--- USAGE SUMMARY ---")
+print(get_usage_ledger().summary())
+
+print("\nProvider prompt cache:")
+for knowledge_agent in team.knowledge_agents:
+    print(f"  {knowledge_agent.name}: {knowledge_agent.prompt_cache}")
+
+print(f"\nRate limiter: {rate_limiter.stats}")
+
+single_flight = get_single_flight()
+if single_flight is not None:
+    print(f"In-flight coalescing: {single_flight.stats}")
+
+completion_cache = get_completion_cache()
+if completion_cache is not None:
+    print(f"\nCompletion cache: {completion_cache.stats}")
+
+tracer = get_tracer()
+if trace_path and tracer is not None:
+    tracer.export(trace_path)
+    print(f"\nTrace with {len(tracer.spans)} spans written to {trace_path}")
+
 print("\n*** Workflow execution finished ***")
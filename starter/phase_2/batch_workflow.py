@@ -0,0 +1,156 @@
+# batch_workflow.py
+"""
+Runs the agentic workflow over many product specs through the batch API.
+
+Every spec gets the agents of workflow_team.py, which agentic_workflow.py
+runs live, with its own text as the Product Manager's knowledge. The
+planning, routing embeddings, knowledge responses and evaluations of all
+specs are sent stage by stage as batches
+(see workflow_agents/batch_pipeline.py), which costs less than live requests
+but may take hours per stage. All state lives in the run directory, so an
+interrupted run resumes where it stopped when started again with the same
+arguments.
+
+    python batch_workflow.py specs/                      # every *.txt in specs/
+    python batch_workflow.py a.txt b.txt --run-dir runs/nightly
+    WORKFLOW_BACKEND=local python batch_workflow.py --processor local
+
+Without spec arguments the Email Router spec next to this script is used.
+"""
+
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+from workflow_agents.backends import LocalBackend, backend_from_env
+from workflow_agents.batch import (
+    BatchProcessor,
+    BatchRunner,
+    LocalBatchProcessor,
+    OpenAIBatchProcessor,
+)
+from workflow_agents.batch_pipeline import BatchPipeline, WorkflowJob
+from workflow_agents.usage import get_usage_ledger
+from workflow_team import build_team
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+default_spec = os.path.join(current_dir, "Product-Spec-Email-Router.txt")
+default_run_dir = os.path.join(current_dir, "batch_runs", "default")
+default_prompt = "What would the development tasks for this product be?"
+
+
+def build_job(
+    api_key: str, name: str, product_spec: str, prompt: str, candidates: int = 1
+) -> WorkflowJob:
+    """The agents of workflow_team.py, as agentic_workflow.py runs them, for one spec."""
+    team = build_team(api_key, product_spec, candidates=candidates)
+    return WorkflowJob(
+        name=name,
+        prompt=prompt,
+        planner=team.action_planning_agent,
+        router=team.routing_agent,
+        evaluators=team.evaluation_agents,
+    )
+
+
+def spec_files(paths: list[str]) -> list[str]:
+    """Expands directories into the ``*.txt`` files they contain."""
+    files: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith(".txt")
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def make_processor(args: argparse.Namespace, api_key: str) -> BatchProcessor:
+    if args.processor == "openai":
+        return OpenAIBatchProcessor(api_key)
+    backend = backend_from_env()
+    if not isinstance(backend, LocalBackend):
+        backend = LocalBackend()
+    return LocalBatchProcessor(
+        backend,
+        os.path.join(args.run_dir, "local_batches"),
+        turnaround=args.turnaround,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("specs", nargs="*", help="spec files or directories")
+    parser.add_argument("--prompt", default=default_prompt, help="workflow prompt")
+    parser.add_argument("--run-dir", default=default_run_dir)
+    parser.add_argument(
+        "--processor",
+        choices=["openai", "local"],
+        default="local" if os.getenv("WORKFLOW_BACKEND") == "local" else "openai",
+        help="batch API or the offline stand-in (default from WORKFLOW_BACKEND)",
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=60.0, help="seconds between polls"
+    )
+    parser.add_argument(
+        "--turnaround",
+        type=float,
+        default=0.0,
+        help="seconds a local batch stays in progress",
+    )
+    parser.add_argument("--retries", type=int, default=2, help="resubmissions")
+    parser.add_argument("--max-rounds", type=int, help="evaluation rounds per step")
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=int(os.getenv("WORKFLOW_CANDIDATES", "1")),
+        help="worker candidates per evaluation round (default WORKFLOW_CANDIDATES)",
+    )
+    parser.add_argument("--output", help="results file (default: run dir)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY") or ""
+
+    jobs = []
+    for path in spec_files(args.specs or [default_spec]):
+        with open(path, encoding="utf-8") as file:
+            product_spec = file.read()
+        name = os.path.splitext(os.path.basename(path))[0]
+        jobs.append(
+            build_job(api_key, name, product_spec, args.prompt, args.candidates)
+        )
+    print(f"Running the workflow for {len(jobs)} specs in {args.run_dir}")
+
+    runner = BatchRunner(
+        make_processor(args, api_key),
+        args.run_dir,
+        poll_interval=args.poll_interval,
+        retries=args.retries,
+    )
+    pipeline = BatchPipeline(runner, max_rounds=args.max_rounds)
+    if args.processor == "local":
+        # Simulated vectors must not end up in the persistent embedding cache.
+        pipeline.embedding_cache = None
+    results = pipeline.run(jobs)
+
+    output = args.output or os.path.join(args.run_dir, "results.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    steps = [step for job_steps in results.values() for step in job_steps]
+    print(f"\nSpecs: {len(results)}  steps: {len(steps)}")
+    print(f"Accepted: {sum(step['success'] for step in steps)}")
+    print(f"Failed: {sum(step['error'] is not None for step in steps)}")
+    print(f"Batches: {runner.stats}")
+    print("\n--- USAGE SUMMARY ---")
+    print(get_usage_ledger().summary())
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
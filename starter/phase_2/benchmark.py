@@ -0,0 +1,400 @@
+# benchmark.py
+"""
+Offline benchmarks for routing, RAG ingestion and retrieval, the evaluation
+loop and the full workflow engine.
+
+Every run talks to the in-process LocalBackend (workflow_agents/backends.py)
+instead of the API, so the numbers measure our own overhead plus a
+configurable, reproducible network latency. Each case reports throughput, p50/p95/p99 latency, API call counts
+and peak traced memory; the results are written as JSON so runs can be
+compared across commits.
+
+    python benchmark.py                      # full matrix
+    python benchmark.py --quick              # small sizes, for a smoke run
+    python benchmark.py --suite routing --latency lognormal:0.05
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import numpy as np
+from workflow_agents.backends import LatencyModel, LocalBackend, use_backend
+from workflow_agents.base_agents import (
+    EvaluationAgent,
+    KnowledgeAugmentedPromptAgent,
+    RAGKnowledgePromptAgent,
+    RoutingAgent,
+)
+from workflow_agents.completions import set_completion_cache
+from workflow_agents.usage import get_usage_ledger
+from workflow_agents.workflow_engine import WorkflowEngine
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+default_output_dir = os.path.join(current_dir, "benchmark_results")
+
+WORDS = [
+    "email", "router", "customer", "support", "ticket", "priority", "sentiment",
+    "billing", "account", "refund", "shipping", "delivery", "product", "feature",
+    "user", "story", "task", "acceptance", "criteria", "dependency", "estimate",
+    "engineer", "manager", "program", "release", "search", "index", "vector",
+    "knowledge", "agent", "workflow", "latency", "throughput", "model",
+]
+
+
+# Measurement
+
+
+@dataclass
+class CaseResult:
+    suite: str
+    params: dict[str, Any]
+    operations: int
+    wall_time: float
+    throughput: float
+    latency: dict[str, float]
+    calls: dict[str, int]
+    peak_memory_mb: float
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def line(self) -> str:
+        params = " ".join(f"{k}={v}" for k, v in self.params.items())
+        return (
+            f"{self.suite:<12} {params:<40} {self.throughput:9.1f} ops/s  "
+            f"p50={self.latency['p50'] * 1e3:7.1f}ms p95={self.latency['p95'] * 1e3:7.1f}ms "
+            f"p99={self.latency['p99'] * 1e3:7.1f}ms  calls={self.calls}  "
+            f"peak={self.peak_memory_mb:.1f}MB"
+        )
+
+
+def latency_stats(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(samples)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": float(values.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def measure(
+    suite: str,
+    params: dict[str, Any],
+    backend: LocalBackend,
+    operation: Callable[[Any], Any],
+    inputs: list[Any],
+    concurrency: int = 1,
+) -> CaseResult:
+    """
+    Runs ``operation`` once per input with ``concurrency`` threads and times
+    every call. Agent output is silenced so printing does not skew timings.
+    """
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def timed(item: Any) -> None:
+        started = time.perf_counter()
+        operation(item)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    backend.reset()
+    get_usage_ledger().clear()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if concurrency <= 1:
+            for item in inputs:
+                timed(item)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(timed, inputs))
+    wall_time = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = CaseResult(
+        suite=suite,
+        params={**params, "concurrency": concurrency},
+        operations=len(inputs),
+        wall_time=wall_time,
+        throughput=len(inputs) / wall_time if wall_time else 0.0,
+        latency=latency_stats(latencies),
+        calls=dict(backend.calls),
+        peak_memory_mb=peak / 2**20,
+    )
+    print(result.line())
+    return result
+
+
+def sentences(count: int, rng: random.Random, words: int = 12) -> list[str]:
+    return [" ".join(rng.choices(WORDS, k=words)) for _ in range(count)]
+
+
+def corpus(characters: int, rng: random.Random) -> str:
+    paragraphs: list[str] = []
+    size = 0
+    while size < characters:
+        paragraph = ". ".join(sentences(rng.randint(3, 8), rng)) + "."
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+# Suites
+
+
+def knowledge_agent(index: int) -> KnowledgeAugmentedPromptAgent:
+    return KnowledgeAugmentedPromptAgent(
+        name=f"agent {index}",
+        description=f"Handles {WORDS[index % len(WORDS)]} and "
+        f"{WORDS[(index * 7 + 3) % len(WORDS)]} questions ({index})",
+        openai_api_key="benchmark",
+        persona="a benchmark agent",
+        knowledge="Answer briefly.",
+    )
+
+
+def bench_routing(backend: LocalBackend, config: "Config") -> list[CaseResult]:
+    """Embedding plus routing decision, with the routed function stubbed out."""
+    results = []
+    rng = random.Random(config.seed)
+    for agent_count in config.agent_counts:
+        agents = [knowledge_agent(i) for i in range(agent_count)]
+        for agent in agents:
+            agent.func = lambda query: query
+        router = RoutingAgent("benchmark", agents, embedding_cache=None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            router.route("warm up")  # embeds the descriptions once
+        queries = sentences(config.queries, rng)
+        for concurrency in config.concurrency:
+            results.append(
+                measure(
+                    "routing",
+                    {"agents": agent_count},
+                    backend,
+                    router.route,
+                    queries,
+                    concurrency,
+                )
+            )
+    return results
+
+
+def bench_rag(backend: LocalBackend, config: "Config") -> list[CaseResult]:
+    """Streaming ingestion into the vector store, then retrieval + answer."""
+    results = []
+    rng = random.Random(config.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        for size in config.corpus_sizes:
+            text = corpus(size, rng)
+            agent = RAGKnowledgePromptAgent(
+                "benchmark", "a benchmark agent", embedding_cache=None
+            )
+            agent.store_path = os.path.join(directory, f"store-{size}")
+            ingest = measure(
+                "rag_ingest",
+                {"corpus_chars": size},
+                backend,
+                agent.ingest,
+                [io.StringIO(text)],
+            )
+            ingest.extra["chunks"] = len(agent.load_store())
+            results.append(ingest)
+
+            queries = sentences(config.queries, rng, words=8)
+            for concurrency in config.concurrency:
+                results.append(
+                    measure(
+                        "rag_query",
+                        {"corpus_chars": size},
+                        backend,
+                        agent.find_prompt_in_knowledge,
+                        queries,
+                        concurrency,
+                    )
+                )
+    return results
+
+
+def bench_evaluation(backend: LocalBackend, config: "Config") -> list[CaseResult]:
+    """
+    EvaluationAgent loops with the two-call judge, the structured judge and
+    best-of-N candidates; the judge accepts with backend.accept_rate.
+    """
+    results = []
+    rng = random.Random(config.seed)
+    worker = knowledge_agent(0)
+    prompts = sentences(max(1, config.queries // 4), rng)
+    modes = [(False, 1)] + [(True, n) for n in config.candidates]
+    for structured, candidates in modes:
+        evaluator = EvaluationAgent(
+            openai_api_key="benchmark",
+            persona="a benchmark evaluator",
+            evaluation_criteria="The answer must be brief.",
+            worker_agent=worker,
+            max_interactions=config.max_interactions,
+            structured_judge=structured,
+            candidates=candidates,
+        )
+        for concurrency in config.concurrency:
+            results.append(
+                measure(
+                    "evaluation",
+                    {
+                        "max_interactions": config.max_interactions,
+                        "structured": structured,
+                        "candidates": candidates,
+                    },
+                    backend,
+                    evaluator.evaluate,
+                    prompts,
+                    concurrency,
+                )
+            )
+    return results
+
+
+def bench_workflow(backend: LocalBackend, config: "Config") -> list[CaseResult]:
+    """Whole plans through WorkflowEngine: route, respond and evaluate per step."""
+    results = []
+    rng = random.Random(config.seed)
+    agents = [knowledge_agent(i) for i in range(3)]
+    for agent in agents:
+        evaluator = EvaluationAgent(
+            openai_api_key="benchmark",
+            persona="a benchmark evaluator",
+            evaluation_criteria="The answer must be brief.",
+            worker_agent=agent,
+            max_interactions=config.max_interactions,
+        )
+        agent.func = lambda query, evaluator=evaluator: evaluator.evaluate(query)
+    router = RoutingAgent("benchmark", agents, embedding_cache=None)
+    plans = [sentences(config.steps, rng) for _ in range(config.workflows)]
+    for workers in config.concurrency:
+        engine = WorkflowEngine(router.route, max_workers=workers)
+        result = measure(
+            "workflow",
+            {"steps": config.steps, "workers": workers},
+            backend,
+            engine.run,
+            plans,
+        )
+        results.append(result)
+    return results
+
+
+SUITES: dict[str, Callable[[LocalBackend, "Config"], list[CaseResult]]] = {
+    "routing": bench_routing,
+    "rag": bench_rag,
+    "evaluation": bench_evaluation,
+    "workflow": bench_workflow,
+}
+
+
+@dataclass
+class Config:
+    agent_counts: list[int] = field(default_factory=lambda: [3, 30, 300])
+    corpus_sizes: list[int] = field(default_factory=lambda: [100_000, 1_000_000])
+    concurrency: list[int] = field(default_factory=lambda: [1, 4, 16])
+    queries: int = 200
+    max_interactions: int = 5
+    candidates: list[int] = field(default_factory=lambda: [1, 4])
+    steps: int = 6
+    workflows: int = 3
+    seed: int = 0
+
+    @classmethod
+    def quick(cls) -> "Config":
+        return cls(
+            agent_counts=[3, 30],
+            corpus_sizes=[50_000],
+            concurrency=[1, 4],
+            queries=40,
+            max_interactions=3,
+            steps=3,
+            workflows=2,
+        )
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=current_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES))
+    parser.add_argument("--quick", action="store_true", help="small sizes")
+    parser.add_argument(
+        "--latency",
+        default="lognormal:0.02:0.5",
+        help="simulated latency as distribution:mean[:spread] (seconds)",
+    )
+    parser.add_argument("--accept-rate", type=float, default=0.5)
+    parser.add_argument("--output", help="results file (default: benchmark_results/)")
+    args = parser.parse_args()
+
+    config = Config.quick() if args.quick else Config()
+    backend = LocalBackend(
+        latency=LatencyModel.parse(args.latency),
+        accept_rate=args.accept_rate,
+        seed=config.seed,
+    )
+    # Nothing may reach the network or the on-disk caches.
+    use_backend(backend)
+    set_completion_cache(None)
+
+    results: list[CaseResult] = []
+    for name in args.suite or list(SUITES):
+        results.extend(SUITES[name](backend, config))
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "accept_rate": args.accept_rate,
+        "config": asdict(config),
+        "results": [asdict(result) for result in results],
+    }
+    output = args.output or os.path.join(
+        default_output_dir,
+        f"{time.strftime('%Y%m%d_%H%M%S')}-{commit or 'nocommit'}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
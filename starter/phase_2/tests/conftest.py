@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import the library as ``workflow_agents``, relative to phase_2.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+from workflow_agents.backends import LocalBackend, use_backend
+from workflow_agents.batch import BatchRunner, LocalBatchProcessor
+from workflow_agents.batch_pipeline import BatchPipeline, WorkflowJob
+from workflow_agents.judging import JSON_INSTRUCTIONS
+from workflow_team import build_team
+
+STEP = "Define the development tasks for the email router"
+FIELDS = [
+    "Task ID",
+    "Task Title",
+    "Related User Story",
+    "Description",
+    "Acceptance Criteria",
+    "Estimated Effort",
+    "Dependencies",
+]
+
+
+class Recorder:
+    """
+    Answers like a scripted provider and records every chat conversation.
+
+    The first answer passes the validators but is rejected by the plain judge
+    after an unparseable structured reply; the refined answer is accepted.
+    """
+
+    def __init__(self):
+        self.conversations: list[str] = []
+
+    def __call__(self, messages):
+        self.conversations.append(json.dumps(messages, sort_keys=True))
+        system, prompt = messages[0]["content"], messages[-1]["content"]
+        if system.startswith("You are an action planning agent"):
+            return STEP
+        if "knowledge-based assistant" in messages[1]["content"]:
+            version = "v2" if prompt.startswith("The original prompt") else "v1"
+            return "\n".join(f"{field}: {version}" for field in FIELDS)
+        if JSON_INSTRUCTIONS in prompt:
+            return "not a JSON object"
+        if "Task ID: v1" in prompt:
+            return "No, the tasks lack estimates."
+        return "Yes, the tasks are complete."
+
+
+@pytest.fixture
+def recorder():
+    recorder = Recorder()
+    use_backend(LocalBackend(responder=recorder))
+    yield recorder
+    use_backend(None)
+
+
+def test_batch_mode_sends_the_requests_of_the_live_workflow(recorder, tmp_path):
+    team = build_team("", "An email router.")
+    team.routing_agent.embedding_cache = None
+    live = team.routing_agent.route(STEP)
+    live_requests = sorted(recorder.conversations)
+
+    recorder.conversations.clear()
+    team = build_team("", "An email router.")
+    backend = LocalBackend(responder=recorder)
+    runner = BatchRunner(
+        LocalBatchProcessor(backend, str(tmp_path / "jobs")),
+        str(tmp_path / "run"),
+        poll_interval=0,
+    )
+    job = WorkflowJob(
+        name="spec",
+        prompt="What would the development tasks for this product be?",
+        planner=team.action_planning_agent,
+        router=team.routing_agent,
+        evaluators=team.evaluation_agents,
+    )
+    [step] = BatchPipeline(runner, embedding_cache=None).run([job])["spec"]
+    batch_requests = sorted(recorder.conversations[1:])
+
+    assert step["result"] == live
+    assert step["success"] and step["iterations"] == 2
+    # Worker, structured judge, plain judge and instructions in round 1;
+    # worker, structured judge and plain judge in round 2.
+    assert len(batch_requests) == 7
+    assert batch_requests == live_requests
+
+
+def test_support_functions_are_the_routing_targets():
+    team = build_team("", "An email router.")
+    for agent in team.knowledge_agents:
+        assert agent.func != agent.respond
@@ -0,0 +1,130 @@
+import io
+import random
+import re
+
+import pytest
+from workflow_agents.chunking import iter_chunks, iter_normalized, iter_paragraph_chunks
+
+
+def reference_chunks(text, chunk_size, chunk_overlap, separator="\n"):
+    """The in-memory chunker iter_chunks replaced (RAGKnowledgePromptAgent.chunk_text)."""
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= chunk_size:
+        return [{"chunk_id": 0, "text": text, "chunk_size": len(text)}]
+    start, chunk_id = 0, 0
+    chunks = []
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        remaining_text = len(text) - start
+        if remaining_text < chunk_size // 2:
+            chunks.append(
+                {
+                    "chunk_id": chunk_id,
+                    "text": text[start:],
+                    "chunk_size": remaining_text,
+                    "start_char": start,
+                    "end_char": len(text),
+                }
+            )
+            break
+        if separator in text[start:end] and end < len(text):
+            end = start + text[start:end].rindex(separator) + len(separator)
+        chunks.append(
+            {
+                "chunk_id": chunk_id,
+                "text": text[start:end],
+                "chunk_size": end - start,
+                "start_char": start,
+                "end_char": end,
+            }
+        )
+        next_start = end - chunk_overlap
+        if next_start <= start:
+            next_start = start + 1
+        start = next_start
+        chunk_id += 1
+    return chunks
+
+
+def random_text(seed: int, length: int) -> str:
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "délta", "ε", "📦", "x"]
+    spaces = [" ", "  ", "\n", "\t", " \n\n "]
+    parts = []
+    while sum(map(len, parts)) < length:
+        parts.append(rng.choice(words))
+        parts.append(rng.choice(spaces))
+    return rng.choice(["", "  ", "\n"]) + "".join(parts)
+
+
+def without_offsets(chunks):
+    # The reference leaves offsets out when the text fits in one chunk.
+    return [
+        {k: chunk[k] for k in ("chunk_id", "text", "chunk_size")} for chunk in chunks
+    ]
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("read_size", [1, 7, 64, 1 << 16])
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 10), (64, 0), (30, 29)])
+def test_iter_chunks_matches_the_in_memory_chunker(
+    seed, read_size, chunk_size, chunk_overlap
+):
+    text = random_text(seed, 400)
+    expected = reference_chunks(text, chunk_size, chunk_overlap)
+    chunks = list(
+        iter_chunks(io.StringIO(text), chunk_size, chunk_overlap, read_size=read_size)
+    )
+    if len(expected) == 1 and "start_char" not in expected[0]:
+        assert without_offsets(chunks) == expected
+    else:
+        assert chunks == expected
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 5, 1 << 16])
+def test_separator_breaks_across_read_boundaries(read_size):
+    text = random_text(7, 500)
+    expected = reference_chunks(text, 60, 8, separator="x ")
+    chunks = iter_chunks(io.StringIO(text), 60, 8, separator="x ", read_size=read_size)
+    assert list(chunks) == expected
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5])
+def test_binary_sources_decode_characters_split_across_reads(read_size):
+    text = random_text(3, 300)
+    expected = reference_chunks(text, 40, 5)
+    source = io.BytesIO(text.encode("utf-8"))
+    assert list(iter_chunks(source, 40, 5, read_size=read_size)) == expected
+
+
+def test_paths_are_read_through_a_memory_map(tmp_path):
+    text = random_text(11, 2000)
+    path = tmp_path / "document.txt"
+    path.write_text(text, encoding="utf-8")
+    assert list(iter_chunks(path, 100, 20, read_size=13)) == reference_chunks(
+        text, 100, 20
+    )
+
+
+def test_empty_and_blank_sources_have_no_chunks(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("", encoding="utf-8")
+    assert list(iter_chunks(path)) == []
+    assert list(iter_chunks(io.StringIO(" \n\t "))) == []
+
+
+@pytest.mark.parametrize("read_size", [1, 4, 1 << 16])
+def test_iter_normalized_collapses_whitespace_across_reads(read_size):
+    text = "  a \n\n b\t\tc  \n"
+    assert "".join(iter_normalized(io.StringIO(text), read_size)) == "a b c"
+
+
+def test_paragraph_chunks_are_anchored_to_paragraphs():
+    text = "first paragraph\nstill first\n\n\nsecond one\n \nthird"
+    chunks = list(iter_paragraph_chunks(io.StringIO(text), chunk_size=100))
+    assert [(c["paragraph"], c["text"]) for c in chunks] == [
+        (0, "first paragraph still first"),
+        (1, "second one"),
+        (2, "third"),
+    ]
+    assert [c["chunk_id"] for c in chunks] == [0, 1, 2]
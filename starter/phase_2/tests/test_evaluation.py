@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from workflow_agents.base_agents import EvaluationAgent
+from workflow_agents.judging import Judgement
+
+
+class Worker:
+    name = "worker"
+    description = "answers"
+
+    def respond(self, input_text: str) -> str:
+        return input_text
+
+    func = respond
+
+
+def evaluator(candidates: int = 3) -> EvaluationAgent:
+    return EvaluationAgent(
+        openai_api_key="",
+        persona="a test evaluator",
+        evaluation_criteria="The answer must be brief.",
+        worker_agent=Worker(),
+        candidates=candidates,
+    )
+
+
+def rejected(source: str = "judge") -> Judgement:
+    return Judgement(False, "No, too long.", source=source)
+
+
+def test_fallback_prefers_the_temperature_zero_candidate():
+    judgements = {2: rejected(), 0: rejected("local"), 1: rejected()}
+    assert evaluator().fallback_candidate(judgements) == 0
+
+
+def test_fallback_skips_a_candidate_that_was_not_judged():
+    judgements = {0: None, 1: rejected("local"), 2: rejected()}
+    assert evaluator().fallback_candidate(judgements) == 2
+
+
+def test_fallback_takes_the_first_judged_candidate():
+    judgements = {0: None, 1: rejected("local"), 2: rejected("local")}
+    assert evaluator().fallback_candidate(judgements) == 1
+
+
+def test_fallback_without_any_judgement():
+    assert evaluator().fallback_candidate({1: None, 0: None}) == 0
+
+
+def test_sync_candidates_inside_a_running_loop_fail_clearly():
+    async def scenario():
+        evaluator().evaluate("question")
+
+    with pytest.raises(RuntimeError, match="aevaluate"):
+        asyncio.run(scenario())
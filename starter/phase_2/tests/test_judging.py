@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from workflow_agents.judging import Judgement, parse_judgement
+
+
+def reply(**document):
+    return json.dumps(document)
+
+
+def test_plain_json_reply():
+    judgement = parse_judgement(
+        reply(
+            verdict="no", reasons="Estimates are missing.", fix_instructions="Add them."
+        )
+    )
+    assert judgement == Judgement(
+        accepted=False,
+        evaluation="No, Estimates are missing.",
+        instructions="Add them.",
+        source="structured",
+    )
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '```json\n{"verdict": "yes", "reasons": "Complete."}\n```',
+        '```\n{"verdict": "yes", "reasons": "Complete."}```',
+        'Here is my verdict:\n{"verdict": "yes", "reasons": "Complete."}\nThanks.',
+    ],
+)
+def test_fenced_and_wrapped_replies(content):
+    judgement = parse_judgement(content)
+    assert judgement is not None
+    assert judgement.accepted
+    assert judgement.evaluation == "Yes, Complete."
+
+
+@pytest.mark.parametrize(
+    "verdict, accepted",
+    [
+        ("yes", True),
+        ("Yes.", True),
+        (" PASS ", True),
+        ("meets", True),
+        (True, True),
+        ("No", False),
+        ("rejected!", False),
+        ("n", False),
+        (False, False),
+    ],
+)
+def test_verdict_spellings(verdict, accepted):
+    judgement = parse_judgement(reply(verdict=verdict))
+    assert judgement is not None
+    assert judgement.accepted is accepted
+    assert judgement.evaluation == ("Yes" if accepted else "No")
+
+
+def test_keys_are_case_insensitive():
+    judgement = parse_judgement('{"Verdict": "no", "Reasons": "Too short."}')
+    assert judgement is not None
+    assert judgement.evaluation == "No, Too short."
+
+
+def test_list_valued_reasons_and_instructions_are_joined():
+    judgement = parse_judgement(
+        reply(
+            verdict="no",
+            reasons=["Task IDs are missing.", "Effort is missing."],
+            fix_instructions=["Number the tasks.", ["Estimate", "each task."]],
+        )
+    )
+    assert judgement is not None
+    assert judgement.evaluation == "No, Task IDs are missing. Effort is missing."
+    assert judgement.instructions == "Number the tasks. Estimate each task."
+
+
+def test_accepted_replies_carry_no_instructions():
+    judgement = parse_judgement(
+        reply(verdict="yes", reasons="Fine.", fix_instructions="Nothing to fix.")
+    )
+    assert judgement is not None
+    assert judgement.instructions is None
+
+
+def test_rejections_without_instructions_leave_them_unknown():
+    judgement = parse_judgement(reply(verdict="no", fix_instructions=""))
+    assert judgement is not None
+    assert judgement.instructions is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        None,
+        "",
+        "Yes, the answer meets the criteria.",
+        "{not json}",
+        '["yes"]',
+        reply(reasons="No verdict given."),
+        reply(verdict="maybe"),
+        reply(verdict=1),
+    ],
+)
+def test_unparseable_replies(content):
+    assert parse_judgement(content) is None
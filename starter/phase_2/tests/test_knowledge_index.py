@@ -0,0 +1,157 @@
+import hashlib
+import io
+
+import numpy as np
+import pytest
+from workflow_agents.knowledge_index import KnowledgeIndex
+from workflow_agents.vector_index import FlatIndex, IVFIndex, index_matches
+
+PARAGRAPHS = [f"Paragraph {i} talks about topic {i}." for i in range(6)]
+
+
+class Embedder:
+    """Embeds each text as a fixed random vector and records what it embedded."""
+
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def __call__(self, texts):
+        self.embedded.extend(texts)
+        return [self.vector(text) for text in texts]
+
+    @staticmethod
+    def vector(text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        return np.random.default_rng(seed).standard_normal(16)
+
+
+def document(paragraphs):
+    return io.StringIO("\n\n".join(paragraphs))
+
+
+def best_match(index, text):
+    ids, _ = index.search(Embedder.vector(text), k=1)
+    return index.store.text(int(ids[0]))
+
+
+@pytest.fixture
+def embed():
+    return Embedder()
+
+
+def test_update_embeds_only_new_chunks(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path))
+    stats = index.update(document(PARAGRAPHS), embed)
+    assert (stats.added, stats.removed, stats.unchanged) == (6, 0, 0)
+
+    embed.embedded.clear()
+    edited = PARAGRAPHS[:2] + ["A brand new paragraph."] + PARAGRAPHS[3:]
+    stats = index.update(document(edited), embed)
+
+    assert (stats.added, stats.removed, stats.unchanged) == (1, 1, 5)
+    assert embed.embedded == ["A brand new paragraph."]
+    assert len(index) == 6
+    assert best_match(index, "A brand new paragraph.") == "A brand new paragraph."
+
+
+def test_removed_chunks_are_tombstoned(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path), compact_ratio=1.0)
+    index.update(document(PARAGRAPHS), embed)
+    index.update(document(PARAGRAPHS[1:]), embed)
+
+    # The removed row is still stored but no search returns it.
+    assert len(index.store) == 6 and len(index) == 5
+    ids, _ = index.search(Embedder.vector(PARAGRAPHS[0]), k=10)
+    assert len(ids) == 5
+    assert PARAGRAPHS[0] not in {index.store.text(int(i)) for i in ids}
+
+
+def test_compact_drops_tombstones_without_reembedding(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path), compact_ratio=1.0)
+    index.update(document(PARAGRAPHS), embed)
+    index.update(document(PARAGRAPHS[2:]), embed)
+    embed.embedded.clear()
+
+    index.compact()
+
+    assert embed.embedded == []
+    assert len(index.store) == len(index) == 4
+    assert sorted(index.store.texts()) == sorted(PARAGRAPHS[2:])
+    for paragraph in PARAGRAPHS[2:]:
+        assert best_match(index, paragraph) == paragraph
+
+
+def test_updates_compact_once_enough_rows_are_dead(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path), compact_ratio=0.5)
+    index.update(document(PARAGRAPHS), embed)
+    index.update(document(PARAGRAPHS[:4]), embed)
+    assert len(index.store) == 6
+
+    index.update(document(PARAGRAPHS[:2]), embed)
+    # Four of six rows were dead, so the update compacted the store.
+    assert len(index.store) == len(index) == 2
+
+
+def test_reopened_index_keeps_its_tombstones(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path), compact_ratio=1.0)
+    index.update(document(PARAGRAPHS), embed)
+    index.update(document(PARAGRAPHS[1:]), embed)
+    index.store.close()
+
+    reopened = KnowledgeIndex("docs", root=str(tmp_path), compact_ratio=1.0)
+    assert len(reopened) == 5
+    embed.embedded.clear()
+    stats = reopened.update(document(PARAGRAPHS[1:]), embed)
+    assert (stats.added, stats.removed, stats.unchanged) == (0, 0, 5)
+    assert embed.embedded == []
+
+
+def test_reopening_with_another_index_type_rebuilds_the_index(tmp_path, embed):
+    index = KnowledgeIndex("docs", root=str(tmp_path))
+    index.update(document(PARAGRAPHS), embed)
+    index.store.close()
+
+    reopened = KnowledgeIndex("docs", root=str(tmp_path), index_type="ivf")
+    assert isinstance(reopened._index, IVFIndex)
+    assert best_match(reopened, PARAGRAPHS[3]) == PARAGRAPHS[3]
+    reopened.store.close()
+
+    flat = KnowledgeIndex("docs", root=str(tmp_path))
+    assert isinstance(flat._index, FlatIndex)
+
+
+def test_reopening_with_other_ivf_settings_rebuilds_the_index(tmp_path, embed):
+    params = {"n_lists": 2, "n_probe": 1}
+    index = KnowledgeIndex(
+        "docs", root=str(tmp_path), index_type="ivf", index_params=params
+    )
+    index.update(document(PARAGRAPHS), embed)
+    index.store.close()
+
+    params = {"n_lists": 3, "n_probe": 3}
+    reopened = KnowledgeIndex(
+        "docs", root=str(tmp_path), index_type="ivf", index_params=params
+    )
+    assert (reopened._index.n_lists, reopened._index.n_probe) == (3, 3)
+    reopened.store.close()
+
+    # A matching index is loaded as saved.
+    assert (
+        KnowledgeIndex(
+            "docs", root=str(tmp_path), index_type="ivf", index_params=params
+        )._index.n_lists
+        == 3
+    )
+
+
+def test_index_matches_compares_kind_and_ivf_settings():
+    vectors = np.eye(4, dtype=np.float32)
+    ivf = IVFIndex.build(vectors, n_lists=2, n_probe=1)
+    assert index_matches(ivf, "ivf", n_lists=2, n_probe=1)
+    assert index_matches(ivf, "ivf", n_probe=1)
+    assert not index_matches(ivf, "ivf", n_lists=3, n_probe=1)
+    assert not index_matches(ivf, "ivf", n_lists=2, n_probe=2)
+    assert not index_matches(ivf, "flat")
+    assert not index_matches(FlatIndex(vectors), "ivf", n_probe=1)
+    # More lists than rows are capped to one list per row.
+    assert index_matches(IVFIndex.build(vectors, n_lists=9), "ivf", n_lists=9)
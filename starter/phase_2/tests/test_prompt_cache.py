@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from workflow_agents.backends import LatencyModel, LocalBackend, use_backend
+from workflow_agents.base_agents import KnowledgeAugmentedPromptAgent
+from workflow_agents.completion_cache import CompletionCache
+from workflow_agents.completions import set_completion_cache
+
+
+@pytest.fixture
+def agent():
+    use_backend(LocalBackend(latency=LatencyModel(mean=0.05)))
+    yield KnowledgeAugmentedPromptAgent(
+        openai_api_key="",
+        persona="You are a Product Manager.",
+        knowledge="Stories start with: As a",
+    )
+    use_backend(None)
+
+
+@pytest.fixture
+def completion_cache():
+    cache = CompletionCache()
+    set_completion_cache(cache)
+    yield cache
+    set_completion_cache(None)
+
+
+def test_completion_cache_hits_are_not_counted_again(agent, completion_cache):
+    first = agent.respond("Write a story.")
+    assert agent.respond("Write a story.") == first
+
+    assert completion_cache.stats.hits == 1
+    assert agent.prompt_cache.calls == 1
+
+
+def test_coalesced_requests_are_counted_once(agent):
+    async def scenario():
+        return await asyncio.gather(
+            agent.arespond("Write a story."), agent.arespond("Write a story.")
+        )
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert agent.prompt_cache.calls == 1
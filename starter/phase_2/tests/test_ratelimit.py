@@ -0,0 +1,238 @@
+import asyncio
+import time
+from dataclasses import replace
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from workflow_agents.clients import configure_clients, get_config
+from workflow_agents.ratelimit import (
+    ConcurrencyWindow,
+    RateLimiter,
+    TokenBucket,
+    set_rate_limiter,
+)
+
+# Estimated at 50 tokens: len("") // 4 + 1 + max_tokens.
+REQUEST = {"input": "", "max_tokens": 49}
+
+
+def rate_limit_error() -> openai.RateLimitError:
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(429, request=request, json={"error": {}})
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def ok():
+    return "response", 0, None
+
+
+async def aok():
+    return ok()
+
+
+def test_window_shrinks_on_throttling_and_grows_on_success():
+    window = ConcurrencyWindow(limit=8.0, decrease_interval=60.0)
+
+    window.acquire()
+    window.release(throttled=True)
+    assert window.limit == 4.0
+
+    # A burst of 429s counts as one congestion signal.
+    window.acquire()
+    window.release(throttled=True)
+    assert window.limit == 4.0
+
+    window.acquire()
+    window.release(succeeded=True)
+    assert window.limit == 4.25
+    assert window.in_flight == 0
+
+
+def test_window_stays_within_its_bounds():
+    window = ConcurrencyWindow(limit=1.5, minimum=1, maximum=2, decrease_interval=0)
+    for _ in range(3):
+        window.acquire()
+        window.release(throttled=True)
+    assert window.limit == 1
+    for _ in range(10):
+        window.acquire()
+        window.release(succeeded=True)
+    assert window.limit == 2
+
+
+def test_window_blocks_at_its_limit():
+    window = ConcurrencyWindow(limit=2.0)
+    assert window.try_acquire()
+    assert window.try_acquire()
+    assert not window.try_acquire()
+    window.release()
+    assert window.try_acquire()
+
+
+def test_limiter_success_grows_the_window():
+    limiter = RateLimiter(concurrency=4)
+    assert limiter.call(ok, REQUEST) == ("response", 0)
+    assert limiter.window.limit == 4.25
+    assert limiter.window.in_flight == 0
+    assert limiter.stats.requests == 1
+
+
+def test_limiter_throttling_shrinks_the_window():
+    limiter = RateLimiter(concurrency=4, base_delay=0.001, max_delay=0.001)
+    replies = iter([rate_limit_error(), None])
+
+    def send():
+        error = next(replies)
+        if error is not None:
+            raise error
+        return ok()
+
+    assert limiter.call(send, REQUEST) == ("response", 1)
+    assert limiter.window.limit == 2.5
+    assert (limiter.stats.throttled, limiter.stats.requests) == (1, 1)
+
+
+def test_cancelled_paced_call_releases_its_slot():
+    # 60 RPM allows one request now and the next one a second later.
+    limiter = RateLimiter(requests_per_minute=60, concurrency=2)
+
+    async def scenario():
+        await limiter.acall(aok, REQUEST)
+        paced = asyncio.create_task(limiter.acall(aok, REQUEST))
+        await asyncio.sleep(0.05)
+        assert limiter.window.in_flight == 1
+        paced.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await paced
+
+    asyncio.run(scenario())
+    assert limiter.window.in_flight == 0
+    assert limiter.stats.requests == 1
+
+
+def test_token_bucket_waits_for_the_overdraft():
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.capacity == 10
+    assert bucket.reserve(10) == 0.0
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.01)
+
+
+def test_pacing_respects_requests_per_minute():
+    # 600 RPM: a burst of 10, then one request every 0.1 seconds.
+    limiter = RateLimiter(requests_per_minute=600)
+    start = time.monotonic()
+    for _ in range(15):
+        limiter.call(ok, REQUEST)
+    assert time.monotonic() - start >= 0.45
+    assert limiter.stats.waited > 0
+
+
+def test_pacing_respects_tokens_per_minute():
+    # 6000 TPM: a burst of 100 tokens, two requests of 50, then 100 per second.
+    limiter = RateLimiter(tokens_per_minute=6000)
+    start = time.monotonic()
+    for _ in range(2):
+        limiter.call(ok, REQUEST)
+    assert time.monotonic() - start < 0.1
+    limiter.call(ok, REQUEST)
+    assert time.monotonic() - start >= 0.45
+
+
+def test_retries_stop_at_the_maximum():
+    limiter = RateLimiter(max_retries=3, base_delay=0.001, max_delay=0.002)
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        limiter.call(send, REQUEST)
+
+    assert len(attempts) == 4
+    assert limiter.stats.throttled == 4
+    assert limiter.stats.requests == 0
+    assert limiter.window.in_flight == 0
+
+
+def test_async_retries_stop_at_the_maximum():
+    limiter = RateLimiter(max_retries=2, base_delay=0.001, max_delay=0.002)
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        raise rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(limiter.acall(send, REQUEST))
+
+    assert len(attempts) == 3
+    assert limiter.window.in_flight == 0
+
+
+STREAM_REQUEST = {**REQUEST, "stream": True}
+# A content chunk, then the final chunk with the request's usage.
+CHUNKS = [
+    SimpleNamespace(usage=None),
+    SimpleNamespace(usage=SimpleNamespace(total_tokens=10)),
+]
+
+
+def test_streams_hold_their_slot_until_consumed():
+    # 6000 TPM: a bucket of 100 tokens; the request is estimated at 50.
+    limiter = RateLimiter(tokens_per_minute=6000)
+    stream, _ = limiter.call(lambda: (iter(CHUNKS), 0, None), STREAM_REQUEST)
+    assert limiter.window.in_flight == 1
+    assert limiter.stats.requests == 0
+
+    assert list(stream) == CHUNKS
+    assert limiter.window.in_flight == 0
+    assert limiter.stats.requests == 1
+    # The 40 tokens overestimated were refunded from the final chunk's usage.
+    assert limiter._tokens._level == pytest.approx(90, abs=1)
+
+
+def test_closed_streams_free_their_slot():
+    limiter = RateLimiter(concurrency=4)
+    stream, _ = limiter.call(lambda: (iter(CHUNKS), 0, None), STREAM_REQUEST)
+    next(stream)
+    stream.close()
+    assert limiter.window.in_flight == 0
+    # An abandoned stream is no success signal.
+    assert limiter.window.limit == 4.0
+    assert limiter.stats.requests == 0
+
+
+def test_async_streams_hold_their_slot_until_consumed():
+    limiter = RateLimiter(tokens_per_minute=6000)
+
+    async def send():
+        async def chunks():
+            for chunk in CHUNKS:
+                yield chunk
+
+        return chunks(), 0, None
+
+    async def scenario():
+        stream, _ = await limiter.acall(send, STREAM_REQUEST)
+        assert limiter.window.in_flight == 1
+        return [chunk async for chunk in stream]
+
+    assert asyncio.run(scenario()) == CHUNKS
+    assert limiter.window.in_flight == 0
+    assert limiter._tokens._level == pytest.approx(90, abs=1)
+
+
+def test_removing_the_limiter_restores_the_configured_client_retries():
+    original = get_config()
+    configure_clients(replace(original, max_retries=5))
+    try:
+        set_rate_limiter(RateLimiter())
+        assert get_config().max_retries == 0
+        set_rate_limiter(None)
+        assert get_config().max_retries == 5
+    finally:
+        set_rate_limiter(None)
+        configure_clients(original)
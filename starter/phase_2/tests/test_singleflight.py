@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from workflow_agents.singleflight import SingleFlight
+
+# Long enough for every follower to join a leader that is held open.
+JOIN_DELAY = 0.2
+
+
+def test_sync_followers_share_the_leaders_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(flights.do, "key", call) for _ in range(5)]
+        time.sleep(JOIN_DELAY)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert (flights.stats.leaders, flights.stats.followers) == (1, 4)
+
+
+def test_sync_followers_receive_the_leaders_exception():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def call():
+        release.wait(5)
+        raise ValueError("failed")
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(flights.do, "key", call) for _ in range(3)]
+        time.sleep(JOIN_DELAY)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+
+    assert (flights.stats.leaders, flights.stats.followers) == (1, 2)
+
+
+def test_sequential_calls_are_not_cached():
+    flights = SingleFlight()
+    assert flights.do("key", lambda: 1) == (1, False)
+    assert flights.do("key", lambda: 2) == (2, False)
+    assert flights.stats.leaders == 2
+
+
+def test_async_followers_on_the_same_loop():
+    flights = SingleFlight()
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def call():
+            calls.append(1)
+            await release.wait()
+            return "answer"
+
+        tasks = [asyncio.create_task(flights.ado("key", call)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 5
+    assert [shared for _, shared in results] == [False] + [True] * 4
+    assert (flights.stats.leaders, flights.stats.followers) == (1, 4)
+
+
+def test_sync_caller_on_the_loop_thread_calls_directly():
+    # Blocking on the async leader would block the loop that has to finish it.
+    flights = SingleFlight()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return "async"
+
+        leader = asyncio.create_task(flights.ado("key", call))
+        await asyncio.sleep(0.01)
+        direct = flights.do("key", lambda: "sync")
+        release.set()
+        return direct, await leader
+
+    direct, led = asyncio.run(scenario())
+
+    assert direct == ("sync", False)
+    assert led == ("async", False)
+    assert (flights.stats.leaders, flights.stats.followers) == (2, 0)
+
+
+def test_followers_retry_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def blocked():
+            calls.append("leader")
+            await release.wait()
+            return "never"
+
+        async def call():
+            calls.append("retry")
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        leader = asyncio.create_task(flights.ado("key", blocked))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flights.ado("key", call)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return results
+
+    results = asyncio.run(scenario())
+
+    # One follower takes over as leader, the other two share its result.
+    assert calls == ["leader", "retry"]
+    assert [result for result, _ in results] == ["answer"] * 3
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert (flights.stats.leaders, flights.stats.followers) == (2, 2)
+
+
+def test_thread_follower_retries_when_the_async_leader_is_cancelled():
+    flights = SingleFlight()
+    joined = threading.Event()
+
+    async def scenario():
+        async def blocked():
+            await asyncio.sleep(5)
+
+        leader = asyncio.create_task(flights.ado("key", blocked))
+        await asyncio.sleep(0.01)
+
+        def follow():
+            joined.set()
+            return flights.do("key", lambda: "answer")
+
+        follower = asyncio.get_running_loop().run_in_executor(None, follow)
+        await asyncio.to_thread(joined.wait, 5)
+        await asyncio.sleep(JOIN_DELAY)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == ("answer", False)
+    assert (flights.stats.leaders, flights.stats.followers) == (2, 0)
+
+
+def test_threads_and_coroutines_coalesce_with_each_other():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    async def acall():
+        return await asyncio.to_thread(call)
+
+    async def coroutines():
+        return await asyncio.gather(*(flights.ado("key", acall) for _ in range(10)))
+
+    with ThreadPoolExecutor(max_workers=11) as pool:
+        threads = [pool.submit(flights.do, "key", call) for _ in range(10)]
+        loop = pool.submit(asyncio.run, coroutines())
+        time.sleep(JOIN_DELAY)
+        release.set()
+        results = [future.result() for future in threads] + loop.result()
+
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["answer"] * 20
+    assert (flights.stats.leaders, flights.stats.followers) == (1, 19)
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+from workflow_agents.workflow_engine import WorkflowEngine, sequential_dependencies
+
+
+class Recorder:
+    """Executes steps, recording when each one starts and finishes."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.events: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, step: str) -> str:
+        with self._lock:
+            self.events.append(("start", step))
+        time.sleep(self.delay)
+        if step.startswith("fail"):
+            raise RuntimeError(f"{step} broke")
+        with self._lock:
+            self.events.append(("end", step))
+        return step.upper()
+
+    def index(self, kind: str, step: str) -> int:
+        return self.events.index((kind, step))
+
+
+def test_results_are_in_plan_order():
+    engine = WorkflowEngine(Recorder())
+    results = engine.run(["a", "b", "c"])
+    assert [result["step_number"] for result in results] == [1, 2, 3]
+    assert [result["result"] for result in results] == ["A", "B", "C"]
+
+
+def test_steps_wait_for_their_dependencies():
+    recorder = Recorder(delay=0.02)
+    engine = WorkflowEngine(recorder, max_workers=4)
+    engine.run(["a", "b", "c", "d"], {3: [1, 2], 4: [3]})
+
+    assert recorder.index("start", "c") > recorder.index("end", "a")
+    assert recorder.index("start", "c") > recorder.index("end", "b")
+    assert recorder.index("start", "d") > recorder.index("end", "c")
+
+
+def test_independent_steps_run_concurrently():
+    engine = WorkflowEngine(Recorder(delay=0.1), max_workers=4)
+    start = time.monotonic()
+    engine.run(["a", "b", "c", "d"])
+    assert time.monotonic() - start < 0.3
+
+
+def test_sequential_dependencies_chain_every_step():
+    recorder = Recorder()
+    WorkflowEngine(recorder).run(["a", "b", "c"], sequential_dependencies(3))
+    assert recorder.events == [
+        ("start", "a"),
+        ("end", "a"),
+        ("start", "b"),
+        ("end", "b"),
+        ("start", "c"),
+        ("end", "c"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "dependencies, message",
+    [
+        ({1: [2], 2: [1]}, "cycle"),
+        ({1: [2], 2: [3], 3: [1]}, "cycle"),
+        ({4: [1]}, "Unknown step 4"),
+        ({2: [5]}, "invalid dependency 5"),
+        ({2: [2]}, "invalid dependency 2"),
+    ],
+)
+def test_invalid_dependencies_are_rejected(dependencies, message):
+    recorder = Recorder()
+    with pytest.raises(ValueError, match=message):
+        WorkflowEngine(recorder).run(["a", "b", "c"], dependencies)
+    assert recorder.events == []
+
+
+def test_a_failing_step_does_not_stop_the_others():
+    engine = WorkflowEngine(Recorder())
+    results = engine.run(["a", "fail-b", "c"], {3: [2]})
+    assert [result["result"] for result in results] == [
+        "A",
+        "Error: fail-b broke",
+        "C",
+    ]
+
+
+def test_streamed_steps_hand_over_their_deltas():
+    def execute(step: str):
+        yield from step.split()
+        return f"result of {step}"
+
+    deltas: list[tuple[int, str]] = []
+    engine = WorkflowEngine(
+        execute, on_delta=lambda number, delta: deltas.append((number, delta))
+    )
+    [result] = engine.run(["stream these words"])
+
+    assert result["result"] == "result of stream these words"
+    assert deltas == [(1, "stream"), (1, "these"), (1, "words")]
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from workflow_agents.backends import LocalBackend, use_backend
+from workflow_team import build_team
+
+STORY = "As a support agent, I want emails routed so that I answer faster."
+
+
+class ProductManager:
+    """Answers without a user story first, then with one after refinement."""
+
+    def __init__(self):
+        self.judge_prompts: list[str] = []
+
+    def __call__(self, messages):
+        prompt = messages[-1]["content"]
+        if prompt.startswith("Does the following answer"):
+            self.judge_prompts.append(prompt)
+            return json.dumps({"verdict": "yes", "reasons": "Stories follow it."})
+        if prompt.startswith("The original prompt"):
+            return STORY
+        return "The product needs stories."
+
+
+@pytest.fixture
+def product_manager():
+    product_manager = ProductManager()
+    use_backend(LocalBackend(responder=product_manager))
+    yield product_manager
+    use_backend(None)
+
+
+@pytest.fixture
+def team():
+    team = build_team("", "An email router.")
+    team.routing_agent.embedding_cache = None
+    return team
+
+
+def test_routed_steps_are_checked_by_the_validators(product_manager, team):
+    step = team.product_manager_knowledge_agent.description
+
+    assert team.routing_agent.route(step) == STORY
+    # The answer without a story was rejected locally; only the refined one
+    # reached the judge.
+    assert len(product_manager.judge_prompts) == 1
+    assert STORY in product_manager.judge_prompts[0]
+
+
+def test_streamed_steps_are_evaluated_and_revised(product_manager, team):
+    step = team.product_manager_knowledge_agent.description
+    stream = team.routing_agent.route(step, stream=True)
+
+    deltas = []
+    with pytest.raises(StopIteration) as stop:
+        while True:
+            deltas.append(next(stream))
+
+    streamed = "".join(deltas)
+    assert streamed.startswith("The product needs stories.")
+    assert streamed.endswith(f"\n[Revised after evaluation]\n{STORY}")
+    # The engine keeps the generator's return value as the step result.
+    assert stop.value.value == STORY
+    assert len(product_manager.judge_prompts) == 1
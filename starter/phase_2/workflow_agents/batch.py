@@ -0,0 +1,433 @@
+"""
+Bulk execution of chat and embedding requests through a provider batch API.
+
+Batch endpoints trade latency (results arrive within a completion window,
+usually hours) for a lower price and limits separate from the synchronous
+ones, which suits large offline runs. A ``BatchRunner`` executes one stage
+of requests at a time:
+
+- each request becomes a line ``{"custom_id", "method", "url", "body"}`` of a
+  JSONL input file, one file per endpoint and at most ``max_requests`` lines;
+- the files are submitted to a ``BatchProcessor`` and polled until done;
+- results are appended to ``<stage>.results.jsonl`` in the run directory as
+  each batch finishes, and submitted batch ids to ``<stage>.json``.
+
+A custom id is derived from the request body, so identical requests are sent
+once and a stage that is run again only submits the requests it has no
+result for. Rerunning a pipeline after an interruption therefore resumes it:
+finished stages are read back from disk, batches still in progress are
+polled again, and only the remainder is submitted. Lines that fail (rate
+limits, server errors, expired batches) are resubmitted up to ``retries``
+times.
+
+``OpenAIBatchProcessor`` talks to the Files and Batches API;
+``LocalBatchProcessor`` answers the same files with a ``LocalBackend`` so
+batch runs can be tested offline.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from openai.types.chat import ChatCompletion
+from openai.types.create_embedding_response import CreateEmbeddingResponse
+
+from .backends import LocalBackend
+from .clients import get_client
+
+CHAT_URL = "/v1/chat/completions"
+EMBEDDINGS_URL = "/v1/embeddings"
+
+# Provider limits are 50,000 requests and 200 MB per input file.
+default_max_requests = 50_000
+default_max_bytes = 190 * 2**20
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+@dataclass
+class BatchRequest:
+    """
+    Parameters:
+    url (str): ``CHAT_URL`` or ``EMBEDDINGS_URL``.
+    body (dict): The request as it would be passed to ``create``.
+    sample (int): Tells apart draws of one sampled request (best-of-N
+        candidates), which are sent separately although their bodies match.
+    """
+
+    url: str
+    body: dict[str, Any]
+    sample: int = 0
+
+    @property
+    def custom_id(self) -> str:
+        """Content address of the request; equal requests share it."""
+        key: list[Any] = [self.url, self.body]
+        if self.sample:
+            key.append(self.sample)
+        payload = json.dumps(key, sort_keys=True)
+        return "req-" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def line(self) -> dict[str, Any]:
+        return {
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": self.url,
+            "body": self.body,
+        }
+
+
+@dataclass
+class BatchResult:
+    """
+    One output line of a batch.
+
+    Parameters:
+    custom_id (str): Id of the request it answers.
+    status_code (int): HTTP status of the request; 0 if it never ran.
+    body (dict | None): The response body.
+    error (str | None): Why the request failed, if it did.
+    """
+
+    custom_id: str
+    status_code: int = 0
+    body: dict[str, Any] | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code == 200 and self.body is not None
+
+    @classmethod
+    def from_line(cls, line: dict[str, Any]) -> "BatchResult":
+        """Reads a line of a batch output or error file."""
+        response = line.get("response") or {}
+        body = response.get("body")
+        error = line.get("error")
+        if error is None and isinstance(body, dict) and "error" in body:
+            error = body["error"]
+        if isinstance(error, dict):
+            error = error.get("message") or json.dumps(error)
+        return cls(
+            custom_id=line["custom_id"],
+            status_code=int(response.get("status_code") or 0),
+            body=body if isinstance(body, dict) else None,
+            error=error,
+        )
+
+    def line(self) -> dict[str, Any]:
+        return {
+            "custom_id": self.custom_id,
+            "response": {"status_code": self.status_code, "body": self.body},
+            "error": self.error and {"message": self.error},
+        }
+
+    def chat(self) -> ChatCompletion | None:
+        return ChatCompletion.model_validate(self.body) if self.ok else None
+
+    def embeddings(self) -> CreateEmbeddingResponse | None:
+        return CreateEmbeddingResponse.model_validate(self.body) if self.ok else None
+
+    def content(self) -> str | None:
+        """The message content of a chat completion result."""
+        completion = self.chat()
+        if completion is None or not completion.choices:
+            return None
+        return completion.choices[0].message.content
+
+
+class BatchProcessor(Protocol):
+    def submit(self, input_path: str, url: str) -> str:
+        """Submits a JSONL input file and returns the batch id."""
+        ...
+
+    def poll(self, batch_id: str) -> str:
+        """Returns the batch status, e.g. ``in_progress`` or ``completed``."""
+        ...
+
+    def results(self, batch_id: str) -> list[dict[str, Any]]:
+        """Returns the output and error lines of a finished batch."""
+        ...
+
+
+@dataclass
+class OpenAIBatchProcessor:
+    """Runs batches with the provider's Files and Batches API."""
+
+    api_key: str
+    completion_window: str = "24h"
+
+    def submit(self, input_path: str, url: str) -> str:
+        client = get_client(self.api_key)
+        with open(input_path, "rb") as file:
+            uploaded = client.files.create(file=file, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=url,  # type: ignore[arg-type]
+            completion_window=self.completion_window,  # type: ignore[arg-type]
+            metadata={"source": os.path.basename(input_path)},
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> str:
+        return get_client(self.api_key).batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> list[dict[str, Any]]:
+        client = get_client(self.api_key)
+        batch = client.batches.retrieve(batch_id)
+        lines: list[dict[str, Any]] = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(_parse_lines(client.files.content(file_id).text))
+        return lines
+
+
+@dataclass
+class LocalBatchProcessor:
+    """
+    Offline stand-in for the batch API backed by a ``LocalBackend``.
+
+    Jobs are kept as files in ``directory``, so a batch submitted by one
+    process can be polled by the next. A batch stays ``in_progress`` for
+    ``turnaround`` seconds, then every line is answered at once; the
+    backend's injected errors and request ceiling fail individual lines.
+
+    Parameters:
+    backend (LocalBackend): Answers the requests.
+    directory (str): Where jobs and their output files are kept.
+    turnaround (float): Seconds before a batch completes.
+    """
+
+    backend: LocalBackend
+    directory: str
+    turnaround: float = 0.0
+
+    def submit(self, input_path: str, url: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        batch_id = f"batch_local_{uuid.uuid4().hex}"
+        job = {"input": os.path.abspath(input_path), "url": url, "at": time.time()}
+        with open(self._path(batch_id, "json"), "w", encoding="utf-8") as file:
+            json.dump(job, file)
+        return batch_id
+
+    def poll(self, batch_id: str) -> str:
+        output_path = self._path(batch_id, "output.jsonl")
+        if os.path.exists(output_path):
+            return "completed"
+        with open(self._path(batch_id, "json"), encoding="utf-8") as file:
+            job = json.load(file)
+        if time.time() - job["at"] < self.turnaround:
+            return "in_progress"
+        with open(job["input"], encoding="utf-8") as file:
+            lines = [self._answer(line) for line in _parse_lines(file.read())]
+        _write_lines(output_path, lines)
+        return "completed"
+
+    def results(self, batch_id: str) -> list[dict[str, Any]]:
+        with open(self._path(batch_id, "output.jsonl"), encoding="utf-8") as file:
+            return _parse_lines(file.read())
+
+    def _answer(self, line: dict[str, Any]) -> dict[str, Any]:
+        kind = "embedding" if line["url"] == EMBEDDINGS_URL else "chat"
+        try:
+            # Batches are answered in bulk, so the simulated latency is skipped.
+            self.backend.begin(kind)
+        except Exception as e:
+            status = getattr(e, "status_code", 500)
+            return BatchResult(line["custom_id"], status, error=str(e)).line()
+        if kind == "embedding":
+            response: Any = self.backend.embeddings(line["body"])
+        else:
+            response = self.backend.chat(line["body"])
+        return BatchResult(line["custom_id"], 200, response.model_dump()).line()
+
+    def _path(self, batch_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.{suffix}")
+
+
+@dataclass
+class BatchStats:
+    submitted_batches: int = 0
+    submitted_requests: int = 0
+    reused_results: int = 0
+    failed_requests: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"batches={self.submitted_batches} requests={self.submitted_requests} "
+            f"reused={self.reused_results} failed={self.failed_requests}"
+        )
+
+
+@dataclass
+class BatchRunner:
+    """
+    Runs stages of requests through a processor and keeps their results.
+
+    Parameters:
+    processor (BatchProcessor): Where batches are submitted.
+    directory (str): Run directory holding input files, batch ids and results.
+    poll_interval (float): Seconds between status checks.
+    retries (int): Resubmissions of requests whose line failed.
+    max_requests (int): Lines per input file.
+    max_bytes (int): Bytes per input file.
+    """
+
+    processor: BatchProcessor
+    directory: str
+    poll_interval: float = 60.0
+    retries: int = 2
+    max_requests: int = default_max_requests
+    max_bytes: int = default_max_bytes
+    stats: BatchStats = field(default_factory=BatchStats)
+
+    def __post_init__(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def run(self, stage: str, requests: Sequence[BatchRequest]) -> list[BatchResult]:
+        """
+        Returns one result per request, in order. Results already stored for
+        ``stage`` are reused, unfinished batches are awaited, and only the
+        remaining requests are submitted.
+        """
+        unique = {request.custom_id: request for request in requests}
+        results = self._load_results(stage)
+        self.stats.reused_results += sum(1 for key in unique if key in results)
+        state = self._load_state(stage)
+
+        for attempt in range(self.retries + 2):
+            for batch in state["batches"]:
+                if not batch["done"]:
+                    self._await(stage, state, batch, results)
+            missing = [
+                request
+                for key, request in unique.items()
+                if key not in results or not results[key].ok
+            ]
+            if not missing or attempt > self.retries:
+                break
+            if attempt:
+                print(f"[Batch] {stage}: resubmitting {len(missing)} failed requests")
+            for url, part in self._parts(missing):
+                self._submit(stage, state, url, part)
+
+        failed = [key for key in unique if key not in results or not results[key].ok]
+        self.stats.failed_requests += len(failed)
+        if failed:
+            print(f"[Batch] {stage}: {len(failed)} requests failed")
+        return [
+            results.get(request.custom_id, BatchResult(request.custom_id))
+            for request in requests
+        ]
+
+    def _submit(
+        self,
+        stage: str,
+        state: dict[str, Any],
+        url: str,
+        part: list[BatchRequest],
+    ) -> None:
+        input_path = self._path(f"{stage}.{len(state['batches']) + 1:04d}.input.jsonl")
+        _write_lines(input_path, [request.line() for request in part])
+        batch_id = self.processor.submit(input_path, url)
+        state["batches"].append({"id": batch_id, "input": input_path, "done": False})
+        self._save_state(stage, state)
+        self.stats.submitted_batches += 1
+        self.stats.submitted_requests += len(part)
+        print(f"[Batch] {stage}: submitted {batch_id} with {len(part)} requests")
+
+    def _await(
+        self,
+        stage: str,
+        state: dict[str, Any],
+        batch: dict[str, Any],
+        results: dict[str, BatchResult],
+    ) -> None:
+        """Polls a batch until it finishes and stores its results."""
+        status = self.processor.poll(batch["id"])
+        while status not in TERMINAL_STATUSES:
+            print(f"[Batch] {stage}: {batch['id']} is {status}")
+            time.sleep(self.poll_interval)
+            status = self.processor.poll(batch["id"])
+        # Expired and cancelled batches still return the lines they finished.
+        lines = self.processor.results(batch["id"]) if status != "failed" else []
+        finished = [BatchResult.from_line(line) for line in lines]
+        with open(self._path(f"{stage}.results.jsonl"), "a", encoding="utf-8") as file:
+            for result in finished:
+                file.write(json.dumps(result.line()) + "\n")
+        _merge(results, finished)
+        batch["done"] = True
+        batch["status"] = status
+        self._save_state(stage, state)
+        print(f"[Batch] {stage}: {batch['id']} {status} with {len(finished)} results")
+
+    def _parts(
+        self, requests: list[BatchRequest]
+    ) -> Iterator[tuple[str, list[BatchRequest]]]:
+        """Splits requests into input files by endpoint and the file limits."""
+        by_url: dict[str, list[BatchRequest]] = {}
+        for request in requests:
+            by_url.setdefault(request.url, []).append(request)
+        for url, group in by_url.items():
+            part: list[BatchRequest] = []
+            size = 0
+            for request in group:
+                line_size = len(json.dumps(request.line())) + 1
+                if part and (
+                    len(part) >= self.max_requests or size + line_size > self.max_bytes
+                ):
+                    yield url, part
+                    part, size = [], 0
+                part.append(request)
+                size += line_size
+            if part:
+                yield url, part
+
+    def _load_results(self, stage: str) -> dict[str, BatchResult]:
+        results: dict[str, BatchResult] = {}
+        path = self._path(f"{stage}.results.jsonl")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                lines = _parse_lines(file.read())
+            _merge(results, [BatchResult.from_line(line) for line in lines])
+        return results
+
+    def _load_state(self, stage: str) -> dict[str, Any]:
+        path = self._path(f"{stage}.json")
+        if not os.path.exists(path):
+            return {"batches": []}
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_state(self, stage: str, state: dict[str, Any]) -> None:
+        # Written atomically: an interrupted run must not lose batch ids.
+        path = self._path(f"{stage}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+
+def _merge(results: dict[str, BatchResult], finished: list[BatchResult]) -> None:
+    """Adds results; a failed line never replaces a successful one."""
+    for result in finished:
+        previous = results.get(result.custom_id)
+        if previous is None or not previous.ok:
+            results[result.custom_id] = result
+
+
+def _parse_lines(text: str) -> list[dict[str, Any]]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _write_lines(path: str, lines: list[dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        for line in lines:
+            file.write(json.dumps(line) + "\n")
@@ -0,0 +1,429 @@
+"""
+The agentic workflow executed stage by stage through batch requests.
+
+The live workflow plans, routes, answers and evaluates one step at a time.
+In batch mode every stage is collected across all workflows first and sent
+as one batch (see batch.py):
+
+1. ``plan``: the planning request of every workflow;
+2. ``embed``: the step texts and agent descriptions not yet in the embedding
+   cache; routing then runs locally on the cached vectors;
+3. ``respond-N``: the worker requests of every step still open in round N,
+   with each evaluator's ``candidates`` draws from round 2 on;
+4. ``judge-N``: the judge requests of the responses the local validators
+   could not decide, and ``rejudge-N``: the plain judge requests for
+   structured replies that could not be parsed;
+5. ``instructions-N``: the request the live loop sends after the judge
+   rejects a response. Rejected responses get a refinement prompt and go
+   back to step 3 for the next round, up to each evaluator's
+   ``max_interactions`` (or ``max_rounds``).
+
+Every request is built by the agents themselves, so each step sends the
+requests of the live support function and evaluation loop. The one
+difference is best-of-N: the live loop keeps the first accepted candidate
+and cancels the others, while a batch pays for every candidate and keeps
+the accepted one with the lowest index.
+"""
+
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from .base_agents import ActionPlanningAgent, EvaluationAgent, RoutingAgent, WorkerAgent
+from .batch import CHAT_URL, EMBEDDINGS_URL, BatchRequest, BatchResult, BatchRunner
+from .embedding_cache import EmbeddingCache, default_embedding_cache
+from .embeddings import embedding_model, pack_batches
+from .judging import Judgement
+from .usage import agent_label, record_usage
+
+
+@dataclass
+class WorkflowJob:
+    """
+    One workflow to run in batch mode.
+
+    Parameters:
+    name (str): Identifies the workflow in the results.
+    prompt (str): The workflow prompt given to the planner.
+    planner (ActionPlanningAgent): Splits the prompt into steps.
+    router (RoutingAgent): Picks the agent for each step.
+    evaluators (list[EvaluationAgent]): Each one checks the answers of its
+        ``worker_agent``, which should be one of the router's agents.
+    """
+
+    name: str
+    prompt: str
+    planner: ActionPlanningAgent
+    router: RoutingAgent
+    evaluators: list[EvaluationAgent] = field(default_factory=list)
+
+    def evaluator_for(self, agent: WorkerAgent) -> EvaluationAgent | None:
+        for evaluator in self.evaluators:
+            if evaluator.worker_agent is agent:
+                return evaluator
+        return None
+
+
+@dataclass
+class _Candidate:
+    """One worker response of a round and its judgement."""
+
+    step: "_Step"
+    index: int
+    response: str | None = None
+    judgement: Judgement | None = None
+    error: str | None = None
+
+
+@dataclass
+class _Step:
+    job: WorkflowJob
+    number: int
+    description: str
+    agent: Any = None
+    evaluator: EvaluationAgent | None = None
+    prompt: str = ""
+    response: str | None = None
+    evaluation: str = "No evaluation performed"
+    iterations: int = 0
+    success: bool = False
+    error: str | None = None
+    done: bool = False
+    candidates: list[_Candidate] = field(default_factory=list)
+
+    def fail(self, error: str) -> None:
+        self.error = error
+        self.done = True
+
+    def result(self) -> dict[str, Any]:
+        return {
+            "step_number": self.number,
+            "step_description": self.description,
+            "result": self.response or "",
+            "agent": agent_label(self.agent) if self.agent is not None else None,
+            "evaluation": self.evaluation,
+            "iterations": self.iterations,
+            "success": self.success,
+            "error": self.error,
+        }
+
+
+@dataclass
+class BatchPipeline:
+    """
+    Runs many workflows through a ``BatchRunner``.
+
+    Parameters:
+    runner (BatchRunner): Submits the stages and keeps their results.
+    max_rounds (int | None): Caps the respond/judge rounds of every step;
+        by default each evaluator's ``max_interactions`` applies.
+    embedding_cache (EmbeddingCache | None): Holds the batched embeddings
+        routing reads; an in-memory cache is used when None. Every router
+        is pointed at it.
+    """
+
+    runner: BatchRunner
+    max_rounds: int | None = None
+    embedding_cache: EmbeddingCache | None = field(
+        default_factory=default_embedding_cache, repr=False
+    )
+
+    def __post_init__(self):
+        self._recorded: set[str] = set()
+
+    def run(self, jobs: Sequence[WorkflowJob]) -> dict[str, list[dict[str, Any]]]:
+        """
+        Returns the completed steps of every workflow by name, in plan order,
+        shaped like the live workflow's StepResult plus the agent, final
+        evaluation, rounds and any error.
+        """
+        steps = self._plan(jobs)
+        self._route(jobs, steps)
+        round_number = 1
+        while pending := [step for step in steps if not step.done]:
+            print(f"[Batch] round {round_number}: {len(pending)} steps open")
+            self._respond(pending, round_number)
+            self._judge([step for step in pending if not step.done], round_number)
+            round_number += 1
+        return {
+            job.name: [step.result() for step in steps if step.job is job]
+            for job in jobs
+        }
+
+    def _plan(self, jobs: Sequence[WorkflowJob]) -> list[_Step]:
+        requests = [
+            BatchRequest(CHAT_URL, job.planner.request(job.prompt)) for job in jobs
+        ]
+        results = self.runner.run("plan", requests)
+        steps: list[_Step] = []
+        for job, request, result in zip(jobs, requests, results, strict=True):
+            self._record(result, request, job.planner, step=0)
+            content = result.content()
+            if content is None:
+                print(f"[Batch] {job.name}: planning failed: {result.error}")
+                continue
+            for number, description in enumerate(job.planner.parse_steps(content), 1):
+                steps.append(_Step(job, number, description, prompt=description))
+        return steps
+
+    def _route(self, jobs: Sequence[WorkflowJob], steps: list[_Step]) -> None:
+        """Embeds what routing needs in one stage, then routes every step locally."""
+        cache = self.embedding_cache
+        if cache is None:
+            cache = EmbeddingCache(":memory:")
+        texts = list(
+            dict.fromkeys(
+                [step.description for step in steps]
+                + [agent.description for job in jobs for agent in job.router.agents]
+            )
+        )
+        cached = cache.get_many(embedding_model, texts)
+        missing = [
+            text for text, vector in zip(texts, cached, strict=True) if vector is None
+        ]
+        batches = [[missing[i] for i in batch] for batch in pack_batches(missing)]
+        requests = [
+            BatchRequest(
+                EMBEDDINGS_URL,
+                {"model": embedding_model, "input": batch, "encoding_format": "float"},
+            )
+            for batch in batches
+        ]
+        results = self.runner.run("embed", requests)
+        for batch, request, result in zip(batches, requests, results, strict=True):
+            response = result.embeddings()
+            if response is None:
+                continue
+            self._record(result, request, None, step=0)
+            ordered = sorted(response.data, key=lambda item: item.index)
+            cache.put_many(
+                embedding_model,
+                [
+                    (text, item.embedding)
+                    for text, item in zip(batch, ordered, strict=True)
+                ],
+            )
+
+        for job in jobs:
+            job.router.embedding_cache = cache
+        for step in steps:
+            agents = step.job.router.agents
+            needed = [step.description, *(agent.description for agent in agents)]
+            if None in cache.get_many(embedding_model, needed):
+                step.fail("The step could not be embedded for routing.")
+                continue
+            step.agent = step.job.router.select_agent(step.description)
+            if step.agent is None:
+                step.fail("No suitable agent could be selected.")
+            elif not callable(getattr(step.agent, "request", None)):
+                step.fail(f"{agent_label(step.agent)} cannot build batch requests.")
+            else:
+                step.evaluator = step.job.evaluator_for(step.agent)
+
+    def _respond(self, steps: list[_Step], round_number: int) -> None:
+        candidates: list[_Candidate] = []
+        requests: list[BatchRequest] = []
+        for step in steps:
+            step.candidates = [
+                _Candidate(step, index)
+                for index in range(self._draws(step, round_number))
+            ]
+            candidates.extend(step.candidates)
+            requests.extend(self._worker_request(c) for c in step.candidates)
+        results = self.runner.run(f"respond-{round_number}", requests)
+        for candidate, request, result in zip(
+            candidates, requests, results, strict=True
+        ):
+            step = candidate.step
+            # A result shared with an earlier request was paid for there.
+            shared = result.custom_id in self._recorded
+            self._record(result, request, step.agent, step.number, round_number)
+            prompt_cache = getattr(step.agent, "prompt_cache", None)
+            if prompt_cache is not None and result.ok and not shared:
+                prompt_cache.record(result.chat())
+            candidate.response = result.content()
+            candidate.error = result.error
+        for step in steps:
+            answered = [c for c in step.candidates if c.response is not None]
+            if not answered:
+                step.fail(f"The worker request failed: {step.candidates[0].error}")
+                continue
+            step.candidates = answered
+            step.response = step.candidates[0].response
+            step.iterations = round_number
+            if step.evaluator is None:
+                step.evaluation = "Not evaluated"
+                step.success = True
+                step.done = True
+
+    def _draws(self, step: _Step, round_number: int) -> int:
+        """
+        Worker requests for a step: the live support function answers once,
+        and the evaluation loop draws its candidates from the second round on.
+        """
+        if step.evaluator is None or round_number == 1:
+            return 1
+        return max(1, step.evaluator.candidates)
+
+    def _worker_request(self, candidate: _Candidate) -> BatchRequest:
+        step = candidate.step
+        if not candidate.index:
+            return BatchRequest(CHAT_URL, step.agent.request(step.prompt))
+        temperature = step.evaluator.candidate_temperature
+        return BatchRequest(
+            CHAT_URL,
+            step.agent.request(step.prompt, temperature=temperature),
+            sample=candidate.index,
+        )
+
+    def _judge(self, steps: list[_Step], round_number: int) -> None:
+        undecided: list[_Candidate] = []
+        for step in steps:
+            for candidate in step.candidates:
+                candidate.judgement = step.evaluator.local_judgement(candidate.response)
+                if candidate.judgement is None:
+                    undecided.append(candidate)
+        self._ask_judge(undecided, f"judge-{round_number}", round_number)
+        # Like the live loop, a structured reply that cannot be parsed is
+        # judged again with the plain Yes/No request.
+        self._ask_judge(
+            [
+                candidate
+                for candidate in undecided
+                if candidate.judgement is None
+                and candidate.step.evaluator.structured_judge
+            ],
+            f"rejudge-{round_number}",
+            round_number,
+            structured=False,
+        )
+
+        chosen: list[_Candidate] = []
+        for step in steps:
+            candidate = self._choose(step)
+            if candidate is None:
+                step.fail(f"The judge request failed: {step.candidates[0].error}")
+            else:
+                step.evaluation = candidate.judgement.evaluation
+                chosen.append(candidate)
+        self._instruct(
+            [
+                candidate
+                for candidate in chosen
+                if not candidate.judgement.accepted
+                and candidate.judgement.source == "judge"
+            ],
+            round_number,
+        )
+        for candidate in chosen:
+            if not candidate.step.done:
+                self._apply(candidate, round_number)
+
+    def _ask_judge(
+        self,
+        candidates: list[_Candidate],
+        stage: str,
+        round_number: int,
+        structured: bool | None = None,
+    ) -> None:
+        requests = [
+            BatchRequest(
+                CHAT_URL,
+                candidate.step.evaluator.judge_request(candidate.response, structured),
+            )
+            for candidate in candidates
+        ]
+        results = self.runner.run(stage, requests)
+        for candidate, request, result in zip(
+            candidates, requests, results, strict=True
+        ):
+            evaluator = candidate.step.evaluator
+            self._record(
+                result, request, evaluator, candidate.step.number, round_number
+            )
+            candidate.judgement = evaluator.parse_reply(result.content(), structured)
+            candidate.error = result.error
+
+    def _choose(self, step: _Step) -> _Candidate | None:
+        """
+        The accepted candidate with the lowest index, otherwise the one the
+        evaluator's fallback_candidate refines; None if none was judged.
+        """
+        for candidate in step.candidates:
+            if candidate.judgement is not None and candidate.judgement.accepted:
+                return candidate
+        if all(candidate.judgement is None for candidate in step.candidates):
+            return None
+        by_index = {candidate.index: candidate for candidate in step.candidates}
+        index = step.evaluator.fallback_candidate(
+            {i: candidate.judgement for i, candidate in by_index.items()}
+        )
+        return by_index[index]
+
+    def _instruct(self, candidates: list[_Candidate], round_number: int) -> None:
+        """Sends the live loop's request after a judge rejection."""
+        requests = [
+            BatchRequest(
+                CHAT_URL,
+                candidate.step.evaluator.instructions_request(candidate.response),
+            )
+            for candidate in candidates
+        ]
+        results = self.runner.run(f"instructions-{round_number}", requests)
+        for candidate, request, result in zip(
+            candidates, requests, results, strict=True
+        ):
+            step = candidate.step
+            self._record(result, request, step.evaluator, step.number, round_number)
+            content = result.content()
+            if content is None:
+                step.fail(f"The instructions request failed: {result.error}")
+            else:
+                step.evaluation = content.strip()
+
+    def _apply(self, candidate: _Candidate, round_number: int) -> None:
+        step, judgement = candidate.step, candidate.judgement
+        step.response = candidate.response
+        step.success = judgement.accepted
+        rounds = self.max_rounds or step.evaluator.max_interactions
+        if judgement.accepted or round_number >= rounds:
+            step.done = True
+            return
+        step.prompt = step.evaluator.refinement_prompt(
+            step.description, candidate.response, judgement
+        )
+
+    def _record(
+        self,
+        result: BatchResult,
+        request: BatchRequest,
+        agent: Any,
+        step: int,
+        iteration: int | None = None,
+    ) -> None:
+        """
+        Adds a batch result to the usage ledger under the agent that sent it.
+        A request shared by several steps is paid for once; the other steps
+        are recorded as cache hits.
+        """
+        kind = "chat" if request.url == CHAT_URL else "embedding"
+        response = result.chat() if kind == "chat" else result.embeddings()
+        if response is None:
+            return
+        shared = result.custom_id in self._recorded
+        self._recorded.add(result.custom_id)
+        labels = {
+            "agent": agent_label(agent) if agent is not None else None,
+            "step": step,
+            "iteration": iteration,
+        }
+        # Batch results carry no per-request latency; only tokens are recorded.
+        record_usage(
+            kind,
+            request.body["model"],
+            response,
+            time.perf_counter(),
+            cache_hit=shared,
+            labels=labels,
+        )
@@ -0,0 +1,224 @@
+"""
+Streaming text chunker for RAG ingestion.
+
+``iter_chunks`` produces exactly the chunks ``RAGKnowledgePromptAgent.chunk_text``
+always has (whitespace collapsed, fixed-size windows with overlap, the tail
+merged once it is shorter than half a chunk) but reads its source
+incrementally and yields chunks lazily. Only about one chunk of text is held
+in memory at a time, whatever the size of the corpus.
+"""
+
+import codecs
+import io
+import mmap
+import os
+import re
+from collections.abc import Iterator
+from typing import IO, Any
+
+Chunk = dict[str, Any]
+Source = str | os.PathLike[str] | IO[str] | IO[bytes]
+
+_whitespace = re.compile(r"\s+")
+
+
+def _read_pieces(source: Source, read_size: int) -> Iterator[str]:
+    """Yields decoded text from a path (memory-mapped) or a file-like object."""
+    if hasattr(source, "read"):
+        stream: Any = source
+        decoder = None
+        while True:
+            piece = stream.read(read_size)
+            if not piece:
+                break
+            if isinstance(piece, bytes):
+                decoder = decoder or codecs.getincrementaldecoder("utf-8")()
+                piece = decoder.decode(piece)
+            yield piece
+        if decoder is not None:
+            yield decoder.decode(b"", final=True)
+        return
+
+    with open(source, "rb") as file:
+        if not os.fstat(file.fileno()).st_size:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            for offset in range(0, len(mapped), read_size):
+                yield decoder.decode(mapped[offset : offset + read_size])
+            yield decoder.decode(b"", final=True)
+
+
+def iter_normalized(source: Source, read_size: int = 1 << 16) -> Iterator[str]:
+    """
+    Streams ``re.sub(r"\\s+", " ", text).strip()`` of the source's text.
+    Whitespace runs that straddle read boundaries collapse to one space, and
+    trailing whitespace is held back so the end of the stream is stripped.
+    """
+    started = False
+    pending_space = False
+    for piece in _read_pieces(source, read_size):
+        normalized = _whitespace.sub(" ", piece)
+        if not normalized:
+            continue
+        if normalized.startswith(" "):
+            pending_space = started
+            normalized = normalized[1:]
+        if not normalized:
+            continue
+        ends_with_space = normalized.endswith(" ")
+        if ends_with_space:
+            normalized = normalized[:-1]
+        yield (" " if pending_space else "") + normalized
+        started = True
+        pending_space = ends_with_space
+
+
+def iter_chunks(
+    source: Source,
+    chunk_size: int = 2000,
+    chunk_overlap: int = 100,
+    separator: str = "\n",
+    read_size: int = 1 << 16,
+) -> Iterator[Chunk]:
+    """
+    Lazily splits a document into overlapping chunks.
+
+    Parameters:
+    source (str | PathLike | file-like): Path to a UTF-8 file, or an open
+        text or binary file object. Use ``io.StringIO`` for in-memory text.
+    chunk_size (int): Maximum characters per chunk.
+    chunk_overlap (int): Characters shared by consecutive chunks.
+    separator (str): Preferred break point inside a chunk window.
+    read_size (int): Characters (or bytes) read from the source at a time.
+
+    Yields:
+    dict: ``chunk_id``, ``text``, ``chunk_size``, ``start_char`` and
+    ``end_char``; offsets refer to the whitespace-normalized text.
+    """
+    pieces = iter_normalized(source, read_size)
+    buffer = ""  # normalized text from absolute offset `base` onwards
+    base = 0
+    eof = False
+
+    def fill(until: int) -> None:
+        nonlocal buffer, eof
+        parts = [buffer]
+        buffered = base + len(buffer)
+        while not eof and buffered < until:
+            piece = next(pieces, None)
+            if piece is None:
+                eof = True
+                break
+            parts.append(piece)
+            buffered += len(piece)
+        buffer = "".join(parts)
+
+    # One character beyond the window tells whether the window ends the text.
+    fill(chunk_size + 1)
+    if eof:
+        if buffer:
+            yield {
+                "chunk_id": 0,
+                "text": buffer,
+                "chunk_size": len(buffer),
+                "start_char": 0,
+                "end_char": len(buffer),
+            }
+        return
+
+    start, chunk_id = 0, 0
+    while True:
+        fill(start + chunk_size + 1)
+        length = base + len(buffer) if eof else None
+        if length is not None and start >= length:
+            return
+
+        window_end = start + chunk_size
+        end = min(window_end, length) if length is not None else window_end
+        remaining = length - start if length is not None else None
+
+        # Check if remaining text is too small to be meaningful
+        if remaining is not None and remaining < chunk_size // 2:
+            yield {
+                "chunk_id": chunk_id,
+                "text": buffer[start - base :],
+                "chunk_size": remaining,
+                "start_char": start,
+                "end_char": length,
+            }
+            return
+
+        window = buffer[start - base : end - base]
+        if separator in window and (length is None or end < length):
+            end = start + window.rindex(separator) + len(separator)
+            window = window[: end - start]
+
+        yield {
+            "chunk_id": chunk_id,
+            "text": window,
+            "chunk_size": end - start,
+            "start_char": start,
+            "end_char": end,
+        }
+
+        # Ensure we always move forward
+        next_start = end - chunk_overlap
+        if next_start <= start:
+            next_start = start + 1
+        start = next_start
+        chunk_id += 1
+
+        # Drop text every later chunk has moved past.
+        if start - base > len(buffer) // 2:
+            buffer = buffer[start - base :]
+            base = start
+
+
+def iter_paragraph_chunks(
+    source: Source,
+    chunk_size: int = 2000,
+    chunk_overlap: int = 100,
+    separator: str = "\n",
+) -> Iterator[Chunk]:
+    """
+    Chunks each blank-line separated paragraph on its own.
+
+    Window boundaries of ``iter_chunks`` shift for the rest of the document
+    after any edit. Anchoring windows to paragraphs keeps an edit's effect
+    local to the paragraphs it touches, which is what incremental
+    re-indexing relies on. ``start_char``/``end_char`` are relative to the
+    paragraph; ``paragraph`` gives its position in the document.
+    """
+    chunk_id = 0
+    for paragraph_id, paragraph in enumerate(_iter_paragraphs(source)):
+        for chunk in iter_chunks(
+            io.StringIO(paragraph), chunk_size, chunk_overlap, separator
+        ):
+            chunk["chunk_id"] = chunk_id
+            chunk["paragraph"] = paragraph_id
+            chunk_id += 1
+            yield chunk
+
+
+def _iter_paragraphs(source: Source) -> Iterator[str]:
+    lines: list[str] = []
+    pending = ""
+    for piece in _read_pieces(source, 1 << 16):
+        pending += piece
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            if line.strip():
+                lines.append(line)
+            elif lines:
+                yield "\n".join(lines)
+                lines = []
+    if pending.strip():
+        lines.append(pending)
+    if lines:
+        yield "\n".join(lines)
+
+
+def iter_text_chunks(text: str, **kwargs: Any) -> Iterator[Chunk]:
+    """Convenience wrapper chunking an in-memory string."""
+    return iter_chunks(io.StringIO(text), **kwargs)
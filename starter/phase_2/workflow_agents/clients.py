@@ -0,0 +1,219 @@
+"""
+Process-wide OpenAI client registry shared by every agent in base_agents.
+
+Building an ``OpenAI`` client per call throws away its HTTP connection pool, so
+every request pays for a new TCP/TLS handshake. The registry keeps one pooled
+client per API key and hands the same instance to every agent.
+"""
+
+import asyncio
+import threading
+import weakref
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+base_url = "https://openai.vocareum.com/v1"
+
+
+@dataclass
+class ClientConfig:
+    """
+    Connection pool and timeout settings used when the registry builds a client.
+
+    Parameters:
+    base_url (str): API endpoint every agent talks to.
+    max_connections (int): Upper bound on open connections per client.
+    max_keepalive_connections (int): Idle connections kept warm in the pool.
+    keepalive_expiry (float): Seconds an idle connection is kept alive.
+    timeout (float): Default per-request timeout in seconds.
+    connect_timeout (float): Timeout for establishing a new connection.
+    max_retries (int): Retries performed by the OpenAI client itself.
+    """
+
+    base_url: str = base_url
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    connect_timeout: float = 5.0
+    max_retries: int = 2
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def http_timeout(self, timeout: float | None = None) -> httpx.Timeout:
+        return httpx.Timeout(
+            timeout if timeout is not None else self.timeout,
+            connect=self.connect_timeout,
+        )
+
+
+_lock = threading.Lock()
+_config = ClientConfig()
+_clients: dict[str, OpenAI] = {}
+_override: Any = None
+# httpx async pools are bound to the loop that opened them, so async clients
+# are kept per running event loop and dropped together with it.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+_async_override: Any = None
+_env_backend_checked = False
+
+
+def configure_clients(config: ClientConfig) -> None:
+    """Replace the registry configuration and drop clients built with the old one."""
+    global _config
+    with _lock:
+        _config = config
+        _close_all()
+
+
+def get_config() -> ClientConfig:
+    return _config
+
+
+def get_client(api_key: str, timeout: float | None = None) -> OpenAI:
+    """
+    Returns the shared client for ``api_key``, creating it on first use.
+
+    Parameters:
+    api_key (str): OpenAI API key the client authenticates with.
+    timeout (float | None): Per-call timeout overriding the registry default.
+
+    Returns:
+    OpenAI: A client whose connection pool is shared with every other caller.
+    """
+    _check_env_backend()
+    client = _override
+    if client is None:
+        client = _clients.get(api_key)
+        if client is None:
+            with _lock:
+                client = _clients.get(api_key)
+                if client is None:
+                    client = _build_client(api_key)
+                    _clients[api_key] = client
+    if timeout is not None:
+        # with_options copies the client but keeps the same pooled http client
+        return client.with_options(timeout=_config.http_timeout(timeout))
+    return client
+
+
+def get_async_client(api_key: str, timeout: float | None = None) -> AsyncOpenAI:
+    """
+    Async counterpart of ``get_client``; must be called from a running event loop.
+
+    Parameters:
+    api_key (str): OpenAI API key the client authenticates with.
+    timeout (float | None): Per-call timeout overriding the registry default.
+
+    Returns:
+    AsyncOpenAI: A client shared by every coroutine running on the current loop.
+    """
+    _check_env_backend()
+    client = _async_override
+    if client is None:
+        loop = asyncio.get_running_loop()
+        with _lock:
+            per_loop = _async_clients.setdefault(loop, {})
+            client = per_loop.get(api_key)
+            if client is None:
+                client = _build_async_client(api_key)
+                per_loop[api_key] = client
+    if timeout is not None:
+        return client.with_options(timeout=_config.http_timeout(timeout))
+    return client
+
+
+def set_client(client: Any, async_client: Any = None) -> None:
+    """
+    Injects clients returned for every API key, e.g. fakes in tests.
+    Passing None restores the pooled clients.
+    """
+    global _override, _async_override
+    _override = client
+    _async_override = async_client
+
+
+@contextmanager
+def override_client(client: Any, async_client: Any = None) -> Iterator[Any]:
+    """Temporarily injects clients for the duration of a ``with`` block."""
+    previous = (_override, _async_override)
+    set_client(client, async_client)
+    try:
+        yield client
+    finally:
+        set_client(*previous)
+
+
+def reset_clients() -> None:
+    """Closes every pooled client; the next call builds fresh ones."""
+    with _lock:
+        _close_all()
+
+
+async def aclose_clients() -> None:
+    """Closes the async clients opened on the current event loop."""
+    with _lock:
+        per_loop = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in per_loop.values():
+        await client.close()
+
+
+def _check_env_backend() -> None:
+    """Installs the backend named by WORKFLOW_BACKEND (see backends.py) once."""
+    global _env_backend_checked
+    if _env_backend_checked:
+        return
+    with _lock:
+        if _env_backend_checked:
+            return
+        _env_backend_checked = True
+    from .backends import backend_from_env, use_backend
+
+    backend = backend_from_env()
+    if backend is not None and _override is None and _async_override is None:
+        use_backend(backend)
+
+
+def _build_client(api_key: str) -> OpenAI:
+    http_client = httpx.Client(
+        limits=_config.limits(), timeout=_config.http_timeout()
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=_config.base_url,
+        timeout=_config.http_timeout(),
+        max_retries=_config.max_retries,
+        http_client=http_client,
+    )
+
+
+def _build_async_client(api_key: str) -> AsyncOpenAI:
+    http_client = httpx.AsyncClient(
+        limits=_config.limits(), timeout=_config.http_timeout()
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=_config.base_url,
+        timeout=_config.http_timeout(),
+        max_retries=_config.max_retries,
+        http_client=http_client,
+    )
+
+
+def _close_all() -> None:
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+    # Async pools can only be closed from their own loop; drop them here and
+    # let aclose_clients() handle orderly shutdown when a loop is available.
+    _async_clients.clear()
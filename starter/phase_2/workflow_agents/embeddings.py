@@ -0,0 +1,211 @@
+"""
+Embedding requests shared by the RAG and routing agents.
+
+Single texts go through ``embed_text``/``aembed_text``. Bulk ingestion goes
+through ``embed_texts``, which packs inputs into as few requests as the
+endpoint's per-request item and token limits allow and keeps several
+requests in flight at once. Every path consults the persistent embedding
+cache first and fills it afterwards; identical single-text requests that
+are in flight at the same time are sent once (see singleflight.py).
+"""
+
+import contextvars
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from .clients import get_async_client, get_client
+from .embedding_cache import EmbeddingCache
+from .singleflight import get_single_flight
+from .tracing import span
+from .usage import acreate, create, current_labels, record_usage
+
+embedding_model = "text-embedding-3-large"
+
+# Provider limits are 2048 inputs and 300k tokens per embeddings request;
+# the defaults stay comfortably below both.
+default_batch_items = 256
+default_batch_tokens = 100_000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for request packing."""
+    return len(text) // 4 + 1
+
+
+def pack_batches(
+    texts: Sequence[str],
+    max_batch_items: int = default_batch_items,
+    max_batch_tokens: int = default_batch_tokens,
+) -> list[list[int]]:
+    """
+    Groups text indices into consecutive batches that respect both limits.
+    A single text larger than ``max_batch_tokens`` still gets its own batch.
+
+    Returns:
+    list: Batches of indices into ``texts``, in input order.
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (
+            len(current) >= max_batch_items
+            or current_tokens + tokens > max_batch_tokens
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_text(api_key: str, text: str, cache: EmbeddingCache | None) -> list[float]:
+    """Embeds ``text``, reusing and filling the persistent cache when given."""
+    if cache is not None:
+        cached = cache.get(embedding_model, text)
+        if cached is not None:
+            return cached
+    with span("embedding", model=embedding_model, inputs=1, **current_labels()):
+        started = time.perf_counter()
+
+        def send() -> tuple[Any, int]:
+            return create(
+                get_client(api_key).embeddings,
+                model=embedding_model,
+                input=text,
+                encoding_format="float",
+            )
+
+        (response, retries), shared = _coalesce(api_key, text, send)
+        record_usage(
+            "embedding", embedding_model, response, started, retries, cache_hit=shared
+        )
+    embedding = response.data[0].embedding
+    if cache is not None:
+        cache.put(embedding_model, text, embedding)
+    return embedding
+
+
+async def aembed_text(
+    api_key: str, text: str, cache: EmbeddingCache | None
+) -> list[float]:
+    """Async counterpart of embed_text."""
+    if cache is not None:
+        cached = cache.get(embedding_model, text)
+        if cached is not None:
+            return cached
+    with span("embedding", model=embedding_model, inputs=1, **current_labels()):
+        started = time.perf_counter()
+
+        async def send() -> tuple[Any, int]:
+            return await acreate(
+                get_async_client(api_key).embeddings,
+                model=embedding_model,
+                input=text,
+                encoding_format="float",
+            )
+
+        (response, retries), shared = await _acoalesce(api_key, text, send)
+        record_usage(
+            "embedding", embedding_model, response, started, retries, cache_hit=shared
+        )
+    embedding = response.data[0].embedding
+    if cache is not None:
+        cache.put(embedding_model, text, embedding)
+    return embedding
+
+
+def embed_texts(
+    api_key: str,
+    texts: Sequence[str],
+    cache: EmbeddingCache | None,
+    max_batch_items: int = default_batch_items,
+    max_batch_tokens: int = default_batch_tokens,
+    concurrency: int = 4,
+) -> list[list[float]]:
+    """
+    Embeds many texts with as few requests as possible.
+
+    Parameters:
+    api_key (str): OpenAI API key.
+    texts (Sequence[str]): Texts to embed; duplicates are embedded once.
+    cache (EmbeddingCache | None): Cache consulted before any request.
+    max_batch_items (int): Maximum inputs per request.
+    max_batch_tokens (int): Maximum estimated tokens per request.
+    concurrency (int): Requests kept in flight at the same time.
+
+    Returns:
+    list: One embedding per input text, in input order.
+    """
+    unique = list(dict.fromkeys(texts))
+    cached = (
+        cache.get_many(embedding_model, unique)
+        if cache is not None
+        else [None] * len(unique)
+    )
+    found = {
+        text: embedding
+        for text, embedding in zip(unique, cached, strict=True)
+        if embedding is not None
+    }
+    missing = [text for text in unique if text not in found]
+
+    def request(batch: list[str]) -> list[list[float]]:
+        with span(
+            "embedding", model=embedding_model, inputs=len(batch), **current_labels()
+        ):
+            started = time.perf_counter()
+            response, retries = create(
+                get_client(api_key).embeddings,
+                model=embedding_model,
+                input=batch,
+                encoding_format="float",
+            )
+            record_usage("embedding", embedding_model, response, started, retries)
+        # The endpoint reports each vector's input position explicitly.
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in ordered]
+
+    batches = [
+        [missing[i] for i in batch]
+        for batch in pack_batches(missing, max_batch_items, max_batch_tokens)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # Each request runs in a copy of this context to keep its usage
+        # labels and tracing parent.
+        contexts = [contextvars.copy_context() for _ in batches]
+        results = pool.map(
+            lambda context, batch: context.run(request, batch), contexts, batches
+        )
+        for batch, embeddings in zip(batches, results, strict=True):
+            found.update(zip(batch, embeddings, strict=True))
+            if cache is not None:
+                cache.put_many(
+                    embedding_model, list(zip(batch, embeddings, strict=True))
+                )
+
+    return [found[text] for text in texts]
+
+
+def _coalesce(
+    api_key: str, text: str, send: Callable[[], tuple[Any, int]]
+) -> tuple[tuple[Any, int], bool]:
+    """Shares the response of an identical embedding request already in flight."""
+    flights = get_single_flight()
+    if flights is None:
+        return send(), False
+    return flights.do(("embedding", api_key, embedding_model, text), send)
+
+
+async def _acoalesce(
+    api_key: str, text: str, send: Callable[[], Awaitable[tuple[Any, int]]]
+) -> tuple[tuple[Any, int], bool]:
+    flights = get_single_flight()
+    if flights is None:
+        return await send(), False
+    return await flights.ado(("embedding", api_key, embedding_model, text), send)
@@ -0,0 +1,110 @@
+"""
+Structured verdicts for EvaluationAgent.
+
+With ``structured_judge`` enabled the evaluator asks for a single JSON reply
+holding the verdict, the reasons and the fix instructions, instead of one
+judge call followed by a second call for the instructions. Replies are
+parsed leniently (code fences, surrounding prose, boolean or yes/no
+verdicts, lists instead of strings); a reply that still cannot be parsed
+makes the evaluator fall back to the two-call path for that round.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any
+
+from .validators import strip_code_fence
+
+JSON_INSTRUCTIONS = (
+    "Reply only with a JSON object with these keys:\n"
+    '"verdict": "yes" if the answer meets the criteria, otherwise "no",\n'
+    '"reasons": why the answer does or doesn\'t meet the criteria,\n'
+    '"fix_instructions": instructions to fix the answer if it doesn\'t meet '
+    'the criteria, otherwise "".'
+)
+
+_ACCEPT = {"yes", "y", "true", "pass", "passed", "accept", "accepted", "meets"}
+_REJECT = {"no", "n", "false", "fail", "failed", "reject", "rejected"}
+
+
+@dataclass
+class Judgement:
+    """
+    Parameters:
+    accepted (bool): The response meets the criteria.
+    evaluation (str): "Yes, ..." or "No, ..." followed by the reasons.
+    instructions (str | None): How to fix a rejected response, when known
+        without a further call.
+    source (str): ``"local"``, ``"structured"`` or ``"judge"``.
+    """
+
+    accepted: bool
+    evaluation: str
+    instructions: str | None = None
+    source: str = "judge"
+
+
+def parse_judgement(content: str | None) -> Judgement | None:
+    """
+    Parses a structured judge reply.
+
+    Returns:
+    Judgement | None: None when the reply holds no usable verdict.
+    """
+    if not content:
+        return None
+    document = _json_object(content)
+    if document is None:
+        return None
+    accepted = _verdict(document.get("verdict"))
+    if accepted is None:
+        return None
+    reasons = _text(document.get("reasons"))
+    instructions = _text(document.get("fix_instructions"))
+    evaluation = "Yes" if accepted else "No"
+    if reasons:
+        evaluation = f"{evaluation}, {reasons}"
+    return Judgement(
+        accepted=accepted,
+        evaluation=evaluation,
+        instructions=None if accepted or not instructions else instructions,
+        source="structured",
+    )
+
+
+def _json_object(content: str) -> dict[str, Any] | None:
+    text = strip_code_fence(content).strip()
+    candidates = [text]
+    # Models sometimes wrap the object in prose; try the outermost braces.
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match and match.group(0) != text:
+        candidates.append(match.group(0))
+    for candidate in candidates:
+        try:
+            document = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(document, dict):
+            return {str(key).lower(): value for key, value in document.items()}
+    return None
+
+
+def _verdict(value: Any) -> bool | None:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        word = value.strip().lower().rstrip(".!")
+        if word in _ACCEPT:
+            return True
+        if word in _REJECT:
+            return False
+    return None
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(_text(item) for item in value).strip()
+    return str(value).strip()
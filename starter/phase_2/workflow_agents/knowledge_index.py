@@ -0,0 +1,249 @@
+"""
+Persistent, named knowledge index with incremental updates.
+
+A knowledge index lives in its own directory and keeps a SHA-256 of every
+chunk next to the vector store. ``update`` re-chunks the new version of the
+knowledge, embeds only chunks whose hash is not already live, appends them
+to the store and tombstones rows whose chunk disappeared. An update
+therefore costs work in proportion to what changed, not to the corpus.
+Tombstoned rows are skipped by searches and dropped by ``compact``, which
+runs automatically once they make up too much of the store.
+"""
+
+import hashlib
+import json
+import os
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from .chunking import Source, iter_paragraph_chunks
+from .vector_index import (
+    FlatIndex,
+    IVFIndex,
+    SearchResult,
+    VectorIndex,
+    build_index,
+    index_matches,
+    load_index,
+)
+from .vector_store import VectorStore, VectorStoreWriter
+
+Embed = Callable[[list[str]], Sequence[Sequence[float]]]
+
+default_index_dir = "knowledge_index"
+
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+@dataclass
+class UpdateStats:
+    added: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class KnowledgeIndex:
+    """
+    Parameters:
+    name (str): Index name; files live in ``root/name``.
+    root (str): Directory holding all named indexes.
+    model (str): Embedding model recorded in the store.
+    index_type (str): ``"flat"`` or ``"ivf"``, see vector_index.py.
+    index_params (dict): Passed to ``build_index`` for IVF indexes.
+    compact_ratio (float): Fraction of tombstoned rows that triggers compaction.
+    """
+
+    name: str
+    root: str = default_index_dir
+    model: str = ""
+    index_type: str = "flat"
+    index_params: dict[str, Any] = field(default_factory=dict)
+    compact_ratio: float = 0.5
+
+    def __post_init__(self):
+        self.directory = os.path.join(self.root, self.name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.store_path = os.path.join(self.directory, "store")
+        self._store: VectorStore | None = None
+        self._index: VectorIndex | None = None
+        self._hashes: list[bytes] = []
+        self._live = np.zeros(0, dtype=bool)
+        self._load()
+
+    def __len__(self) -> int:
+        """Number of live chunks."""
+        return int(self._live.sum())
+
+    @property
+    def store(self) -> VectorStore:
+        if self._store is None:
+            raise ValueError(f"Knowledge index {self.name!r} is empty")
+        return self._store
+
+    def update(
+        self,
+        source: Source,
+        embed: Embed,
+        chunk_size: int = 2000,
+        chunk_overlap: int = 100,
+        batch_size: int = 1024,
+    ) -> UpdateStats:
+        """
+        Brings the index in line with a new version of the knowledge.
+
+        Parameters:
+        source (str | PathLike | file-like): The complete, current knowledge.
+        embed (Callable): Embeds a list of texts, e.g. RAGKnowledgePromptAgent.get_embeddings.
+        chunk_size (int): Maximum characters per chunk.
+        chunk_overlap (int): Characters shared by consecutive chunks.
+        batch_size (int): New chunks embedded and appended per round.
+
+        Returns:
+        UpdateStats: Counts of added, removed and unchanged chunks.
+        """
+        live_rows = {
+            digest: row
+            for row, digest in enumerate(self._hashes)
+            if self._live[row]
+        }
+        seen: set[bytes] = set()
+        stats = UpdateStats()
+        added_hashes: list[bytes] = []
+
+        mode = "a" if self._store is not None else "w"
+        with VectorStoreWriter(self.store_path, self.model, mode) as writer:
+            pending: list[str] = []
+            pending_hashes: list[bytes] = []
+
+            def flush() -> None:
+                writer.append(pending, embed(pending))
+                added_hashes.extend(pending_hashes)
+                pending.clear()
+                pending_hashes.clear()
+
+            for chunk in iter_paragraph_chunks(source, chunk_size, chunk_overlap):
+                digest = chunk_hash(chunk["text"])
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                if digest in live_rows:
+                    stats.unchanged += 1
+                    continue
+                pending.append(chunk["text"])
+                pending_hashes.append(digest)
+                if len(pending) >= batch_size:
+                    flush()
+            if pending:
+                flush()
+
+            if self._store is not None:
+                self._store.close()
+            self._store = writer.close()
+
+        stats.added = len(added_hashes)
+        removed = [row for digest, row in live_rows.items() if digest not in seen]
+        stats.removed = len(removed)
+
+        self._hashes.extend(added_hashes)
+        self._live = np.concatenate([self._live, np.ones(stats.added, dtype=bool)])
+        self._live[removed] = False
+        self._save_state()
+
+        dead = len(self._live) - len(self)
+        if dead and dead >= self.compact_ratio * len(self._live):
+            self.compact()
+        else:
+            self._refresh_index()
+        print(
+            f"[KnowledgeIndex {self.name}] added={stats.added} "
+            f"removed={stats.removed} unchanged={stats.unchanged}"
+        )
+        return stats
+
+    def search(self, query: npt.ArrayLike, k: int = 1) -> SearchResult:
+        """Top ``k`` live chunks for ``query``."""
+        if self._index is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self._index.search(query, k, live=self._live)
+
+    def compact(self) -> None:
+        """Rewrites the store without tombstoned rows; nothing is re-embedded."""
+        store = self.store
+        keep = np.flatnonzero(self._live)
+        temp_path = f"{self.store_path}.compact"
+        with VectorStoreWriter(temp_path, store.model) as writer:
+            for start in range(0, len(keep), 4096):
+                rows = keep[start : start + 4096]
+                writer.append(
+                    [store.text(int(i)) for i in rows], np.asarray(store.vectors[rows])
+                )
+            writer.close().close()
+        store.close()
+        # The metadata file is moved last; it is what marks a store complete.
+        for suffix in (".f32", ".text", ".offsets", ".json"):
+            os.replace(f"{temp_path}{suffix}", f"{self.store_path}{suffix}")
+
+        self._hashes = [self._hashes[int(i)] for i in keep]
+        self._live = np.ones(len(keep), dtype=bool)
+        self._save_state()
+        self._store = VectorStore.open(self.store_path)
+        self._index = None
+        self._refresh_index()
+
+    def _refresh_index(self) -> None:
+        store = self.store
+        if isinstance(self._index, IVFIndex):
+            # New rows join the existing clusters; compaction retrains.
+            self._index = self._index.extend(store.vectors)
+        elif isinstance(self._index, FlatIndex) or self.index_type == "flat":
+            self._index = FlatIndex(store.vectors)
+        elif len(store):
+            self._index = build_index(
+                store.vectors, self.index_type, **self.index_params
+            )
+        if self._index is not None:
+            self._index.save(self.store_path)
+
+    def _load(self) -> None:
+        state_path = os.path.join(self.directory, "state.json")
+        if not (
+            os.path.exists(state_path) and os.path.exists(f"{self.store_path}.json")
+        ):
+            return
+        store = VectorStore.open(self.store_path)
+        with open(state_path, encoding="utf-8") as state_file:
+            state = json.load(state_file)
+        hashes = [bytes.fromhex(h) for h in state["hashes"]]
+        if len(hashes) != len(store):
+            # Interrupted update: start over (the embedding cache keeps this cheap).
+            store.close()
+            return
+        self._store = store
+        self._hashes = hashes
+        self._live = np.array(state["live"], dtype=bool)
+        if os.path.exists(f"{self.store_path}.index.npz"):
+            index = load_index(self.store_path, store.vectors)
+            # An index saved under another configuration is rebuilt.
+            if index_matches(index, self.index_type, **self.index_params):
+                self._index = index
+        if self._index is None:
+            self._refresh_index()
+
+    def _save_state(self) -> None:
+        state_path = os.path.join(self.directory, "state.json")
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as state_file:
+            json.dump(
+                {
+                    "hashes": [h.hex() for h in self._hashes],
+                    "live": self._live.tolist(),
+                },
+                state_file,
+            )
+        os.replace(f"{state_path}.tmp", state_path)
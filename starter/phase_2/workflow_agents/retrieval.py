@@ -0,0 +1,77 @@
+"""
+Post-processing of nearest-neighbour results for RAGKnowledgePromptAgent.
+
+``mmr_rerank`` re-orders candidates with maximal marginal relevance so near
+duplicate chunks do not crowd out complementary ones, and ``pack_context``
+fills a token budget with the best chunks so a single completion sees all
+the context it needs.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from .embeddings import estimate_tokens
+
+
+def mmr_rerank(
+    query: npt.ArrayLike,
+    candidates: npt.NDArray[np.float32],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> list[int]:
+    """
+    Greedy maximal-marginal-relevance selection.
+
+    Parameters:
+    query (ArrayLike): Query embedding.
+    candidates (np.ndarray): Unit-normalized candidate rows, best first.
+    k (int): Number of rows to select.
+    lambda_mult (float): 1.0 ranks by relevance only, 0.0 by diversity only.
+
+    Returns:
+    list: Positions into ``candidates`` in selection order.
+    """
+    if not candidates.shape[0] or k <= 0:
+        return []
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(q)
+    relevance = candidates @ (q / norm if norm else q)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of each candidate to anything selected so far.
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, candidates.shape[0]):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+def pack_context(
+    chunks: Sequence[str], token_budget: int | None, separator: str = "\n\n"
+) -> str:
+    """
+    Joins chunks, best first, while they fit in ``token_budget`` estimated
+    tokens. The best chunk is always kept, truncated if it alone is too big.
+    """
+    if token_budget is None:
+        return separator.join(chunks)
+
+    packed: list[str] = []
+    used = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk)
+        if not packed and tokens > token_budget:
+            # estimate_tokens counts ~4 characters per token.
+            packed.append(chunk[: token_budget * 4])
+            break
+        if used + tokens > token_budget:
+            continue
+        packed.append(chunk)
+        used += tokens
+    return separator.join(packed)
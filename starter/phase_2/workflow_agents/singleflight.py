@@ -0,0 +1,169 @@
+"""
+Coalescing of identical requests that are in flight at the same time.
+
+Concurrent workflows often send byte-identical requests at the same moment
+(the same planning prompt, the same agent description embeddings). The
+first caller of a key becomes the leader and sends the request; callers
+arriving while it is outstanding attach to it and receive the same result
+(or exception) without a request of their own. Nothing is kept once the
+request finishes, so this is not a cache: sequential callers still send
+their own requests.
+
+Sync and async callers share one table of ``concurrent.futures.Future``
+objects, so a coroutine can wait on a request a thread is sending and vice
+versa. Only deterministic requests should be coalesced: ``chat_completion``
+uses it for the requests the completion cache would accept, embeddings use
+it always.
+"""
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+
+class _LeaderCancelled(Exception):
+    """The leading coroutine was cancelled; waiting callers send their own."""
+
+
+@dataclass
+class SingleFlightStats:
+    leaders: int = 0
+    followers: int = 0
+
+    def __str__(self) -> str:
+        return f"requests={self.leaders} coalesced={self.followers}"
+
+
+@dataclass
+class _Flight:
+    future: Future
+    # An async leader's thread; a sync caller on that thread must not block
+    # on it, or it would block the event loop that has to finish it.
+    loop_thread: int | None = None
+
+
+@dataclass
+class SingleFlight:
+    """In-flight request table shared by threads and event loops."""
+
+    stats: SingleFlightStats = field(default_factory=SingleFlightStats)
+
+    def __post_init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, call: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Runs ``call`` unless an identical request is already in flight.
+
+        Returns:
+        tuple: The result and whether it was shared from another caller.
+        """
+        while True:
+            flight, leader = self._join(key, None)
+            if leader:
+                return self._lead(key, flight, call), False
+            if flight.loop_thread == threading.get_ident():
+                self._count(leaders=1)
+                return call(), False
+            try:
+                result = flight.future.result()
+            except _LeaderCancelled:
+                continue
+            except Exception:
+                self._count(followers=1)
+                raise
+            self._count(followers=1)
+            return result, True
+
+    async def ado(
+        self, key: Hashable, call: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """Async counterpart of do."""
+        while True:
+            flight, leader = self._join(key, threading.get_ident())
+            if leader:
+                return await self._alead(key, flight, call), False
+            try:
+                # shield: a cancelled follower must not cancel the shared future
+                result = await asyncio.shield(asyncio.wrap_future(flight.future))
+            except _LeaderCancelled:
+                continue
+            except Exception:
+                self._count(followers=1)
+                raise
+            self._count(followers=1)
+            return result, True
+
+    def _join(self, key: Hashable, loop_thread: int | None) -> tuple[_Flight, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = _Flight(Future(), loop_thread)
+            # A running future cannot be cancelled by a follower.
+            flight.future.set_running_or_notify_cancel()
+            self._flights[key] = flight
+            self.stats.leaders += 1
+            return flight, True
+
+    def _count(self, leaders: int = 0, followers: int = 0) -> None:
+        # Followers are counted once they hold the shared result; one whose
+        # leader was cancelled retries and may end up sending the request.
+        with self._lock:
+            self.stats.leaders += leaders
+            self.stats.followers += followers
+
+    def _lead(self, key: Hashable, flight: _Flight, call: Callable[[], Any]) -> Any:
+        try:
+            result = call()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    async def _alead(
+        self, key: Hashable, flight: _Flight, call: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self._finish(key, flight, error=_LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, result=result)
+        return result
+
+    def _finish(
+        self,
+        key: Hashable,
+        flight: _Flight,
+        result: Any = None,
+        error: BaseException | None = None,
+    ) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+
+_single_flight: SingleFlight | None = SingleFlight()
+
+
+def set_single_flight(single_flight: SingleFlight | None) -> None:
+    """Replaces the shared table; None turns coalescing off."""
+    global _single_flight
+    _single_flight = single_flight
+
+
+def get_single_flight() -> SingleFlight | None:
+    return _single_flight
@@ -0,0 +1,286 @@
+"""
+Token and latency accounting for every LLM and embedding call.
+
+``chat_completion`` and the embedding helpers append one ``UsageRecord`` per
+request to the active ``UsageLedger``. Records are labelled from a context
+variable holding the calling agent, workflow step and evaluation iteration:
+
+- ``WorkflowEngine`` sets ``step`` around each step it executes,
+- agent methods decorated with ``tracked`` set ``agent``,
+- ``EvaluationAgent`` sets ``iteration`` for each round of its loop.
+
+Labels follow the call into worker threads started with ``asyncio.to_thread``
+or submitted through ``contextvars.copy_context().run``.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from .ratelimit import Sent, get_rate_limiter
+from .tracing import set_attributes, span
+
+_labels: ContextVar[dict[str, Any]] = ContextVar("usage_labels")
+
+
+@dataclass
+class UsageRecord:
+    kind: str  # "chat" or "embedding"
+    model: str
+    agent: str | None = None
+    step: int | None = None
+    iteration: int | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    wall_time: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+
+    def measurements(self) -> dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "retries": self.retries,
+            "cache_hit": self.cache_hit,
+        }
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    wall_time: float = 0.0
+    retries: int = 0
+    cache_hits: int = 0
+
+    def add(self, record: UsageRecord) -> None:
+        self.calls += 1
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cached_tokens += record.cached_tokens
+        self.wall_time += record.wall_time
+        self.retries += record.retries
+        self.cache_hits += record.cache_hit
+
+    def __str__(self) -> str:
+        return (
+            f"calls={self.calls} prompt={self.prompt_tokens} "
+            f"completion={self.completion_tokens} cached={self.cached_tokens} "
+            f"time={self.wall_time:.2f}s retries={self.retries}"
+        )
+
+
+@dataclass
+class UsageLedger:
+    """Thread-safe collection of the usage records of a run."""
+
+    records: list[UsageRecord] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def add(self, record: UsageRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.records.clear()
+
+    def totals(self) -> UsageTotals:
+        totals = UsageTotals()
+        for record in self._snapshot():
+            totals.add(record)
+        return totals
+
+    def by(self, *keys: str) -> dict[tuple[Any, ...], UsageTotals]:
+        """
+        Aggregates records grouped by the given UsageRecord attributes.
+
+        Example: ``ledger.by("agent")`` or ``ledger.by("step", "iteration")``.
+        """
+        groups: dict[tuple[Any, ...], UsageTotals] = {}
+        for record in self._snapshot():
+            group = tuple(getattr(record, key) for key in keys)
+            groups.setdefault(group, UsageTotals()).add(record)
+        return groups
+
+    def summary(self) -> str:
+        """Per-agent and per-step breakdown followed by the run totals."""
+        lines = ["Usage by agent:"]
+        for (agent,), totals in sorted(
+            self.by("agent").items(), key=lambda item: str(item[0][0])
+        ):
+            lines.append(f"  {agent or '-'}: {totals}")
+        lines.append("Usage by step:")
+        for (step,), totals in sorted(
+            self.by("step").items(), key=lambda item: (item[0][0] is None, item[0])
+        ):
+            lines.append(f"  {'-' if step is None else step}: {totals}")
+        lines.append(f"Total: {self.totals()}")
+        return "\n".join(lines)
+
+    def _snapshot(self) -> list[UsageRecord]:
+        with self._lock:
+            return list(self.records)
+
+
+_ledger = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    return _ledger
+
+
+def set_usage_ledger(ledger: UsageLedger) -> None:
+    """Replaces the ledger that new records are added to."""
+    global _ledger
+    _ledger = ledger
+
+
+def current_labels() -> dict[str, Any]:
+    return _labels.get({})
+
+
+@contextmanager
+def usage_context(**labels: Any) -> Iterator[None]:
+    """Adds ``agent``, ``step`` or ``iteration`` labels for calls made inside."""
+    token = _labels.set({**current_labels(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def update_usage_context(**labels: Any) -> None:
+    """
+    Changes labels for the rest of the enclosing ``usage_context`` (or
+    ``tracked`` method), e.g. the iteration of a loop.
+    """
+    _labels.set({**current_labels(), **labels})
+
+
+def agent_label(agent: Any) -> str:
+    return getattr(agent, "name", "") or type(agent).__name__
+
+
+def tracked(method: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Labels the calls made by an agent method with the agent's name and runs
+    the method in a ``Class.method`` tracing span.
+    """
+    if inspect.iscoroutinefunction(method):
+
+        @functools.wraps(method)
+        async def async_wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            with usage_context(agent=agent_label(self)), _method_span(self, method):
+                return await method(self, *args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        with usage_context(agent=agent_label(self)), _method_span(self, method):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _method_span(agent: Any, method: Callable[..., Any]) -> Any:
+    return span(f"{type(agent).__name__}.{method.__name__}", **current_labels())
+
+
+def create(endpoint: Any, **request: Any) -> tuple[Any, int]:
+    """
+    Calls ``endpoint.create`` through the installed rate limiter (see
+    ratelimit.py) and reports how many retries were taken. A streamed
+    response keeps its limiter slot until the stream has been consumed or
+    closed.
+
+    Clients without ``with_raw_response`` (such as test doubles) are called
+    directly and report no client retries.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        response, retries, _ = _send(endpoint, request)
+        return response, retries
+    return limiter.call(functools.partial(_send, endpoint, request), request)
+
+
+async def acreate(endpoint: Any, **request: Any) -> tuple[Any, int]:
+    """Async counterpart of create."""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        response, retries, _ = await _asend(endpoint, request)
+        return response, retries
+    return await limiter.acall(functools.partial(_asend, endpoint, request), request)
+
+
+def _send(endpoint: Any, request: dict[str, Any]) -> Sent:
+    raw_endpoint = getattr(endpoint, "with_raw_response", None)
+    if raw_endpoint is None:
+        return endpoint.create(**request), 0, None
+    raw = raw_endpoint.create(**request)
+    return raw.parse(), getattr(raw, "retries_taken", 0), raw.headers
+
+
+async def _asend(endpoint: Any, request: dict[str, Any]) -> Sent:
+    raw_endpoint = getattr(endpoint, "with_raw_response", None)
+    if raw_endpoint is None:
+        return await endpoint.create(**request), 0, None
+    raw = await raw_endpoint.create(**request)
+    return raw.parse(), getattr(raw, "retries_taken", 0), raw.headers
+
+
+def record_usage(
+    kind: str,
+    model: str,
+    response: Any,
+    started: float,
+    retries: int = 0,
+    cache_hit: bool = False,
+    labels: dict[str, Any] | None = None,
+) -> UsageRecord:
+    """
+    Adds a record for one request to the active ledger.
+
+    Parameters:
+    kind (str): ``"chat"`` or ``"embedding"``.
+    model (str): Model the request was sent to.
+    response (Any): The response (or final stream chunk) carrying ``usage``.
+    started (float): ``time.perf_counter()`` taken before the request.
+    retries (int): Retries the client took before succeeding.
+    cache_hit (bool): The response came from a local cache, not the provider.
+    labels (dict | None): Labels to use instead of the current context's.
+        Without them the measurements are also added to the current span.
+    """
+    usage = None if cache_hit else getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    context = current_labels() if labels is None else labels
+    record = UsageRecord(
+        kind=kind,
+        model=model,
+        agent=context.get("agent"),
+        step=context.get("step"),
+        iteration=context.get("iteration"),
+        prompt_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", None) or 0,
+        cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        wall_time=time.perf_counter() - started,
+        retries=retries,
+        cache_hit=cache_hit,
+    )
+    _ledger.add(record)
+    if labels is None:
+        set_attributes(**record.measurements())
+    return record
@@ -0,0 +1,191 @@
+"""
+Dependency-aware executor for the steps produced by ActionPlanningAgent.
+
+Steps are numbered from 1 in plan order. A step starts as soon as every step it
+depends on has finished, and at most ``max_workers`` steps run at once, so the
+wall time of a run follows the critical path of the dependency graph rather
+than the sum of all steps.
+
+A step may also return an iterator of text deltas (see ``RoutingAgent.route``
+with ``stream=True``). The engine drains it in the step's worker thread,
+handing each delta to ``on_delta`` as it arrives; the step result is the
+generator's return value, or the joined deltas if it returns nothing.
+"""
+
+import contextvars
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, TypedDict
+
+from .tracing import span
+from .usage import usage_context
+
+
+class StepResult(TypedDict):
+    step_number: int
+    step_description: str
+    result: Any  # Replace 'Any' with the actual type of step_result if known
+
+
+Dependencies = Mapping[int, Iterable[int]]
+
+
+def sequential_dependencies(step_count: int) -> dict[int, list[int]]:
+    """Chains every step to the previous one, reproducing a plain for loop."""
+    return {i: [i - 1] for i in range(2, step_count + 1)}
+
+
+def drain(stream: Iterator[str], on_delta: Callable[[str], None]) -> Any:
+    """
+    Consumes a stream of deltas, passing each to ``on_delta``.
+
+    Returns:
+    Any: The generator's return value if it has one, else the joined deltas.
+    """
+    deltas: list[str] = []
+    while True:
+        try:
+            delta = next(stream)
+        except StopIteration as stop:
+            return stop.value if stop.value is not None else "".join(deltas)
+        deltas.append(delta)
+        on_delta(delta)
+
+
+@dataclass
+class WorkflowEngine:
+    """
+    Runs workflow steps concurrently while respecting dependency edges.
+
+    Parameters:
+    execute (Callable): Called with a step description, e.g. RoutingAgent.route.
+    max_workers (int): Upper bound on steps executing at the same time.
+    on_delta (Callable | None): Receives ``(step_number, delta)`` for every
+        delta of a streaming step.
+    """
+
+    execute: Callable[[str], Any]
+    max_workers: int = 4
+    on_delta: Callable[[int, str], None] | None = None
+
+    def run(
+        self, steps: list[str], dependencies: Dependencies | None = None
+    ) -> list[StepResult]:
+        """
+        Executes ``steps`` and returns one StepResult per step, in plan order.
+
+        Parameters:
+        steps (list[str]): Step descriptions; step ``i`` is ``steps[i - 1]``.
+        dependencies (Mapping[int, Iterable[int]] | None): Maps a step number to
+            the step numbers that must finish before it starts. Steps without
+            an entry are independent.
+
+        Returns:
+        list[StepResult]: Results ordered by step number. A failing step is
+        recorded as ``"Error: ..."`` and does not stop its dependents.
+        """
+        waiting_on = self._validate(len(steps), dependencies or {})
+        dependents: dict[int, list[int]] = {i: [] for i in waiting_on}
+        for step_number, upstream in waiting_on.items():
+            for dependency in upstream:
+                dependents[dependency].append(step_number)
+
+        results: dict[int, StepResult] = {}
+        ready = [i for i, upstream in waiting_on.items() if not upstream]
+        running: dict[Future[Any], int] = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            while ready or running:
+                for step_number in ready:
+                    step = steps[step_number - 1]
+                    print(f"\n=== Executing Step {step_number}: {step} ===")
+                    # A copy of the caller's context carries its tracing span and
+                    # usage labels into the worker thread.
+                    future = pool.submit(
+                        contextvars.copy_context().run,
+                        self._execute,
+                        step_number,
+                        step,
+                    )
+                    running[future] = step_number
+                ready = []
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_number = running.pop(future)
+                    results[step_number] = self._step_result(
+                        step_number, steps[step_number - 1], future
+                    )
+                    for dependent in dependents[step_number]:
+                        waiting_on[dependent].discard(step_number)
+                        if not waiting_on[dependent]:
+                            ready.append(dependent)
+
+        return [results[i] for i in sorted(results)]
+
+    def _execute(self, step_number: int, step: str) -> Any:
+        with (
+            usage_context(step=step_number),
+            span("workflow.step", step=step_number, description=step),
+        ):
+            result = self.execute(step)
+            if isinstance(result, Iterator):
+                return drain(result, lambda delta: self._emit(step_number, delta))
+            return result
+
+    def _emit(self, step_number: int, delta: str) -> None:
+        if self.on_delta is not None:
+            self.on_delta(step_number, delta)
+
+    def _step_result(
+        self, step_number: int, step: str, future: Future[Any]
+    ) -> StepResult:
+        try:
+            step_result = future.result()
+        except Exception as e:
+            print(f"Error executing step {step_number}: {e}")
+            return {
+                "step_number": step_number,
+                "step_description": step,
+                "result": f"Error: {e}",
+            }
+
+        print(f"Step {step_number} completed successfully:")
+        print(f"Result: {step_result}")
+        print("-" * 50)
+        return {
+            "step_number": step_number,
+            "step_description": step,
+            "result": step_result,
+        }
+
+    def _validate(
+        self, step_count: int, dependencies: Dependencies
+    ) -> dict[int, set[int]]:
+        waiting_on: dict[int, set[int]] = {i: set() for i in range(1, step_count + 1)}
+        for step_number, upstream in dependencies.items():
+            if step_number not in waiting_on:
+                raise ValueError(f"Unknown step {step_number} in dependencies")
+            for dependency in upstream:
+                if dependency not in waiting_on or dependency == step_number:
+                    raise ValueError(
+                        f"Step {step_number} has invalid dependency {dependency}"
+                    )
+                waiting_on[step_number].add(dependency)
+
+        # Kahn's algorithm: a cycle leaves steps that never become ready.
+        remaining = {i: len(upstream) for i, upstream in waiting_on.items()}
+        ready = [i for i, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for step_number, upstream in waiting_on.items():
+                if current in upstream:
+                    remaining[step_number] -= 1
+                    if remaining[step_number] == 0:
+                        ready.append(step_number)
+        if visited != step_count:
+            raise ValueError("Workflow step dependencies contain a cycle")
+        return waiting_on
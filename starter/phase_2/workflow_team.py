@@ -0,0 +1,303 @@
+# workflow_team.py
+"""
+The agents of the product development workflow.
+
+agentic_workflow.py runs them with live requests and batch_workflow.py
+through the batch API, so both build them here: the same personas,
+knowledge, evaluation criteria and validators give both modes the same
+prompts.
+"""
+
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from workflow_agents.base_agents import (
+    ActionPlanningAgent,
+    EvaluationAgent,
+    KnowledgeAugmentedPromptAgent,
+    RoutingAgent,
+)
+from workflow_agents.validators import RegexValidator, RequiredFieldsValidator
+
+# Action Planning Agent
+knowledge_action_planning = (
+    "Stories are defined from a product spec by identifying a "
+    "persona, an action, and a desired outcome for each story. "
+    "Each story represents a specific functionality of the product "
+    "described in the specification. \n"
+    "Features are defined by grouping related user stories. \n"
+    "Tasks are defined for each story and represent the engineering "
+    "work required to develop the product. \n"
+    "A development Plan for a product contains all these components"
+)
+
+# Product Manager - Knowledge Augmented Prompt Agent
+persona_product_manager = "You are a Product Manager, you are responsible for defining the user stories for a product."
+knowledge_product_manager = (
+    "Stories are defined by writing sentences with a persona, an action, and a desired outcome. "
+    "The sentences always start with: As a "
+    "Write several stories for the product spec below, where the personas are the different users of the product. "
+)
+
+# Program Manager - Knowledge Augmented Prompt Agent
+persona_program_manager = "You are a Program Manager, you are responsible for defining the features for a product."
+knowledge_program_manager = "Features of a product are defined by organizing similar user stories into cohesive groups."
+
+# Development Engineer - Knowledge Augmented Prompt Agent
+persona_dev_engineer = "You are a Development Engineer, you are responsible for defining the development tasks for a product."
+knowledge_dev_engineer = "Development tasks are defined by identifying what needs to be built to implement each user story."
+
+# Evaluation Agents
+persona_product_manager_eval = (
+    "You are an evaluation agent that checks the answers of other worker agents"
+)
+persona_program_manager_eval = (
+    "You are an evaluation agent that checks the answers of other worker agents."
+)
+persona_dev_engineer_eval = (
+    "You are an evaluation agent that checks the answers of other worker agents."
+)
+
+
+@dataclass
+class WorkflowTeam:
+    """
+    The agents of one workflow run. Each knowledge agent's routing ``func``
+    is its support function, so every routed step is evaluated.
+    """
+
+    action_planning_agent: ActionPlanningAgent
+    product_manager_knowledge_agent: KnowledgeAugmentedPromptAgent
+    product_manager_evaluation_agent: EvaluationAgent
+    program_manager_knowledge_agent: KnowledgeAugmentedPromptAgent
+    program_manager_evaluation_agent: EvaluationAgent
+    development_engineer_knowledge_agent: KnowledgeAugmentedPromptAgent
+    development_engineer_evaluation_agent: EvaluationAgent
+    routing_agent: RoutingAgent
+
+    @property
+    def knowledge_agents(self) -> list[KnowledgeAugmentedPromptAgent]:
+        return [
+            self.product_manager_knowledge_agent,
+            self.program_manager_knowledge_agent,
+            self.development_engineer_knowledge_agent,
+        ]
+
+    @property
+    def evaluation_agents(self) -> list[EvaluationAgent]:
+        return [
+            self.product_manager_evaluation_agent,
+            self.program_manager_evaluation_agent,
+            self.development_engineer_evaluation_agent,
+        ]
+
+
+def build_team(
+    openai_api_key: str, product_spec: str, candidates: int = 1
+) -> WorkflowTeam:
+    """
+    Instantiates the workflow's agents for one product spec.
+
+    Parameters:
+    openai_api_key (str): Key every agent sends its requests with.
+    product_spec (str): Appended to the Product Manager's knowledge.
+    candidates (int): Worker candidates each evaluation round draws
+        concurrently; the first one the judge accepts is kept.
+
+    Returns:
+    WorkflowTeam: The agents, with the support functions as routing targets.
+    """
+    # TODO: 4 - Instantiate an action_planning_agent using the 'knowledge_action_planning'
+    action_planning_agent = ActionPlanningAgent(
+        openai_api_key=openai_api_key, knowledge=knowledge_action_planning
+    )
+
+    # TODO: 5 - Complete this knowledge string by appending the product_spec loaded in TODO 3
+    # TODO: 6 - Instantiate a product_manager_knowledge_agent using 'persona_product_manager' and the completed 'knowledge_product_manager'
+    product_manager_knowledge_agent = KnowledgeAugmentedPromptAgent(
+        name="Product Manager",
+        description="Defines user stories for a product based on product specifications",
+        openai_api_key=openai_api_key,
+        persona=persona_product_manager,
+        knowledge=f"{knowledge_product_manager}\n\nProduct Specification:\n{product_spec}",
+    )
+
+    # TODO: 7 - Define the persona and evaluation criteria for a Product Manager evaluation agent and instantiate it as product_manager_evaluation_agent.
+    # This agent will evaluate the product_manager_knowledge_agent.
+    # The evaluation_criteria should specify the expected structure for user stories (e.g., "As a [type of user], I want [an action or feature] so that [benefit/value].").
+    product_manager_evaluation_agent = EvaluationAgent(
+        openai_api_key=openai_api_key,
+        persona=persona_product_manager_eval,
+        evaluation_criteria="As a [type of user], I want [an action or feature] so that [benefit/value].",
+        worker_agent=product_manager_knowledge_agent,
+        max_interactions=10,
+        structured_judge=True,
+        candidates=candidates,
+        # A response without a single user story is rejected without asking the
+        # judge; one match says nothing about the other stories, so the judge
+        # still checks responses that pass.
+        validators=[
+            RegexValidator(
+                r"\bAs an? .+?\bI want\b.+?\bso that\b",
+                "user story in the form 'As a ..., I want ... so that ...'",
+            )
+        ],
+    )
+
+    # Instantiate a program_manager_knowledge_agent using 'persona_program_manager' and 'knowledge_program_manager'
+    program_manager_knowledge_agent = KnowledgeAugmentedPromptAgent(
+        name="Program Manager",
+        description="Defines features by organizing similar user stories into cohesive groups",
+        openai_api_key=openai_api_key,
+        persona=persona_program_manager,
+        knowledge=knowledge_program_manager,
+    )
+
+    # TODO: 8 - Instantiate a program_manager_evaluation_agent using 'persona_program_manager_eval' and the evaluation criteria below.
+    program_manager_evaluation_agent = EvaluationAgent(
+        openai_api_key=openai_api_key,
+        persona=persona_program_manager_eval,
+        evaluation_criteria="The answer should be product features that follow the following structure: "
+        "Feature Name: A clear, concise title that identifies the capability\n"
+        "Description: A brief explanation of what the feature does and its purpose\n"
+        "Key Functionality: The specific capabilities or actions the feature provides\n"
+        "User Benefit: How this feature creates value for the user",
+        worker_agent=program_manager_knowledge_agent,
+        max_interactions=10,
+        structured_judge=True,
+        candidates=candidates,
+        validators=[
+            RequiredFieldsValidator(
+                ["Feature Name", "Description", "Key Functionality", "User Benefit"]
+            )
+        ],
+    )
+
+    # Instantiate a development_engineer_knowledge_agent using 'persona_dev_engineer' and 'knowledge_dev_engineer'
+    development_engineer_knowledge_agent = KnowledgeAugmentedPromptAgent(
+        name="Development Engineer",
+        description="Defines development tasks needed to implement each user story",
+        openai_api_key=openai_api_key,
+        persona=persona_dev_engineer,
+        knowledge=knowledge_dev_engineer,
+    )
+
+    # TODO: 9 - Instantiate a development_engineer_evaluation_agent using 'persona_dev_engineer_eval' and the evaluation criteria below.
+    development_engineer_evaluation_agent = EvaluationAgent(
+        openai_api_key=openai_api_key,
+        persona=persona_dev_engineer_eval,
+        worker_agent=development_engineer_knowledge_agent,
+        evaluation_criteria="The answer should be tasks following this exact structure: "
+        "Task ID: A unique identifier for tracking purposes\n"
+        "Task Title: Brief description of the specific development work\n"
+        "Related User Story: Reference to the parent user story\n"
+        "Description: Detailed explanation of the technical work required\n"
+        "Acceptance Criteria: Specific requirements that must be met for completion\n"
+        "Estimated Effort: Time or complexity estimation\n"
+        "Dependencies: Any tasks that must be completed first",
+        max_interactions=10,
+        structured_judge=True,
+        candidates=candidates,
+        validators=[
+            RequiredFieldsValidator(
+                [
+                    "Task ID",
+                    "Task Title",
+                    "Related User Story",
+                    "Description",
+                    "Acceptance Criteria",
+                    "Estimated Effort",
+                    "Dependencies",
+                ]
+            )
+        ],
+    )
+
+    # TODO: 10 - Instantiate a routing_agent. You will need to define a list of agent dictionaries (routes) for Product Manager, Program Manager, and Development Engineer.
+    # Each dictionary should contain 'name', 'description', and 'func' (linking to a support function).
+    routing_agent = RoutingAgent(
+        openai_api_key=openai_api_key,
+        agents=[
+            development_engineer_knowledge_agent,
+            product_manager_knowledge_agent,
+            program_manager_knowledge_agent,
+        ],
+    )
+
+    # Route each step through its agent's support function, so every routed
+    # answer is evaluated before it becomes the step result.
+    product_manager_knowledge_agent.func = support_function(
+        product_manager_knowledge_agent, product_manager_evaluation_agent
+    )
+    program_manager_knowledge_agent.func = support_function(
+        program_manager_knowledge_agent, program_manager_evaluation_agent
+    )
+    development_engineer_knowledge_agent.func = support_function(
+        development_engineer_knowledge_agent, development_engineer_evaluation_agent
+    )
+
+    return WorkflowTeam(
+        action_planning_agent=action_planning_agent,
+        product_manager_knowledge_agent=product_manager_knowledge_agent,
+        product_manager_evaluation_agent=product_manager_evaluation_agent,
+        program_manager_knowledge_agent=program_manager_knowledge_agent,
+        program_manager_evaluation_agent=program_manager_evaluation_agent,
+        development_engineer_knowledge_agent=development_engineer_knowledge_agent,
+        development_engineer_evaluation_agent=development_engineer_evaluation_agent,
+        routing_agent=routing_agent,
+    )
+
+
+# Job function persona support functions
+# TODO: 11 - Define the support functions for the routes of the routing agent (e.g., product_manager_support_function, program_manager_support_function, development_engineer_support_function).
+# Each support function should:
+#   1. Take the input query (e.g., a step from the action plan).
+#   2. Get a response from the respective Knowledge Augmented Prompt Agent.
+#   3. Have the response evaluated by the corresponding Evaluation Agent.
+#   4. Return the final validated response.
+
+
+def support_function(
+    knowledge_agent: KnowledgeAugmentedPromptAgent, evaluation_agent: EvaluationAgent
+) -> Callable[..., Any]:
+    """Builds the support function routing ``knowledge_agent`` through its evaluator."""
+
+    def support(query: str, stream: bool = False):
+        if stream:
+            return stream_and_evaluate(knowledge_agent, evaluation_agent, query)
+        # Get response from knowledge agent
+        response = knowledge_agent.respond(query)
+        if response is None:
+            return ""
+
+        # Evaluate the response against the query it answers; the knowledge agent
+        # is only asked again if the evaluation rejects it.
+        evaluated_response = evaluation_agent.evaluate(query, response)
+        return evaluated_response["final_response"] if evaluated_response else response
+
+    return support
+
+
+def stream_and_evaluate(
+    knowledge_agent: KnowledgeAugmentedPromptAgent,
+    evaluation_agent: EvaluationAgent,
+    query: str,
+) -> Iterator[str]:
+    """
+    Streams the knowledge agent's answer, then evaluates it. A revised answer
+    is streamed after the first one; the evaluated answer is the generator's
+    return value, which the workflow engine keeps as the step result.
+    """
+    deltas: list[str] = []
+    for delta in knowledge_agent.respond(query, stream=True):
+        deltas.append(delta)
+        yield delta
+    response = "".join(deltas)
+    evaluated_response = evaluation_agent.evaluate(query, response)
+    final_response = (
+        evaluated_response["final_response"] if evaluated_response else response
+    )
+    if final_response != response:
+        yield f"\n[Revised after evaluation]\n{final_response}"
+    return final_response